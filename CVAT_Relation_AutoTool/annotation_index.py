@@ -0,0 +1,540 @@
+import math
+import hashlib
+from bisect import bisect_right
+import xml.etree.ElementTree as ET
+
+
+class AnnotationIndex:
+    """标注索引 - 加载XML时一次性解析，按帧查询边界框和关系点"""
+
+    def __init__(self, root=None):
+        # 每帧的边界框 {frame: [(track_id, xtl, ytl, xbr, ybr, area, label, attributes), ...]}
+        self.frame_boxes = {}
+        # 每帧的关系点 {frame: [(x, y, predicate, subject_id, object_id, track_id), ...]}
+        self.frame_relations = {}
+        # (track_id, frame) -> 边界框，关系连线按主体/客体ID直接取框
+        self.box_lookup = {}
+        # 所有实体类别（不含Relation）
+        self.labels = set()
+        # 每个轨迹的内容哈希、类别和有条目的帧（用于增量更新）
+        self.track_hashes = {}
+        self.track_labels = {}
+        self.track_frames = {}
+        # 按需构建的每帧空间索引 {frame: SpatialGrid}
+        self.spatial_grids = {}
+        # 按需构建的每帧分组下标 {frame: ({label: [框下标]}, {predicate: [关系点下标]})}
+        self.frame_groups = {}
+        # 倒排索引：键 -> 可见帧区间 ([起始帧, ...], [结束帧, ...])，区间闭合且有序
+        self.track_intervals = {}  # {track_id: ...}
+        self.label_intervals = {}  # {label: ...}
+        self.predicate_intervals = {}  # {predicate: ...}
+        self.pair_intervals = {}  # {(subject_id, object_id): ...}
+        self.subject_intervals = {}  # {subject_id: ...} 作为关系主体出现的帧
+
+        if root is not None:
+            self.build(root)
+
+    @classmethod
+    def from_file(cls, xml_path):
+        """从XML文件构建索引"""
+        tree = ET.parse(xml_path)
+        return cls(tree.getroot())
+
+    def build(self, root):
+        """从XML根节点构建索引"""
+        self.frame_boxes = {}
+        self.frame_relations = {}
+        self.box_lookup = {}
+        self.labels = set()
+        self.spatial_grids = {}
+        self.frame_groups = {}
+        self.track_hashes = {}
+        self.track_labels = {}
+        self.track_frames = {}
+
+        for track in root.findall('track'):
+            self._index_track(track)
+        self.labels = set(self.track_labels.values())
+
+        self.build_inverted_indexes()
+
+    def update(self, root):
+        """
+        增量更新：按轨迹ID和内容哈希与当前索引比较，只重新索引新增、删除或修改的轨迹。
+        返回 (变化的轨迹ID集合, 受影响的帧集合)。
+        """
+        new_tracks = {track.get('id'): track for track in root.findall('track')}
+        new_hashes = {track_id: _track_hash(track) for track_id, track in new_tracks.items()}
+        changed = {
+            track_id for track_id in self.track_hashes.keys() | new_hashes.keys()
+            if self.track_hashes.get(track_id) != new_hashes.get(track_id)
+        }
+        if not changed:
+            return changed, set()
+
+        affected_frames = set()
+        affected_keys = {name: set() for name in _SECONDARY_KEYS}
+
+        # 移除旧条目
+        for track_id in changed:
+            for frame in self.track_frames.pop(track_id, ()):
+                affected_frames.add(frame)
+                self._remove_track_entries(track_id, frame, affected_keys)
+            self.track_hashes.pop(track_id, None)
+            self.track_labels.pop(track_id, None)
+
+        # 索引新条目
+        for track_id in changed:
+            track = new_tracks.get(track_id)
+            if track is None:
+                continue
+            self._index_track(track, new_hashes[track_id])
+            for frame in self.track_frames.get(track_id, ()):
+                affected_frames.add(frame)
+                for entry in self.get_boxes(frame):
+                    if entry[0] == track_id:
+                        _collect_box_keys(entry, affected_keys)
+                for entry in self.get_relations(frame):
+                    if entry[5] == track_id:
+                        _collect_relation_keys(entry, affected_keys)
+
+        self.labels = set(self.track_labels.values())
+
+        # 只重建受影响的键，并丢弃受影响帧的按需缓存
+        frame_keys = {frame: self._frame_keys(frame) for frame in affected_frames}
+        for name, keys in affected_keys.items():
+            self._refresh_intervals(name, keys, frame_keys)
+        for frame in affected_frames:
+            self.spatial_grids.pop(frame, None)
+            self.frame_groups.pop(frame, None)
+
+        return changed, affected_frames
+
+    def _index_track(self, track, track_hash=None):
+        """索引一个轨迹并记录其内容哈希"""
+        track_id = track.get('id')
+        self.track_hashes[track_id] = track_hash or _track_hash(track)
+        if track.get('label') == 'Relation':
+            self._index_relation_track(track)
+        else:
+            self._index_box_track(track)
+
+    def _remove_track_entries(self, track_id, frame, affected_keys):
+        """从某一帧中移除指定轨迹的条目，并记录受影响的倒排索引键"""
+        boxes = self.frame_boxes.get(frame)
+        if boxes:
+            kept = []
+            for entry in boxes:
+                if entry[0] == track_id:
+                    _collect_box_keys(entry, affected_keys)
+                else:
+                    kept.append(entry)
+            if kept:
+                self.frame_boxes[frame] = kept
+            else:
+                del self.frame_boxes[frame]
+        self.box_lookup.pop((track_id, frame), None)
+
+        relations = self.frame_relations.get(frame)
+        if relations:
+            kept = []
+            for entry in relations:
+                if entry[5] == track_id:
+                    _collect_relation_keys(entry, affected_keys)
+                else:
+                    kept.append(entry)
+            if kept:
+                self.frame_relations[frame] = kept
+            else:
+                del self.frame_relations[frame]
+
+    def _refresh_intervals(self, name, keys, frame_keys):
+        """
+        重建倒排索引中的指定键：受影响帧以外的区间保留，受影响帧重新统计。
+        frame_keys为 {受影响帧: 该帧各倒排索引出现的键}
+        """
+        index = getattr(self, name)
+        frames = frame_keys.keys()
+        present = {}
+        for frame, keys_in_frame in frame_keys.items():
+            for key in keys_in_frame[name]:
+                present.setdefault(key, set()).add(frame)
+
+        for key in keys:
+            kept = {
+                frame for frame in _interval_frames(index.get(key))
+                if frame not in frames
+            }
+            merged = sorted(kept | present.get(key, set()))
+            index.pop(key, None)
+            for frame in merged:
+                _add_frame(index, key, frame)
+
+    def _frame_keys(self, frame):
+        """某一帧在各倒排索引中出现的键"""
+        keys = {name: set() for name in _SECONDARY_KEYS}
+        for entry in self.get_boxes(frame):
+            _collect_box_keys(entry, keys)
+        for entry in self.get_relations(frame):
+            _collect_relation_keys(entry, keys)
+        return keys
+
+    def build_inverted_indexes(self):
+        """由按帧索引生成倒排索引（按帧号顺序追加，相邻帧合并为区间）"""
+        self.track_intervals = {}
+        self.label_intervals = {}
+        self.predicate_intervals = {}
+        self.pair_intervals = {}
+        self.subject_intervals = {}
+
+        for frame in sorted(self.frame_boxes):
+            for box in self.frame_boxes[frame]:
+                _add_frame(self.track_intervals, box[0], frame)
+                _add_frame(self.label_intervals, box[6], frame)
+
+        for frame in sorted(self.frame_relations):
+            for x, y, predicate, subject_id, object_id, track_id in self.frame_relations[frame]:
+                _add_frame(self.track_intervals, track_id, frame)
+                _add_frame(self.predicate_intervals, predicate, frame)
+                _add_frame(self.pair_intervals, (subject_id, object_id), frame)
+                _add_frame(self.subject_intervals, subject_id, frame)
+
+    def _index_box_track(self, track):
+        """索引一个实体轨迹的所有可见边界框"""
+        label = track.get('label')
+        track_id = track.get('id')
+        if label:
+            self.track_labels[track_id] = label
+
+        seen_frames = set()
+        for box in track.findall('box'):
+            if box.get('outside', '0') == '1':
+                continue
+            try:
+                frame = int(box.get('frame'))
+                xtl = float(box.get('xtl'))
+                ytl = float(box.get('ytl'))
+                xbr = float(box.get('xbr'))
+                ybr = float(box.get('ybr'))
+            except (TypeError, ValueError):
+                continue
+
+            # 每个轨迹每帧只取第一个框
+            if frame in seen_frames:
+                continue
+            seen_frames.add(frame)
+
+            attributes = {
+                attr.get('name'): attr.text or ""
+                for attr in box.findall('attribute')
+            }
+            area = (xbr - xtl) * (ybr - ytl)
+            entry = (track_id, xtl, ytl, xbr, ybr, area, label, attributes)
+            self.frame_boxes.setdefault(frame, []).append(entry)
+            self.box_lookup[(track_id, frame)] = entry
+
+        self.track_frames[track_id] = sorted(seen_frames)
+
+    def _index_relation_track(self, track):
+        """索引一个关系轨迹的所有可见关系点"""
+        track_id = track.get('id')
+
+        seen_frames = set()
+        for points in track.findall('points'):
+            if points.get('outside', '0') == '1':
+                continue
+
+            points_str = points.get('points')
+            if not points_str or points_str == "0.00,0.00":
+                continue
+
+            try:
+                frame = int(points.get('frame'))
+                x, y = map(float, points_str.split(','))
+            except (TypeError, ValueError):
+                continue
+
+            if frame in seen_frames:
+                continue
+            seen_frames.add(frame)
+
+            predicate = ""
+            subject_id = ""
+            object_id = ""
+            for attr in points.findall('attribute'):
+                name = attr.get('name')
+                if name == 'predicate':
+                    predicate = attr.text or ""
+                elif name == 'subject_id':
+                    subject_id = attr.text or ""
+                elif name == 'object_id':
+                    object_id = attr.text or ""
+
+            self.frame_relations.setdefault(frame, []).append(
+                (x, y, predicate, subject_id, object_id, track_id)
+            )
+
+        self.track_frames[track_id] = sorted(seen_frames)
+
+    def get_boxes(self, frame):
+        """获取指定帧的边界框列表"""
+        return self.frame_boxes.get(frame, [])
+
+    def get_relations(self, frame):
+        """获取指定帧的关系点列表"""
+        return self.frame_relations.get(frame, [])
+
+    def get_frame_groups(self, frame):
+        """指定帧按类别和谓词分组的下标（首次访问时构建，之后筛选只查表）"""
+        groups = self.frame_groups.get(frame)
+        if groups is None:
+            by_label = {}
+            for i, box in enumerate(self.get_boxes(frame)):
+                by_label.setdefault(box[6], []).append(i)
+            by_predicate = {}
+            for i, rel in enumerate(self.get_relations(frame)):
+                by_predicate.setdefault(rel[2], []).append(i)
+            groups = (by_label, by_predicate)
+            self.frame_groups[frame] = groups
+        return groups
+
+    def select_boxes(self, frame, labels=None, track_ids=None):
+        """按类别和轨迹筛选指定帧的边界框（None表示不限制）"""
+        boxes = self.get_boxes(frame)
+        if labels is not None:
+            by_label = self.get_frame_groups(frame)[0]
+            indices = sorted(i for label in labels for i in by_label.get(label, ()))
+            boxes = [boxes[i] for i in indices]
+        if track_ids is not None:
+            boxes = [box for box in boxes if box[0] in track_ids]
+        return boxes
+
+    def select_relations(self, frame, predicates=None, track_ids=None):
+        """按谓词和主体/客体轨迹筛选指定帧的关系点（None表示不限制）"""
+        relations = self.get_relations(frame)
+        if predicates is not None:
+            by_predicate = self.get_frame_groups(frame)[1]
+            indices = sorted(i for p in predicates for i in by_predicate.get(p, ()))
+            relations = [relations[i] for i in indices]
+        if track_ids is not None:
+            relations = [
+                rel for rel in relations
+                if rel[3] in track_ids or rel[4] in track_ids or rel[5] in track_ids
+            ]
+        return relations
+
+    def get_box(self, track_id, frame):
+        """获取指定轨迹在指定帧的边界框，不可见时返回None"""
+        return self.box_lookup.get((track_id, frame))
+
+    def relation_edges(self, frame, relations=None):
+        """
+        指定帧中主体框指向客体框的连线（原图坐标，端点落在框边上）。
+        relations为已筛选的关系点列表，默认使用该帧全部关系点。
+        返回 [(x1, y1, x2, y2, predicate, subject_label, track_id), ...]，
+        主体或客体在该帧不可见的关系被跳过。
+        """
+        if relations is None:
+            relations = self.get_relations(frame)
+        edges = []
+        for x, y, predicate, subject_id, object_id, track_id in relations:
+            subject = self.box_lookup.get((subject_id, frame))
+            obj = self.box_lookup.get((object_id, frame))
+            if subject is None or obj is None or subject is obj:
+                continue
+            x1, y1 = _box_center(subject)
+            x2, y2 = _box_center(obj)
+            sx, sy = _clip_to_edge(subject, x1, y1, x2 - x1, y2 - y1)
+            ox, oy = _clip_to_edge(obj, x2, y2, x1 - x2, y1 - y2)
+            edges.append((sx, sy, ox, oy, predicate, subject[6], track_id))
+        return edges
+
+    def get_spatial_grid(self, frame):
+        """获取指定帧的空间索引（首次访问时构建）"""
+        grid = self.spatial_grids.get(frame)
+        if grid is None:
+            grid = SpatialGrid(self.get_boxes(frame))
+            self.spatial_grids[frame] = grid
+        return grid
+
+    def find_box_at(self, frame, x, y, track_ids=None):
+        """查找指定帧中包含该点的最小边界框，返回track_id；track_ids限定可选的轨迹"""
+        return self.get_spatial_grid(frame).find(x, y, track_ids)
+
+    def find_occurrence(self, kind, key, frame, forward=True):
+        """
+        查找键在frame之后（forward）或之前最近一次出现的帧，没有则返回None。
+        kind: 'track' / 'label' / 'predicate' / 'pair'
+        """
+        intervals = {
+            'track': self.track_intervals,
+            'label': self.label_intervals,
+            'predicate': self.predicate_intervals,
+            'pair': self.pair_intervals,
+        }[kind].get(key)
+        if not intervals:
+            return None
+
+        starts, ends = intervals
+        if forward:
+            target = frame + 1
+            i = bisect_right(starts, target) - 1
+            if i >= 0 and ends[i] >= target:
+                return target
+            return starts[i + 1] if i + 1 < len(starts) else None
+
+        target = frame - 1
+        i = bisect_right(starts, target) - 1
+        if i < 0:
+            return None
+        return min(ends[i], target)
+
+    def prune_spatial_grids(self, frames_to_keep):
+        """只保留指定帧的空间索引和分组下标以节省内存"""
+        self.spatial_grids = {
+            k: v for k, v in self.spatial_grids.items()
+            if k in frames_to_keep
+        }
+        self.frame_groups = {
+            k: v for k, v in self.frame_groups.items()
+            if k in frames_to_keep
+        }
+
+
+# 可增量更新的倒排索引
+_SECONDARY_KEYS = (
+    'track_intervals', 'label_intervals', 'predicate_intervals',
+    'pair_intervals', 'subject_intervals'
+)
+
+
+def _track_hash(track):
+    """轨迹元素的内容哈希"""
+    return hashlib.sha1(ET.tostring(track)).hexdigest()
+
+
+def _collect_box_keys(entry, keys):
+    keys['track_intervals'].add(entry[0])
+    keys['label_intervals'].add(entry[6])
+
+
+def _collect_relation_keys(entry, keys):
+    x, y, predicate, subject_id, object_id, track_id = entry
+    keys['track_intervals'].add(track_id)
+    keys['predicate_intervals'].add(predicate)
+    keys['pair_intervals'].add((subject_id, object_id))
+    keys['subject_intervals'].add(subject_id)
+
+
+def _interval_frames(intervals):
+    """展开区间为帧号"""
+    if not intervals:
+        return
+    for start, end in zip(*intervals):
+        yield from range(start, end + 1)
+
+
+def _box_center(box):
+    return (box[1] + box[3]) / 2, (box[2] + box[4]) / 2
+
+
+def _clip_to_edge(box, cx, cy, dx, dy):
+    """从框中心沿(dx, dy)方向与框边的交点"""
+    half_w = abs(box[3] - box[1]) / 2
+    half_h = abs(box[4] - box[2]) / 2
+    t = min(
+        half_w / abs(dx) if dx else math.inf,
+        half_h / abs(dy) if dy else math.inf
+    )
+    if t == math.inf:
+        return cx, cy
+    # 两框重叠时端点不越过对方中心
+    t = min(t, 1.0)
+    return cx + dx * t, cy + dy * t
+
+
+def _add_frame(index, key, frame):
+    """向倒排索引追加一帧（frame必须不小于已有的最大帧号）"""
+    intervals = index.get(key)
+    if intervals is None:
+        index[key] = ([frame], [frame])
+        return
+    starts, ends = intervals
+    if frame <= ends[-1] + 1:
+        ends[-1] = max(ends[-1], frame)
+    else:
+        starts.append(frame)
+        ends.append(frame)
+
+
+class SpatialGrid:
+    """均匀网格空间索引 - 命中测试时直接返回包含该点的最小框"""
+
+    # 单个框覆盖的格子数超过该值时放入大框列表，避免网格膨胀
+    MAX_CELLS_PER_BOX = 64
+
+    def __init__(self, boxes, cell_size=None):
+        self.cells = {}
+        self.large_boxes = []
+        self.cell_size = cell_size or self._estimate_cell_size(boxes)
+
+        # 构建时按面积排序一次，之后每个格子内的列表天然有序
+        for box in sorted(boxes, key=lambda b: abs(b[5])):
+            track_id, xtl, ytl, xbr, ybr = box[:5]
+            left, right = min(xtl, xbr), max(xtl, xbr)
+            top, bottom = min(ytl, ybr), max(ytl, ybr)
+            entry = (left, top, right, bottom, abs(box[5]), track_id)
+
+            cx0, cx1 = int(left // self.cell_size), int(right // self.cell_size)
+            cy0, cy1 = int(top // self.cell_size), int(bottom // self.cell_size)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.MAX_CELLS_PER_BOX:
+                self.large_boxes.append(entry)
+                continue
+
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.cells.setdefault((cx, cy), []).append(entry)
+
+    @staticmethod
+    def _estimate_cell_size(boxes):
+        """根据框的平均尺寸估算格子大小"""
+        if not boxes:
+            return 64.0
+        mean_side = sum(
+            math.sqrt(abs(b[5])) for b in boxes
+        ) / len(boxes)
+        return max(16.0, mean_side)
+
+    def estimated_bytes(self):
+        """估算索引占用的内存（每个格子引用8字节、每个格子约100字节开销）"""
+        references = sum(len(cell) for cell in self.cells.values()) + len(self.large_boxes)
+        return references * 8 + len(self.cells) * 100
+
+    def find(self, x, y, allowed=None):
+        """
+        返回包含点(x, y)的最小框的track_id，没有则返回None。
+        allowed为track_id集合时只考虑其中的框（被筛选隐藏的框跳过，继续找更大的可见框）。
+        """
+        best = None
+
+        cell = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)), ())
+        for entry in cell:
+            left, top, right, bottom = entry[:4]
+            if left <= x <= right and top <= y <= bottom:
+                if allowed is not None and entry[5] not in allowed:
+                    continue
+                best = entry
+                break
+
+        # 大框列表同样按面积有序，只需找到第一个命中并与网格结果比较
+        for entry in self.large_boxes:
+            if best is not None and entry[4] >= best[4]:
+                break
+            left, top, right, bottom = entry[:4]
+            if left <= x <= right and top <= y <= bottom:
+                if allowed is not None and entry[5] not in allowed:
+                    continue
+                best = entry
+                break
+
+        return best[5] if best is not None else None
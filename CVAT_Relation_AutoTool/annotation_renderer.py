@@ -0,0 +1,211 @@
+import math
+from PIL import ImageDraw, ImageFont
+
+
+# 类别颜色（按类别名排序依次分配）
+DEFAULT_COLORS = [
+    '#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8',
+    '#F7DC6F', '#BB8FCE', '#85C1E2', '#F8B739', '#52B788'
+]
+
+# 标签描边偏移：只绘制8个方向而不是25次
+_OUTLINE_OFFSETS = [
+    (-1, -1), (0, -1), (1, -1),
+    (-1, 0),           (1, 0),
+    (-1, 1),  (0, 1),  (1, 1)
+]
+
+
+def build_color_map(labels, color_map=None):
+    """为类别分配颜色（已有类别保持原颜色，新类别依次分配）"""
+    color_map = dict(color_map or {})
+    for label in sorted(labels):
+        if label not in color_map:
+            color_map[label] = DEFAULT_COLORS[len(color_map) % len(DEFAULT_COLORS)]
+    return color_map
+
+
+def load_fonts():
+    """加载标签字体 (框标签字体, 关系标签字体)，没有arial时使用默认字体"""
+    try:
+        return ImageFont.truetype("arial.ttf", 16), ImageFont.truetype("arial.ttf", 12)
+    except:
+        font = ImageFont.load_default()
+        return font, font
+
+
+def draw_boxes(draw, boxes, color_map, font, transform=None, hovered=None, show_labels=True):
+    """
+    绘制边界框，返回绘制数量。
+    boxes为AnnotationIndex的边界框条目；transform为(缩放, x偏移, y偏移)，默认按原图坐标绘制。
+    """
+    count = 0
+    scale, offset_x, offset_y = transform or (1.0, 0, 0)
+
+    for track_id, xtl, ytl, xbr, ybr, area, label, attributes in boxes:
+        if transform:
+            xtl, xbr = xtl * scale - offset_x, xbr * scale - offset_x
+            ytl, ybr = ytl * scale - offset_y, ybr * scale - offset_y
+        color = color_map.get(label, '#FFFFFF')
+
+        # 根据是否高亮调整样式
+        if track_id == hovered:
+            # 高亮：更粗的边框，更明显的填充
+            line_width = 5
+            fill_alpha = '40'
+        else:
+            # 普通：正常边框，淡填充
+            line_width = 3
+            fill_alpha = '20'
+
+        # 绘制矩形边框
+        draw.rectangle(
+            [(xtl, ytl), (xbr, ybr)],
+            outline=color,
+            width=line_width
+        )
+
+        # 绘制半透明填充
+        draw.rectangle(
+            [(xtl, ytl), (xbr, ybr)],
+            fill=color + fill_alpha
+        )
+
+        # 绘制标签（无背景，带描边）
+        if show_labels:
+            text = f"{label} #{int(track_id)+1}"
+            text_x = xtl + 5
+            text_y = ytl + 5
+
+            for dx, dy in _OUTLINE_OFFSETS:
+                draw.text(
+                    (text_x + dx, text_y + dy),
+                    text,
+                    fill='white',
+                    font=font
+                )
+
+            # 绘制文字主体（使用边框颜色）
+            draw.text(
+                (text_x, text_y),
+                text,
+                fill=color,
+                font=font
+            )
+
+        count += 1
+
+    return count
+
+
+def draw_relations(draw, relations, font, transform=None, show_labels=True):
+    """绘制关系点，返回绘制数量（transform同draw_boxes）"""
+    count = 0
+    scale, offset_x, offset_y = transform or (1.0, 0, 0)
+
+    for x, y, predicate, subject_id, object_id, track_id in relations:
+        if transform:
+            x, y = x * scale - offset_x, y * scale - offset_y
+        # 绘制关系点（圆形）
+        radius = 8
+        draw.ellipse(
+            [(x-radius, y-radius), (x+radius, y+radius)],
+            fill='#FF6B6B',
+            outline='white',
+            width=2
+        )
+
+        # 绘制关系信息
+        if show_labels:
+            try:
+                text = f"#{int(subject_id)+1} {predicate} #{int(object_id)+1}"
+            except:
+                text = predicate
+
+            # 背景
+            bbox = draw.textbbox((x + 15, y - 10), text, font=font)
+            draw.rectangle(
+                [bbox[0]-3, bbox[1]-2, bbox[2]+3, bbox[3]+2],
+                fill='#FF6B6B',
+                outline='white',
+                width=1
+            )
+
+            # 文字
+            draw.text(
+                (x + 15, y - 10),
+                text,
+                fill='white',
+                font=font
+            )
+
+        count += 1
+
+    return count
+
+
+def draw_relation_arrows(draw, edges, color_map, transform=None, viewport=None):
+    """
+    绘制主体框指向客体框的箭头，返回绘制数量（transform同draw_boxes）。
+    edges为AnnotationIndex.relation_edges的结果；viewport为原图坐标系中的可见范围
+    (x0, y0, x1, y1)，完全在其外的连线直接跳过。
+    """
+    count = 0
+    scale, offset_x, offset_y = transform or (1.0, 0, 0)
+    head_length, head_width = 12, 5
+
+    for x1, y1, x2, y2, predicate, subject_label, track_id in edges:
+        if viewport and (
+            max(x1, x2) < viewport[0] or min(x1, x2) > viewport[2] or
+            max(y1, y2) < viewport[1] or min(y1, y2) > viewport[3]
+        ):
+            continue
+
+        if transform:
+            x1, y1 = x1 * scale - offset_x, y1 * scale - offset_y
+            x2, y2 = x2 * scale - offset_x, y2 * scale - offset_y
+        length = math.hypot(x2 - x1, y2 - y1)
+        if length < 1:
+            continue
+
+        color = color_map.get(subject_label, '#FF6B6B')
+        draw.line([(x1, y1), (x2, y2)], fill=color, width=2)
+
+        # 箭头：沿连线方向的三角形
+        ux, uy = (x2 - x1) / length, (y2 - y1) / length
+        base_x, base_y = x2 - ux * head_length, y2 - uy * head_length
+        draw.polygon([
+            (x2, y2),
+            (base_x - uy * head_width, base_y + ux * head_width),
+            (base_x + uy * head_width, base_y - ux * head_width)
+        ], fill=color)
+
+        count += 1
+
+    return count
+
+
+def render_frame(image, index, frame, color_map, fonts=None, transform=None,
+                 show_boxes=True, show_relations=True, show_labels=True, show_arrows=False):
+    """
+    在图片上绘制指定帧的标注（不依赖Tk，可在工作进程中调用）。
+    返回 (绘制后的RGB图片, 边界框数, 关系点数)。
+    """
+    img = image.convert('RGB')
+    draw = ImageDraw.Draw(img, 'RGBA')
+    font, small_font = fonts or load_fonts()
+
+    box_count = 0
+    relation_count = 0
+    if show_boxes:
+        box_count = draw_boxes(
+            draw, index.get_boxes(frame), color_map, font, transform, show_labels=show_labels
+        )
+    if show_relations:
+        relation_count = draw_relations(
+            draw, index.get_relations(frame), small_font, transform, show_labels=show_labels
+        )
+    if show_arrows:
+        draw_relation_arrows(draw, index.relation_edges(frame), color_map, transform)
+
+    return img, box_count, relation_count
@@ -0,0 +1,213 @@
+"""
+批量渲染标注帧（不依赖Tk）
+
+用法示例:
+    python batch_render.py annotations.xml images/ -o rendered/
+    python batch_render.py annotations.xml images/ --contact-sheet sheet.jpg --columns 8
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from multiprocessing import Pool, cpu_count
+from PIL import Image, ImageDraw
+
+from annotation_index import AnnotationIndex
+from annotation_renderer import build_color_map, load_fonts, render_frame
+from image_files import list_image_files, parse_frame_names, build_frame_file_map
+
+
+# 工作进程内的全局状态：标注只在进程初始化时加载一次
+_worker = {}
+
+
+def _init_worker(xml_path, image_folder, frame_to_file, options):
+    """工作进程初始化：解析XML并构建索引"""
+    index = AnnotationIndex.from_file(xml_path)
+    _worker['index'] = index
+    _worker['color_map'] = build_color_map(index.labels)
+    _worker['fonts'] = load_fonts()
+    _worker['image_folder'] = image_folder
+    _worker['frame_to_file'] = frame_to_file
+    _worker['options'] = options
+
+
+def _render_one(frame):
+    """
+    渲染一帧。
+    输出到文件时返回 (帧号, 输出路径, 框数, 关系点数)；
+    生成缩略图时返回 (帧号, 缩略图, 框数, 关系点数)。
+    """
+    options = _worker['options']
+    image_path = os.path.join(_worker['image_folder'], _worker['frame_to_file'][frame])
+    thumb_width = options['thumb_width']
+
+    img = Image.open(image_path)
+    full_width = img.width
+    transform = None
+    if thumb_width:
+        # 缩略图只需要低分辨率：JPEG按1/2~1/8直接解码，标注坐标按解码比例映射
+        img.draft('RGB', (thumb_width, max(1, thumb_width * img.height // img.width)))
+        scale = img.width / full_width
+        if scale != 1.0:
+            transform = (scale, 0, 0)
+
+    rendered, box_count, relation_count = render_frame(
+        img,
+        _worker['index'],
+        frame,
+        _worker['color_map'],
+        fonts=_worker['fonts'],
+        transform=transform,
+        show_labels=options['show_labels'],
+        show_arrows=options['show_arrows']
+    )
+
+    if thumb_width:
+        rendered.thumbnail((thumb_width, thumb_width * 4))
+        return frame, rendered, box_count, relation_count
+
+    stem = os.path.splitext(_worker['frame_to_file'][frame])[0]
+    output_path = os.path.join(options['output_dir'], f"{stem}.{options['format']}")
+    if options['format'] == 'jpg':
+        rendered.save(output_path, "JPEG", quality=options['quality'])
+    else:
+        rendered.save(output_path, "PNG")
+    return frame, output_path, box_count, relation_count
+
+
+def save_contact_sheets(thumbs, total, sheet_path, columns, rows_per_sheet):
+    """
+    把按帧号顺序到达的缩略图 (帧号, 缩略图) 拼接为联系表，每页填满后立即保存，
+    内存中只保留一页的缩略图；total为总帧数，超过一页时按页编号保存。
+    """
+    per_sheet = columns * rows_per_sheet
+    pages = math.ceil(total / per_sheet)
+    base, ext = os.path.splitext(sheet_path)
+
+    paths = []
+    page_thumbs = []
+    for item in thumbs:
+        page_thumbs.append(item)
+        if len(page_thumbs) == per_sheet:
+            paths.append(_save_sheet_page(page_thumbs, len(paths), pages, base, ext, sheet_path, columns))
+            page_thumbs = []
+    if page_thumbs:
+        paths.append(_save_sheet_page(page_thumbs, len(paths), pages, base, ext, sheet_path, columns))
+    return paths
+
+
+def _save_sheet_page(page_thumbs, page, pages, base, ext, sheet_path, columns):
+    """保存一页联系表，返回保存路径"""
+    thumb_w = max(thumb.width for _, thumb in page_thumbs)
+    thumb_h = max(thumb.height for _, thumb in page_thumbs)
+    caption_h = 14
+    cell_w, cell_h = thumb_w + 4, thumb_h + caption_h + 4
+    rows = math.ceil(len(page_thumbs) / columns)
+
+    sheet = Image.new('RGB', (columns * cell_w, rows * cell_h), (30, 30, 30))
+    draw = ImageDraw.Draw(sheet)
+    for i, (frame, thumb) in enumerate(page_thumbs):
+        x = (i % columns) * cell_w + 2
+        y = (i // columns) * cell_h + 2
+        sheet.paste(thumb, (x, y))
+        draw.text((x, y + thumb_h + 1), f"#{frame}", fill=(220, 220, 220))
+
+    path = sheet_path if pages == 1 else f"{base}_{page + 1:03d}{ext}"
+    sheet.save(path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量渲染CVAT标注帧（边界框、关系点）")
+    parser.add_argument("xml", help="CVAT XML标注文件")
+    parser.add_argument("image_folder", help="图片文件夹")
+    parser.add_argument("-o", "--output-dir", default="rendered", help="逐帧输出目录")
+    parser.add_argument("--format", choices=("jpg", "png"), default="jpg", help="逐帧输出格式")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG质量")
+    parser.add_argument("--contact-sheet", help="输出联系表路径（指定时不输出逐帧图片）")
+    parser.add_argument("--columns", type=int, default=8, help="联系表列数")
+    parser.add_argument("--rows", type=int, default=12, help="联系表每页行数")
+    parser.add_argument("--thumb-width", type=int, default=240, help="联系表缩略图宽度")
+    parser.add_argument("--start", type=int, default=0, help="起始帧")
+    parser.add_argument("--end", type=int, default=None, help="结束帧（不含）")
+    parser.add_argument("--step", type=int, default=1, help="帧间隔")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="工作进程数")
+    parser.add_argument("--no-labels", action="store_true", help="不绘制文字标签（联系表默认不绘制）")
+    parser.add_argument("--arrows", action="store_true", help="绘制主体->客体箭头")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    image_files = list_image_files(args.image_folder)
+    if not image_files:
+        print(f"图片文件夹中没有找到图片: {args.image_folder}")
+        return 1
+
+    # 主进程只解析帧名映射，标注索引由每个工作进程在初始化时各自加载一次
+    frame_names = parse_frame_names(ET.parse(args.xml).getroot())
+    frame_to_file = build_frame_file_map(args.image_folder, image_files, frame_names)
+
+    frames = [
+        frame for frame in sorted(frame_to_file)
+        if frame >= args.start and (args.end is None or frame < args.end)
+    ][::max(1, args.step)]
+    if not frames:
+        print("没有需要渲染的帧")
+        return 1
+
+    sheet = bool(args.contact_sheet)
+    options = {
+        'output_dir': args.output_dir,
+        'format': args.format,
+        'quality': args.quality,
+        'thumb_width': args.thumb_width if sheet else 0,
+        'show_labels': not (args.no_labels or sheet),
+        'show_arrows': args.arrows,
+    }
+    if not sheet:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    workers = max(1, args.workers)
+    chunksize = max(1, min(32, len(frames) // (workers * 4)))
+    totals = {'boxes': 0, 'relations': 0}
+    start_time = time.perf_counter()
+
+    def collect(results):
+        """统计渲染结果并输出进度，逐个产出 (帧号, 结果)"""
+        for done, (frame, result, box_count, relation_count) in enumerate(results, 1):
+            totals['boxes'] += box_count
+            totals['relations'] += relation_count
+            if done % 100 == 0 or done == len(frames):
+                elapsed = time.perf_counter() - start_time
+                print(f"已渲染 {done}/{len(frames)} 帧，{done / elapsed:.1f} 帧/秒")
+            yield frame, result
+
+    with Pool(workers, initializer=_init_worker,
+              initargs=(args.xml, args.image_folder, frame_to_file, options)) as pool:
+        if sheet:
+            # 联系表按帧号顺序接收缩略图，每页填满即保存，不在内存中累积所有缩略图
+            results = pool.imap(_render_one, frames, chunksize=chunksize)
+            paths = save_contact_sheets(collect(results), len(frames), args.contact_sheet, args.columns, args.rows)
+        else:
+            for _ in collect(pool.imap_unordered(_render_one, frames, chunksize=chunksize)):
+                pass
+
+    elapsed = time.perf_counter() - start_time
+    if sheet:
+        print(f"联系表已保存: {', '.join(paths)}")
+    else:
+        print(f"图片已保存到: {args.output_dir}")
+    print(
+        f"共渲染 {len(frames)} 帧（边界框 {totals['boxes']}，关系点 {totals['relations']}），"
+        f"耗时 {elapsed:.1f} 秒，平均 {len(frames) / elapsed:.1f} 帧/秒"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
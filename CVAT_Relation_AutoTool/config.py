@@ -6,7 +6,15 @@ DEFAULT_CONFIG = {
     "auto_sync_lifecycle": True,
     "auto_generate_output": True,
     "backup_original": True,
-    "skip_existing": True
+    "skip_existing": True,
+    "playback_fps": 25,
+    "thumbnail_cache_dir": "",
+    "thumbnail_cache_mb": 512,
+    "tile_cache_dir": "",
+    "tile_cache_mb": 4096,
+    "max_image_megapixels": 1000,
+    "xml_watch_interval_ms": 1000,
+    "memory_budget_mb": 1024
 }
 
 CONFIG_FILE = "config.json"
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class FrameDensity:
+    """
+    逐帧标注密度 - 统计每帧可见框数、关系点数和未被关系覆盖的主体数。
+    由轨迹生命周期区间一次性向量化计算（区间起点+1、终点后-1，再做累加和），
+    重新加载标注时只对发生变化的轨迹做增减。
+    """
+
+    LAYERS = ('boxes', 'relations', 'covered')
+
+    def __init__(self):
+        self.frame_count = 0
+        # 每层每个键的区间 {layer: {key: ((起始帧, ...), (结束帧, ...))}}
+        self.contributions = {layer: {} for layer in self.LAYERS}
+        # 每层的差分数组（长度frame_count + 1）
+        self.diffs = {layer: np.zeros(1, dtype=np.int64) for layer in self.LAYERS}
+        self.counts = {}
+
+    def update(self, index, frame_count=0):
+        """根据新的AnnotationIndex更新统计，返回发生变化的键数"""
+        frame_count = max(frame_count, _max_frame(index) + 1)
+        self._ensure_length(frame_count)
+
+        changed = 0
+        for layer, new in self._collect(index).items():
+            old = self.contributions[layer]
+            removed = [old[k] for k in old.keys() - new.keys()]
+            added = [new[k] for k in new.keys() - old.keys()]
+            for key in old.keys() & new.keys():
+                if old[key] != new[key]:
+                    removed.append(old[key])
+                    added.append(new[key])
+            if removed or added:
+                self._apply(layer, removed, -1)
+                self._apply(layer, added, 1)
+                changed += len(removed) + len(added)
+            self.contributions[layer] = new
+
+        if changed or not self.counts:
+            self._recount()
+        return changed
+
+    def _collect(self, index):
+        """从索引提取各层区间：实体轨迹、关系轨迹、被关系覆盖的主体"""
+        box_tracks = {}
+        for boxes_in_frame in index.frame_boxes.values():
+            for box in boxes_in_frame:
+                box_tracks[box[0]] = None
+        relation_tracks = {}
+        for relations in index.frame_relations.values():
+            for rel in relations:
+                relation_tracks[rel[5]] = None
+
+        boxes = {k: _freeze(index.track_intervals[k]) for k in box_tracks}
+        relations = {k: _freeze(index.track_intervals[k]) for k in relation_tracks}
+        covered = {}
+        for subject_id, intervals in index.subject_intervals.items():
+            visible = boxes.get(subject_id)
+            if visible is None:
+                continue
+            both = _intersect(visible, _freeze(intervals))
+            if both[0]:
+                covered[subject_id] = both
+        return {'boxes': boxes, 'relations': relations, 'covered': covered}
+
+    def _ensure_length(self, frame_count):
+        """帧数增加时扩展差分数组"""
+        if frame_count <= self.frame_count:
+            return
+        for layer in self.LAYERS:
+            diff = self.diffs[layer]
+            self.diffs[layer] = np.concatenate(
+                [diff, np.zeros(frame_count + 1 - len(diff), dtype=np.int64)]
+            )
+        self.frame_count = frame_count
+        self.counts = {}
+
+    def _apply(self, layer, intervals_list, sign):
+        """把一批区间加到（或从）差分数组上"""
+        if not intervals_list:
+            return
+        starts = np.concatenate([np.asarray(i[0], dtype=np.int64) for i in intervals_list])
+        ends = np.concatenate([np.asarray(i[1], dtype=np.int64) for i in intervals_list])
+        length = self.frame_count + 1
+        delta = np.bincount(starts, minlength=length) - np.bincount(ends + 1, minlength=length)
+        self.diffs[layer] += sign * delta[:length]
+
+    def _recount(self):
+        """差分数组累加得到逐帧计数"""
+        n = self.frame_count
+        boxes = np.cumsum(self.diffs['boxes'])[:n]
+        relations = np.cumsum(self.diffs['relations'])[:n]
+        covered = np.cumsum(self.diffs['covered'])[:n]
+        self.counts = {
+            'boxes': boxes,
+            'relations': relations,
+            'uncovered': boxes - covered,
+        }
+
+    def get_counts(self):
+        """逐帧计数 {'boxes': 数组, 'relations': 数组, 'uncovered': 数组}"""
+        return self.counts
+
+    def counts_at(self, frame):
+        """指定帧的 (框数, 关系点数, 未覆盖主体数)"""
+        if not self.counts or not (0 <= frame < self.frame_count):
+            return (0, 0, 0)
+        return tuple(int(self.counts[k][frame]) for k in ('boxes', 'relations', 'uncovered'))
+
+
+def _max_frame(index):
+    frames = list(index.frame_boxes) + list(index.frame_relations)
+    return max(frames) if frames else -1
+
+
+def _freeze(intervals):
+    """倒排索引的区间转为不可变元组，便于比较是否变化"""
+    return (tuple(intervals[0]), tuple(intervals[1]))
+
+
+def _intersect(a, b):
+    """两组有序闭区间求交"""
+    starts, ends = [], []
+    i = j = 0
+    a_starts, a_ends = a
+    b_starts, b_ends = b
+    while i < len(a_starts) and j < len(b_starts):
+        lo = max(a_starts[i], b_starts[j])
+        hi = min(a_ends[i], b_ends[j])
+        if lo <= hi:
+            starts.append(lo)
+            ends.append(hi)
+        if a_ends[i] < b_ends[j]:
+            i += 1
+        else:
+            j += 1
+    return (tuple(starts), tuple(ends))
@@ -2,8 +2,16 @@ import tkinter as tk
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 import json
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
 import pandas as pd
 from config import DEFAULT_CONFIG
+from search_index import SearchIndex
+from relation_store import RelationStore
+from annotation_index import AnnotationIndex
+from trajectory_inference import infer_motion_relations, MOTION_PREDICATES
 
 
 class ConfigDialog(tb.Toplevel):
@@ -24,7 +32,20 @@ class ConfigDialog(tb.Toplevel):
 class CustomRelationDialog(tb.Toplevel):
     """自定义关系点对话框 - 改进版 - 使用ttkbootstrap美化"""
 
+    # 主体列表按关系数量着色的渐变色（从浅蓝色到深蓝色）
+    SUBJECT_HEAT_COLORS = [
+        f'#{int(230 * (1 - i / 7)):02x}{int(240 * (1 - i / 7)):02x}ff' for i in range(8)
+    ]
+    SUBJECT_FILTER_DELAY_MS = 150  # 搜索输入防抖间隔
+    LOAD_CHUNK_SIZE = 2000  # 后台加载时每批传递的主体数
+    LOAD_POLL_BUDGET = 0.03  # 每次轮询处理加载结果的时间上限（秒）
+    BULK_TEMPLATE_LIMIT = 200000  # 批量模板一次最多生成的主体-客体组合数
+
     def __init__(self, parent, input_file, root_et, entity_classes, predicates, category_to_trackids, custom_relations,relations_to_delete,relations_to_delete_details,parent_app):
+        """
+        root_et / category_to_trackids 为None时在后台线程中解析input_file；
+        对话框先显示空界面，主体分批加入列表，加载期间即可搜索。
+        """
         super().__init__(parent)
 
         self.parent = parent
@@ -48,38 +69,176 @@ class CustomRelationDialog(tb.Toplevel):
         self.temp_custom_relations = custom_relations.copy()  # 使用副本而不是引用
         self.temp_relations_to_delete = relations_to_delete[:]  # 使用副本
         self.temp_relations_to_delete_details = relations_to_delete_details[:]  # 使用副本
-        self.temp_relations = []  # 临时存储本次添加的关系
+        self.relation_store = RelationStore()  # 对话框中的所有关系（含本次新增）
         # 添加多选状态变量
         self.context_menu_selection = []  # 用于存储右键菜单触发时的选中项
-        # 收集所有track_id（除relation之外的所有id）
-        for category, track_ids in category_to_trackids.items():
-            for track_id in track_ids:
-                self.id_to_category[track_id] = category
-                try:
-                    # 安全地将track_id转换为整数，然后加1
-                    display_id = str(int(track_id) + 1)
-                    self.display_id_to_raw[display_id] = track_id
-                    self.all_track_ids.append(display_id)
-                except ValueError:
-                    # 如果track_id不是有效的整数，跳过
-                    continue
         self.copied_relations = []  # 存储复制的客体和谓词
-        self.history = []  # 存储操作历史用于撤销
-        self.current_state = []  # 存储当前状态
-        # 按数字顺序排序track_ids
-        self.all_track_ids.sort(key=lambda x: int(x))
         self.filtered_predicates = predicates[:]  # 谓词过滤缓存
+        # 下拉框搜索索引（主体/客体ID、谓词），主体ID随加载分批追加
+        self.track_id_index = SearchIndex(self.all_track_ids)
+        self.predicate_index = SearchIndex(predicates)
         self.current_subject = None  # 当前选中的主体ID（显示ID）
-        # 初始化关系计数字典
-        self.subject_relation_counts = {}
-        # 解析XML中已有的关系点
-        self.parse_existing_relations()
-        # 初始化本次添加的关系点列表
-        self.new_relations = []  # 专门存储本次添加的关系点
         self.parent_app = parent_app  # 保存对主应用程序的引用
         self.create_widgets()
-        # 从临时自定义关系中加载
-        self.load_temp_custom_relations()
+
+        # 后台加载轨迹和已有关系（工作线程 -> Tk线程）
+        self.load_results = queue.Queue()
+        self.load_cancelled = False
+        self.load_poll_job = None
+        self.loading = True
+        threading.Thread(target=self.load_worker, daemon=True).start()
+        self.load_poll_job = self.after(20, self.poll_load_results)
+
+    def destroy(self):
+        """关闭对话框时停止后台加载"""
+        self.load_cancelled = True
+        if getattr(self, 'load_poll_job', None) is not None:
+            self.after_cancel(self.load_poll_job)
+            self.load_poll_job = None
+        super().destroy()
+
+    def load_worker(self):
+        """工作线程：解析XML、收集主体和已有关系，分批放入结果队列"""
+        try:
+            root = self.root_et
+            if root is None:
+                self.load_results.put(('progress', 0, "正在解析XML..."))
+                root = ET.parse(self.input_file).getroot()
+
+            category_to_trackids = self.category_to_trackids
+            if category_to_trackids is None:
+                category_to_trackids = {}
+                for track in root.findall('track'):
+                    label = track.get('label')
+                    track_id = track.get('id')
+                    if label and label != "Relation":
+                        category_to_trackids.setdefault(label.lower(), []).append(track_id)
+
+            # 收集所有track_id（除relation之外的所有id）
+            id_to_category = {}
+            display_ids = []
+            for category, track_ids in category_to_trackids.items():
+                for track_id in track_ids:
+                    id_to_category[track_id] = category
+                    try:
+                        # 安全地将track_id转换为整数，然后加1
+                        display_ids.append((int(track_id) + 1, track_id))
+                    except ValueError:
+                        # 如果track_id不是有效的整数，跳过
+                        continue
+            # 按数字顺序排序track_ids
+            display_ids.sort()
+            self.load_results.put(('tracks', root, category_to_trackids, id_to_category))
+            self.load_results.put(('progress', 0, "正在读取已有关系..."))
+
+            # 解析XML中已有的关系点
+            self.load_results.put(('relations', self.parse_existing_relations(root, id_to_category)))
+
+            # 主体分批传递
+            total = len(display_ids)
+            for start in range(0, total, self.LOAD_CHUNK_SIZE):
+                if self.load_cancelled:
+                    return
+                chunk = [
+                    (str(display_id), id_to_category.get(track_id, "未知"), track_id)
+                    for display_id, track_id in display_ids[start:start + self.LOAD_CHUNK_SIZE]
+                ]
+                self.load_results.put(('subjects', chunk, min(total, start + len(chunk)), total))
+
+            # 在工作线程中一次生成搜索索引的全部倒排表，加载完成后第一次输入也无需线性扫描
+            # （加载期间分批追加的索引仍按需生成倒排表）
+            self.load_results.put(('progress', 100, "正在建立搜索索引..."))
+            subjects = [
+                (str(display_id), id_to_category.get(track_id, "未知"))
+                for display_id, track_id in display_ids
+            ]
+            subject_index = SearchIndex(f"{display_id}\0{category}" for display_id, category in subjects).build()
+            track_id_index = SearchIndex(display_id for display_id, _ in subjects).build()
+            if self.load_cancelled:
+                return
+            self.load_results.put(('index', subject_index, track_id_index))
+            self.load_results.put(('done',))
+        except Exception as e:
+            self.load_results.put(('error', str(e)))
+
+    def poll_load_results(self):
+        """Tk线程：在时间预算内处理加载结果，其余留到下一次轮询"""
+        self.load_poll_job = None
+        deadline = time.perf_counter() + self.LOAD_POLL_BUDGET
+        subjects_added = False
+        finished = False
+
+        while time.perf_counter() < deadline:
+            try:
+                result = self.load_results.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = result[0]
+            if kind == 'progress':
+                self.status_label.config(text=result[2])
+            elif kind == 'tracks':
+                _, self.root_et, self.category_to_trackids, self.id_to_category = result
+            elif kind == 'relations':
+                for relation in result[1]:
+                    self.relation_store.add(relation, new=False)
+                # 从临时自定义关系中加载
+                self.load_temp_custom_relations()
+            elif kind == 'subjects':
+                _, chunk, done, total = result
+                self.append_subjects(chunk)
+                subjects_added = True
+                self.load_progress['value'] = done * 100 / max(total, 1)
+                self.status_label.config(text=f"正在加载主体 {done}/{total}")
+            elif kind == 'index':
+                _, subject_index, track_id_index = result
+                # 与已追加的主体一一对应时替换为预先生成的索引
+                if len(subject_index) == len(self.all_subjects):
+                    self.subject_search_index = subject_index
+                    self.track_id_index = track_id_index
+            elif kind == 'error':
+                print(f"加载自定义关系数据失败: {result[1]}")
+                tb.dialogs.Messagebox.show_error(f"解析XML文件失败: {result[1]}", "错误", parent=self)
+                self.destroy()
+                return
+            elif kind == 'done':
+                finished = True
+                break
+
+        if subjects_added:
+            self.render_subject_rows()
+        if finished:
+            self.finish_loading()
+        else:
+            self.load_poll_job = self.after(20, self.poll_load_results)
+
+    def append_subjects(self, chunk):
+        """追加一批主体 [(显示ID, 类别, 原始ID)]，按当前搜索词更新筛选结果"""
+        start = len(self.all_subjects)
+        for display_id, category, track_id in chunk:
+            self.display_id_to_raw[display_id] = track_id
+            self.all_track_ids.append(display_id)
+            self.all_subjects.append((display_id, category))
+            self.subject_categories[display_id] = category
+        self.track_id_index.extend(display_id for display_id, _, _ in chunk)
+        self.subject_search_index.extend(f"{display_id}\0{category}" for display_id, category, _ in chunk)
+
+        # 新主体只需按当前搜索词检查一次
+        search_term = self.last_subject_filter or ""
+        texts = self.subject_search_index.texts
+        self.filtered_subjects.extend(
+            i for i in range(start, len(self.all_subjects)) if search_term in texts[i]
+        )
+
+    def finish_loading(self):
+        """加载完成：更新下拉框候选项并启用确定按钮"""
+        self.loading = False
+        self.subject_search_combo['values'] = self.all_track_ids
+        self.object_id_combo['values'] = self.all_track_ids
+        self.load_progress.pack_forget()
+        self.confirm_button.config(state=tk.NORMAL)
+        self.render_subject_rows()
+        self.status_label.config(text=f"已加载 {len(self.all_subjects)} 个主体（Ctrl+Z 撤销，Ctrl+Y 重做）")
 
     def load_temp_custom_relations(self):
         """从临时自定义关系加载"""
@@ -93,13 +252,13 @@ class CustomRelationDialog(tb.Toplevel):
                         display_obj_id = str(int(raw_obj_id) + 1)
                         obj_class = self.id_to_category.get(raw_obj_id, "未知")
 
-                        self.temp_relations.append((
+                        self.relation_store.add((
                             display_subj_id,
                             subj_class,
                             display_obj_id,
                             obj_class,
                             pred
-                        ))
+                        ), new=False)
                     except ValueError:
                         continue
             except ValueError:
@@ -128,18 +287,19 @@ class CustomRelationDialog(tb.Toplevel):
                 obj_class = self.id_to_category.get(raw_obj_id, "未知")
 
                 # 添加到临时关系列表
-                self.temp_relations.append((
+                self.relation_store.add((
                     display_subj_id,
                     subj_class,
                     display_obj_id,
                     obj_class,
                     pred
-                ))
+                ), new=False)
 
-    def parse_existing_relations(self):
-        """解析XML中已有的关系点（不包括上次的自定义关系）"""
+    def parse_existing_relations(self, root, id_to_category):
+        """解析XML中已有的关系点（不包括上次的自定义关系），在后台线程中调用，返回关系列表"""
+        relations = []
         # 遍历所有关系轨迹
-        for track in self.root_et.findall('track'):
+        for track in root.findall('track'):
             if track.get('label') == "Relation":
                 # 提取关系轨迹中的第一个点（获取关系信息）
                 for points in track.findall('points'):
@@ -175,16 +335,16 @@ class CustomRelationDialog(tb.Toplevel):
                             continue
 
                         # 获取主体类别
-                        subj_class = self.id_to_category.get(subject_id_attr, "未知")
+                        subj_class = id_to_category.get(subject_id_attr, "未知")
                         # 获取客体类别（如果有）
                         obj_class = "未知"
                         if object_id_attr and object_id_attr.strip():
-                            obj_class = self.id_to_category.get(object_id_attr, "未知")
+                            obj_class = id_to_category.get(object_id_attr, "未知")
                         else:
                             obj_class = "未知"  # 特殊标记表示客体为空
 
                         # 添加到临时关系列表
-                        self.temp_relations.append((
+                        relations.append((
                             display_subj_id,
                             subj_class,
                             display_obj_id,
@@ -192,6 +352,7 @@ class CustomRelationDialog(tb.Toplevel):
                             predicate_attr
                         ))
                         break  # 只需一个点就能获取关系信息
+        return relations
 
     def convert_existing_relations(self):
         """将已有的自定义关系转换为临时关系格式"""
@@ -208,13 +369,13 @@ class CustomRelationDialog(tb.Toplevel):
                 obj_class = self.id_to_category.get(raw_obj_id, "未知")
 
                 # 添加到临时关系列表
-                self.temp_relations.append((
+                self.relation_store.add((
                     display_subj_id,
                     subj_class,
                     display_obj_id,
                     obj_class,
                     pred
-                ))
+                ), new=False)
 
     def create_widgets(self):
         main_frame = tb.Frame(self, padding=10)
@@ -269,7 +430,7 @@ class CustomRelationDialog(tb.Toplevel):
             bootstyle="primary"
         )
         self.subject_filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-        self.subject_filter_entry.bind("<KeyRelease>", self.filter_subjects)
+        self.subject_filter_entry.bind("<KeyRelease>", self.schedule_filter_subjects)  # 输入防抖
         self.subject_filter_entry.bind("<Return>", self.filter_subjects)  # 添加回车键绑定
 
         # 主体列表（Treeview）
@@ -290,44 +451,55 @@ class CustomRelationDialog(tb.Toplevel):
         self.subject_tree.column("id", width=70, anchor=tk.CENTER)
         self.subject_tree.column("category", width=150, anchor=tk.W)
 
-        vsb = tb.Scrollbar(
+        # 虚拟列表：Treeview只保留可见行数的行槽，滚动条按筛选结果的偏移量驱动
+        self.subject_vsb = tb.Scrollbar(
             subject_tree_frame,
             orient=tk.VERTICAL,
-            command=self.subject_tree.yview,
+            command=self.on_subject_scroll,
             bootstyle="round"
         )
-        self.subject_tree.configure(yscrollcommand=vsb.set)
 
         # 使用grid布局
         self.subject_tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.subject_vsb.grid(row=0, column=1, sticky="ns")
 
         # 配置网格权重
         subject_tree_frame.grid_rowconfigure(0, weight=1)
         subject_tree_frame.grid_columnconfigure(0, weight=1)
 
+        # 渐变色使用固定的少量标签，只配置一次
+        for level, color in enumerate(self.SUBJECT_HEAT_COLORS):
+            self.subject_tree.tag_configure(f"heat{level}", background=color, foreground='black')
+
         # 存储所有主体数据用于筛选
         self.all_subjects = []
-
-        # 初始化关系计数（如果尚未初始化）
-        if not hasattr(self, 'subject_relation_counts'):
-            self.subject_relation_counts = {}
-
-        # 统计每个主体的关系数量
-        for display_id in self.all_track_ids:
-            raw_id = str(int(display_id) - 1)
-            category = self.id_to_category.get(raw_id, "未知")
-            self.all_subjects.append((display_id, category))
-
-            # 统计该主体的关系数量
-            count = sum(1 for rel in self.temp_relations if rel[0] == display_id)
-            self.subject_relation_counts[display_id] = count
+        self.subject_categories = {}  # 显示ID -> 类别
+        self.filtered_subjects = []  # 当前筛选结果（all_subjects的下标）
+        self.last_subject_filter = None  # 上次筛选使用的搜索词
+        self.subject_filter_job = None  # 防抖定时任务
+        self.subject_offset = 0  # 第一个可见行在筛选结果中的位置
+        self.subject_slots = []  # Treeview中的行槽
+        self.subject_slot_ids = []  # 各行槽当前显示的主体ID
+        self.selected_subject_ids = set()  # 选中的主体（显示ID），与可见行无关
+        self.subject_anchor = None  # Shift多选的起点（筛选结果中的位置）
+
+        # 主体搜索索引：ID和类别一起检索（用\0分隔，查询不会跨字段匹配），随加载分批追加
+        self.subject_search_index = SearchIndex([])
 
         # 初始填充主体列表
+        self.resize_subject_slots(self.subject_tree.cget("height"))
         self.filter_subjects()
 
-        # 绑定选择事件
-        self.subject_tree.bind("<<TreeviewSelect>>", self.on_subject_selected)
+        # 选择、滚动由虚拟列表自行处理（行槽内容随滚动变化，不能使用Treeview自身的选择）
+        self.subject_tree.bind("<Button-1>", self.on_subject_click)
+        self.subject_tree.bind("<Control-Button-1>", lambda e: self.on_subject_click(e, toggle=True))
+        self.subject_tree.bind("<Shift-Button-1>", lambda e: self.on_subject_click(e, extend=True))
+        self.subject_tree.bind("<Up>", lambda e: self.move_subject_selection(-1))
+        self.subject_tree.bind("<Down>", lambda e: self.move_subject_selection(1))
+        self.subject_tree.bind("<MouseWheel>", self.on_subject_wheel)
+        self.subject_tree.bind("<Button-4>", lambda e: self.scroll_subjects(-3))
+        self.subject_tree.bind("<Button-5>", lambda e: self.scroll_subjects(3))
+        self.subject_tree.bind("<Configure>", self.on_subject_tree_resize)
 
         # 右侧：关系管理区域
         right_frame = tb.Frame(paned, padding=5)
@@ -449,7 +621,23 @@ class CustomRelationDialog(tb.Toplevel):
             command=self.on_add,
             bootstyle="success",
             width=15
-        ).pack(pady=5)
+        ).pack(side=tk.LEFT, expand=True, pady=5)
+
+        tb.Button(
+            add_btn_frame,
+            text="运动推断...",
+            command=self.open_motion_inference,
+            bootstyle="info-outline",
+            width=15
+        ).pack(side=tk.LEFT, expand=True, pady=5)
+
+        tb.Button(
+            add_btn_frame,
+            text="批量模板...",
+            command=self.open_bulk_template,
+            bootstyle="primary-outline",
+            width=15
+        ).pack(side=tk.LEFT, expand=True, pady=5)
 
         # 当前主体的关系列表
         relation_list_frame = tb.Labelframe(
@@ -520,13 +708,16 @@ class CustomRelationDialog(tb.Toplevel):
         bottom_frame = tb.Frame(button_container)
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=10)
 
-        tb.Button(
+        # 加载完成前禁用确定，避免与尚未读入的已有关系重复
+        self.confirm_button = tb.Button(
             bottom_frame,
             text="确定",
             width=12,
             command=self.on_confirm,
-            bootstyle="success"
-        ).pack(side=tk.RIGHT, padx=5)
+            bootstyle="success",
+            state=tk.DISABLED
+        )
+        self.confirm_button.pack(side=tk.RIGHT, padx=5)
 
         tb.Button(
             bottom_frame,
@@ -536,10 +727,29 @@ class CustomRelationDialog(tb.Toplevel):
             bootstyle="secondary"
         ).pack(side=tk.RIGHT, padx=5)
 
+        # 状态提示（撤销/重做等）
+        self.status_label = tb.Label(
+            bottom_frame,
+            text="正在加载...",
+            bootstyle="secondary"
+        )
+        self.status_label.pack(side=tk.LEFT, padx=5)
+
+        # 加载进度
+        self.load_progress = tb.Progressbar(
+            bottom_frame,
+            mode="determinate",
+            length=200,
+            bootstyle="info-striped"
+        )
+        self.load_progress.pack(side=tk.LEFT, padx=5)
+
         # 绑定右键菜单和键盘事件
         self.subject_tree.bind("<Button-3>", self.show_context_menu)
         self.bind("<Control-z>", self.undo)
         self.bind("<Control-Z>", self.undo)
+        self.bind("<Control-y>", self.redo)
+        self.bind("<Control-Y>", self.redo)
 
         # 创建右键菜单
         self.context_menu = tk.Menu(self, tearoff=0)
@@ -547,74 +757,179 @@ class CustomRelationDialog(tb.Toplevel):
         self.context_menu.add_command(label="粘贴关系", command=self.paste_relations)
 
     # +++ 新增筛选方法 +++
+    def schedule_filter_subjects(self, event=None):
+        """输入防抖：停止输入一段时间后再筛选"""
+        if event is not None and event.keysym == 'Return':
+            return  # 回车已直接触发筛选
+        if self.subject_filter_job is not None:
+            self.after_cancel(self.subject_filter_job)
+        self.subject_filter_job = self.after(self.SUBJECT_FILTER_DELAY_MS, self.filter_subjects)
+
     def filter_subjects(self, event=None):
-        """根据搜索条件筛选主体"""
+        """根据搜索条件筛选主体（搜索词未变时只刷新颜色）"""
+        if self.subject_filter_job is not None:
+            self.after_cancel(self.subject_filter_job)
+            self.subject_filter_job = None
+
         # 获取搜索词并转换为小写
         search_term = self.subject_filter_var.get().strip().lower()
 
-        # 清空当前显示
-        for item in self.subject_tree.get_children():
-            self.subject_tree.delete(item)
-
-        # 确保关系计数字典存在
-        if not hasattr(self, 'subject_relation_counts'):
-            self.subject_relation_counts = {}
-
-        # 计算最大关系数用于颜色渐变
-        max_relations = max(self.subject_relation_counts.values()) if self.subject_relation_counts and len(
-            self.subject_relation_counts) > 0 else 1
-
-        # 如果没有搜索词，显示所有主体
-        if not search_term:
-            for display_id, category in self.all_subjects:
-                # 获取关系数量
-                count = self.subject_relation_counts.get(display_id, 0)
-
-                # 计算渐变色 (从浅蓝色到深蓝色)
-                ratio = count / max_relations
-                r = int(230 * (1 - ratio))  # 红色分量减少
-                g = int(240 * (1 - ratio))  # 绿色分量减少
-                b = 255  # 蓝色保持较高
-                color = f'#{r:02x}{g:02x}{b:02x}'
-
-                # 插入行并设置背景色
-                item = self.subject_tree.insert("", tk.END, values=(display_id, category))
-                self.subject_tree.tag_configure(color, background=color, foreground='black')
-                self.subject_tree.item(item, tags=(color,))
-            return  # 直接返回，不执行后面的筛选逻辑
-
-        # 筛选并添加匹配项
-        for display_id, category in self.all_subjects:
-            # 匹配ID或类别（都转换为小写比较）
-            if (search_term in display_id.lower() or
-                    search_term in category.lower()):
-                # 获取关系数量
-                count = self.subject_relation_counts.get(display_id, 0)
-
-                # 计算渐变色 (从浅蓝色到深蓝色)
-                ratio = count / max_relations
-                r = int(230 * (1 - ratio))  # 红色分量减少
-                g = int(240 * (1 - ratio))  # 绿色分量减少
-                b = 255  # 蓝色保持较高
-                color = f'#{r:02x}{g:02x}{b:02x}'
-
-                # 插入行并设置背景色
-                item = self.subject_tree.insert("", tk.END, values=(display_id, category))
-                self.subject_tree.tag_configure(color, background=color, foreground='black')
-                self.subject_tree.item(item, tags=(color,))
-
-    # +++ 添加更新主体关系计数的方法 +++
-    def update_relation_counts(self):
-        """更新每个主体的关系计数"""
-        # 重置所有计数
-        for display_id in self.subject_relation_counts:
-            self.subject_relation_counts[display_id] = 0
-
-        # 重新计数
-        for rel in self.temp_relations:
-            subject_id = rel[0]
-            if subject_id in self.subject_relation_counts:
-                self.subject_relation_counts[subject_id] += 1
+        if search_term != self.last_subject_filter:
+            self.filtered_subjects = self.subject_search_index.search(search_term)
+            self.last_subject_filter = search_term
+            self.subject_offset = 0
+            self.subject_anchor = None
+
+            # 不在筛选结果中的主体取消选中（只检查选中的主体，不遍历整个筛选结果）
+            if self.selected_subject_ids:
+                self.selected_subject_ids = {
+                    display_id for display_id in self.selected_subject_ids
+                    if self.subject_matches(display_id, search_term)
+                }
+
+        self.render_subject_rows()
+
+    def subject_matches(self, display_id, search_term):
+        """主体是否匹配搜索词（与搜索索引使用相同的文本）"""
+        category = self.subject_categories.get(display_id, "")
+        return search_term in f"{display_id}\0{category}".lower()
+
+    def resize_subject_slots(self, count):
+        """调整行槽数量，使其与可见行数一致"""
+        count = max(1, int(count))
+        while len(self.subject_slots) < count:
+            self.subject_slots.append(self.subject_tree.insert("", tk.END, values=("", "")))
+        while len(self.subject_slots) > count:
+            self.subject_tree.delete(self.subject_slots.pop())
+
+    def on_subject_tree_resize(self, event):
+        """列表高度变化时重新计算可见行数"""
+        style = tb.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        heading_height = row_height + 4
+        count = max(1, (event.height - heading_height) // row_height)
+        if count != len(self.subject_slots):
+            self.resize_subject_slots(count)
+            self.render_subject_rows()
+
+    def render_subject_rows(self):
+        """只填充可见行：按偏移量把筛选结果写入行槽"""
+        total = len(self.filtered_subjects)
+        slot_count = len(self.subject_slots)
+        self.subject_offset = max(0, min(self.subject_offset, total - slot_count))
+        levels = len(self.SUBJECT_HEAT_COLORS) - 1
+        max_relations = self.relation_store.max_count or 1  # 最大关系数用于颜色渐变
+
+        self.subject_slot_ids = []
+        selected_slots = []
+        for slot_index, slot in enumerate(self.subject_slots):
+            position = self.subject_offset + slot_index
+            if position >= total:
+                self.subject_tree.item(slot, values=("", ""), tags=())
+                self.subject_slot_ids.append(None)
+                continue
+
+            display_id, category = self.all_subjects[self.filtered_subjects[position]]
+            count = self.relation_store.count(display_id)
+            level = round(count / max_relations * levels)
+            self.subject_tree.item(slot, values=(display_id, category), tags=(f"heat{level}",))
+            self.subject_slot_ids.append(display_id)
+            if display_id in self.selected_subject_ids:
+                selected_slots.append(slot)
+
+        self.subject_tree.selection_set(selected_slots)
+
+        # 更新滚动条位置
+        if total:
+            self.subject_vsb.set(self.subject_offset / total, min(1.0, (self.subject_offset + slot_count) / total))
+        else:
+            self.subject_vsb.set(0.0, 1.0)
+
+    def on_subject_scroll(self, *args):
+        """滚动条拖动/点击"""
+        slot_count = len(self.subject_slots)
+        if args[0] == 'moveto':
+            self.subject_offset = int(float(args[1]) * len(self.filtered_subjects))
+        elif args[0] == 'scroll':
+            step = slot_count if args[2] == 'pages' else 1
+            self.subject_offset += int(args[1]) * step
+        self.render_subject_rows()
+
+    def scroll_subjects(self, rows):
+        """按行滚动主体列表"""
+        self.subject_offset += rows
+        self.render_subject_rows()
+        return "break"
+
+    def on_subject_wheel(self, event):
+        """鼠标滚轮滚动（Windows/macOS）"""
+        return self.scroll_subjects(-3 if event.delta > 0 else 3)
+
+    def scroll_to_subject(self, position):
+        """滚动使筛选结果中指定位置的主体可见"""
+        slot_count = len(self.subject_slots)
+        if position < self.subject_offset:
+            self.subject_offset = position
+        elif position >= self.subject_offset + slot_count:
+            self.subject_offset = position - slot_count + 1
+
+    def on_subject_click(self, event, toggle=False, extend=False):
+        """主体列表点击：单选 / Ctrl切换 / Shift范围选择"""
+        # 只处理行内的点击；表头和列分隔线交给Treeview（排序、调整列宽）
+        if self.subject_tree.identify_region(event.x, event.y) != "cell":
+            return None
+        self.subject_tree.focus_set()
+        slot = self.subject_tree.identify_row(event.y)
+        if not slot or slot not in self.subject_slots:
+            return "break"
+        slot_index = self.subject_slots.index(slot)
+        display_id = self.subject_slot_ids[slot_index]
+        if display_id is None:
+            return "break"
+        position = self.subject_offset + slot_index
+
+        if extend and self.subject_anchor is not None:
+            low, high = sorted((self.subject_anchor, position))
+            self.selected_subject_ids = {
+                self.all_subjects[i][0] for i in self.filtered_subjects[low:high + 1]
+            }
+        elif toggle:
+            self.selected_subject_ids ^= {display_id}
+            self.subject_anchor = position
+        else:
+            self.selected_subject_ids = {display_id}
+            self.subject_anchor = position
+
+        self.render_subject_rows()
+        self.on_subject_selected(None)
+        return "break"
+
+    def move_subject_selection(self, step):
+        """上下方向键移动选中的主体"""
+        if not self.filtered_subjects:
+            return "break"
+        if self.subject_anchor is None:
+            position = self.subject_offset
+        else:
+            position = max(0, min(len(self.filtered_subjects) - 1, self.subject_anchor + step))
+        self.select_subject_at(position)
+        return "break"
+
+    def select_subject_at(self, position):
+        """选中筛选结果中指定位置的主体并滚动到可见"""
+        display_id = self.all_subjects[self.filtered_subjects[position]][0]
+        self.selected_subject_ids = {display_id}
+        self.subject_anchor = position
+        self.scroll_to_subject(position)
+        self.render_subject_rows()
+        self.on_subject_selected(None)
+
+    def get_selected_subjects(self):
+        """选中的主体 [(显示ID, 类别)]，按ID顺序"""
+        return [
+            (display_id, self.subject_categories.get(display_id, "未知"))
+            for display_id in sorted(self.selected_subject_ids, key=int)
+        ]
 
     def on_combobox_keyrelease(self, event):
         """统一的键盘释放事件处理"""
@@ -702,22 +1017,16 @@ class CustomRelationDialog(tb.Toplevel):
         if not subject_id:
             return
 
-        # 在主体树中查找该ID
-        items = self.subject_tree.get_children()
-        found_item = None
-
-        for item in items:
-            values = self.subject_tree.item(item, "values")
-            if values and values[0] == subject_id:
-                found_item = item
+        # 在筛选结果中查找该ID
+        found_position = None
+        for position, index in enumerate(self.filtered_subjects):
+            if self.all_subjects[index][0] == subject_id:
+                found_position = position
                 break
 
-        if found_item:
-            # 选中该主体
-            self.subject_tree.selection_set(found_item)
-            self.subject_tree.focus(found_item)
-            self.subject_tree.see(found_item)
-            self.on_subject_selected(None)  # 触发选择事件
+        if found_position is not None:
+            # 选中该主体并滚动到可见位置
+            self.select_subject_at(found_position)
         else:
             tb.dialogs.Messagebox.show_warning(f"未找到ID为 {subject_id} 的主体", "提示", parent=self)
 
@@ -725,11 +1034,15 @@ class CustomRelationDialog(tb.Toplevel):
         """获取过滤后的项列表"""
         if not input_text:
             return full_list[:]
+        if full_list is self.all_track_ids:
+            return self.track_id_index.filter(input_text, full_list)
+        if full_list is self.predicates:
+            return self.predicate_index.filter(input_text, full_list)
         return [item for item in full_list if input_text.lower() in item.lower()]
 
     def on_subject_selected(self, event):
         """主体选择事件处理"""
-        selected = self.subject_tree.selection()
+        selected = self.get_selected_subjects()
         if not selected:
             self.current_subject = None
             self.subject_info_label.config(text="未选择主体")
@@ -737,10 +1050,14 @@ class CustomRelationDialog(tb.Toplevel):
             self.relation_tree.delete(*self.relation_tree.get_children())
             return
 
-        item = selected[0]
-        values = self.subject_tree.item(item, "values")
-        if values:  # 确保有值
-            display_id, category = values
+        # Shift/Ctrl多选时显示最近点击的主体
+        anchor_id = None
+        if self.subject_anchor is not None and self.subject_anchor < len(self.filtered_subjects):
+            anchor_id = self.all_subjects[self.filtered_subjects[self.subject_anchor]][0]
+        display_id, category = selected[0]
+        if anchor_id in self.selected_subject_ids:
+            display_id, category = anchor_id, self.subject_categories.get(anchor_id, "未知")
+        if display_id:  # 确保有值
             self.current_subject = display_id
             self.subject_search_var.set(display_id)  # 更新搜索框
             self.subject_info_label.config(text=f"ID: {display_id}, 类别: {category}")
@@ -755,10 +1072,7 @@ class CustomRelationDialog(tb.Toplevel):
             return
 
         # 获取当前主体的所有关系
-        subject_relations = [
-            rel for rel in self.temp_relations
-            if rel[0] == self.current_subject
-        ]
+        subject_relations = self.relation_store.for_subject(self.current_subject)
 
         # 添加到关系列表
         for rel in subject_relations:
@@ -811,12 +1125,7 @@ class CustomRelationDialog(tb.Toplevel):
             return
 
         # 检查是否已存在相同关系
-        existing = [
-            rel for rel in self.temp_relations
-            if rel[0] == self.current_subject and rel[2] == obj_id and rel[4] == pred
-        ]
-
-        if existing:
+        if (self.current_subject, obj_id, pred) in self.relation_store:
             tb.dialogs.Messagebox.show_warning("该关系已存在", "提示", parent=self)
             return
 
@@ -827,27 +1136,15 @@ class CustomRelationDialog(tb.Toplevel):
         except ValueError:
             subj_class = "未知"
 
-        # 添加到临时关系列表（用于对话框显示）
-        self.temp_relations.append((
-            self.current_subject,  # 主体ID（显示ID）
-            subj_class,  # 主体类别
-            obj_id,  # 客体ID（显示ID）
-            obj_class,  # 客体类别
-            pred  # 谓词
-        ))
-        # 同时添加到本次新添加的关系列表（用于传递给主窗口）
-        self.new_relations.append((
-            self.current_subject,
-            subj_class,
-            obj_id,
-            obj_class,
-            pred
-        ))
-        # 更新关系计数
-        if self.current_subject in self.subject_relation_counts:
-            self.subject_relation_counts[self.current_subject] += 1
-        else:
-            self.subject_relation_counts[self.current_subject] = 1
+        # 添加到关系存储（标记为本次新增，确认时传递给主窗口）
+        with self.relation_store.transaction("添加关系"):
+            self.relation_store.add((
+                self.current_subject,  # 主体ID（显示ID）
+                subj_class,  # 主体类别
+                obj_id,  # 客体ID（显示ID）
+                obj_class,  # 客体类别
+                pred  # 谓词
+            ))
         # 更新关系列表
         self.update_relation_list()
         # 更新主体列表显示（刷新颜色）
@@ -871,6 +1168,8 @@ class CustomRelationDialog(tb.Toplevel):
 
         # 收集要删除的关系
         to_delete = []
+        deletion_details = []
+        deletions = []
         for it in sel:
             values = self.relation_tree.item(it, "values")
             if len(values) >= 3:
@@ -879,49 +1178,183 @@ class CustomRelationDialog(tb.Toplevel):
                 to_delete.append((obj_id, predicate))
 
                 # 添加到删除列表（使用显示ID）
-                self.temp_relations_to_delete_details.append(
-                    (self.current_subject, obj_id, predicate)
-                )
+                deletion_details.append((self.current_subject, obj_id, predicate))
 
                 # 添加到删除列表（使用原始ID）
                 try:
                     raw_subj_id = str(int(self.current_subject) - 1)
                     # 处理空对象ID的情况
                     raw_obj_id = str(int(obj_id) - 1) if obj_id and obj_id != "" else ""
-                    self.temp_relations_to_delete.append((raw_subj_id, raw_obj_id, predicate))
+                    deletions.append((raw_subj_id, raw_obj_id, predicate))
                 except ValueError:
                     continue
 
-        # 从临时关系中移除
-        for rel in to_delete:
-            obj_id, predicate = rel
-            self.temp_relations = [
-                r for r in self.temp_relations
-                if not (r[0] == self.current_subject and
-                        r[2] == obj_id and
-                        r[4] == predicate)
-            ]
-
-            # 更新关系计数
-            if self.current_subject in self.subject_relation_counts:
-                self.subject_relation_counts[self.current_subject] = max(0, self.subject_relation_counts[
-                    self.current_subject] - 1)
-
-        # 同时从新添加的关系中移除（如果存在）
-        for rel in to_delete:
-            obj_id, predicate = rel
-            self.new_relations = [
-                r for r in self.new_relations
-                if not (r[0] == self.current_subject and
-                        r[2] == obj_id and
-                        r[4] == predicate)
-            ]
+        # 从关系存储中移除（同时移除本次新增记录和关系计数），删除列表随命令一起撤销
+        with self.relation_store.transaction("删除关系"):
+            self.add_deletions(deletion_details, deletions)
+            self.relation_store.log(
+                lambda: self.drop_deletions(len(deletion_details), len(deletions)),
+                lambda: self.add_deletions(deletion_details, deletions)
+            )
+            for obj_id, predicate in to_delete:
+                self.relation_store.remove(self.current_subject, obj_id, predicate)
 
         # 更新关系列表
         self.update_relation_list()
         # 更新主体列表显示（刷新颜色）
         self.filter_subjects()
 
+    def open_motion_inference(self):
+        """在后台推断运动关系（跟随/同行/携带），完成后打开审核对话框"""
+        if self.loading:
+            self.status_label.config(text="请等待加载完成后再进行运动推断")
+            return
+
+        # 已有关系的主体-客体对（原始ID）不再推断
+        existing = set()
+        for subject, obj, _ in list(self.relation_store.relations):
+            try:
+                existing.add((str(int(subject) - 1), str(int(obj) - 1)))
+            except ValueError:
+                continue
+
+        self.motion_result = None
+        root = self.root_et
+
+        def worker():
+            try:
+                self.motion_result = infer_motion_relations(AnnotationIndex(root), existing=existing)
+            except Exception as e:
+                print(f"运动推断失败: {e}")
+                self.motion_result = e
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        self.status_label.config(text="正在推断运动关系...")
+        self.after(100, self.check_motion_inference, thread)
+
+    def check_motion_inference(self, thread):
+        """等待推断线程结束后显示候选"""
+        if thread.is_alive():
+            self.after(100, self.check_motion_inference, thread)
+            return
+
+        result = self.motion_result
+        if isinstance(result, Exception):
+            self.status_label.config(text="运动推断失败")
+            tb.dialogs.Messagebox.show_error(f"运动推断失败: {result}", "错误", parent=self)
+            return
+        if not result:
+            self.status_label.config(text="没有找到运动相关的轨迹对")
+            return
+
+        self.status_label.config(text=f"找到 {len(result)} 个候选关系，请审核")
+        review = MotionCandidateDialog(self, result, self.predicates, self.id_to_category)
+        self.wait_window(review)
+        if review.result:
+            self.accept_candidate_relations(review.result)
+
+    def accept_candidate_relations(self, accepted):
+        """把审核通过的候选 [(主体原始ID, 客体原始ID, 谓词)] 作为一条命令加入关系存储"""
+        added = 0
+        with self.relation_store.transaction("接受推断关系"):
+            for raw_subj_id, raw_obj_id, predicate in accepted:
+                relation = (
+                    str(int(raw_subj_id) + 1),
+                    self.id_to_category.get(raw_subj_id, "未知"),
+                    str(int(raw_obj_id) + 1),
+                    self.id_to_category.get(raw_obj_id, "未知"),
+                    predicate
+                )
+                if self.relation_store.add(relation):
+                    added += 1
+
+        self.update_relation_list()
+        self.filter_subjects()
+        self.status_label.config(text=f"已接受 {added} 条推断关系（Ctrl+Z 可撤销）")
+
+    def open_bulk_template(self):
+        """打开批量模板对话框，把同一客体和谓词应用到整个类别或筛选结果中的所有主体"""
+        if self.loading:
+            self.status_label.config(text="请等待加载完成后再使用批量模板")
+            return
+
+        dialog = BulkTemplateDialog(self)
+        self.wait_window(dialog)
+        if dialog.result:
+            self.apply_template_relations(dialog.result)
+
+    def template_tracks(self, mode, value):
+        """模板选择器对应的轨迹 [(显示ID, 类别)]：mode为'class'（类别）、'filter'（搜索词）或'id'（显示ID）"""
+        value = value.strip()
+        if mode == 'class':
+            category = value.lower()
+            track_ids = self.category_to_trackids.get(category)
+            if not track_ids:
+                raise ValueError(f"类别不存在: {value}")
+            return [(str(int(track_id) + 1), category) for track_id in track_ids if track_id.isdigit()]
+        if mode == 'filter':
+            return [self.all_subjects[i] for i in self.subject_search_index.search(value.lower())]
+
+        if not value.isdigit():
+            raise ValueError("客体ID必须是数字")
+        raw_id = str(int(value) - 1)
+        if raw_id not in self.id_to_category:
+            raise ValueError("客体ID不存在")
+        return [(value, self.id_to_category[raw_id])]
+
+    def build_template_relations(self, template):
+        """
+        按模板生成关系：template为 {'subject_mode', 'subject', 'object_mode', 'object', 'predicate'}。
+        返回 (待添加的关系列表, 已存在而跳过的数量)；主体与客体相同的组合跳过。
+        模板无效或组合数超过上限时抛出ValueError。
+        """
+        predicate = template['predicate'].strip()
+        if not predicate:
+            raise ValueError("请选择或输入谓词")
+        subjects = self.template_tracks(template['subject_mode'], template['subject'])
+        if not subjects:
+            raise ValueError("没有符合条件的主体")
+        objects = self.template_tracks(template['object_mode'], template['object'])
+        if len(subjects) * len(objects) > self.BULK_TEMPLATE_LIMIT:
+            raise ValueError(
+                f"组合数 {len(subjects) * len(objects)} 超过上限 {self.BULK_TEMPLATE_LIMIT}，请缩小主体或客体范围"
+            )
+
+        existing = self.relation_store.relations
+        relations = []
+        skipped = 0
+        for subj_id, subj_class in subjects:
+            for obj_id, obj_class in objects:
+                if subj_id == obj_id:
+                    continue
+                if (subj_id, obj_id, predicate) in existing:
+                    skipped += 1
+                    continue
+                relations.append((subj_id, subj_class, obj_id, obj_class, predicate))
+        return relations, skipped
+
+    def apply_template_relations(self, relations):
+        """把模板生成的关系作为一条命令批量加入存储，最后统一刷新界面"""
+        with self.relation_store.transaction("批量模板"):
+            added = self.relation_store.add_many(relations)
+
+        self.update_relation_list()
+        self.filter_subjects()
+        self.status_label.config(text=f"批量模板已添加 {len(added)} 条关系（Ctrl+Z 可撤销）")
+
+    def add_deletions(self, details, deletions):
+        """追加到删除列表（显示ID详情 / 原始ID）"""
+        self.temp_relations_to_delete_details.extend(details)
+        self.temp_relations_to_delete.extend(deletions)
+
+    def drop_deletions(self, detail_count, deletion_count):
+        """撤销删除：移除删除列表末尾最近追加的项"""
+        if detail_count:
+            del self.temp_relations_to_delete_details[-detail_count:]
+        if deletion_count:
+            del self.temp_relations_to_delete[-deletion_count:]
+
     def on_confirm(self):
         """确认按钮事件"""
         # 将本次新添加的关系点转换为custom_relations格式
@@ -952,7 +1385,7 @@ class CustomRelationDialog(tb.Toplevel):
     def convert_new_relations_to_custom(self):
         """将本次新添加的关系列表转换为custom_relations字典格式"""
         self.temp_custom_relations = {}
-        for rel in self.new_relations:
+        for rel in self.relation_store.new_relations():
             display_subj_id, _, display_obj_id, _, predicate = rel
             try:
                 # 将显示ID转换为原始ID
@@ -969,7 +1402,7 @@ class CustomRelationDialog(tb.Toplevel):
 
     def on_cancel(self):
         """取消按钮事件 - 同时清空临时关系列表"""
-        self.temp_relations = []
+        self.relation_store.clear()
         self.destroy()
 
     def save_config(self):
@@ -987,7 +1420,7 @@ class CustomRelationDialog(tb.Toplevel):
     def convert_temp_relations_to_custom(self):
         """将临时关系列表转换为custom_relations字典格式"""
         self.temp_custom_relations = {}
-        for rel in self.temp_relations:
+        for rel in self.relation_store:
             display_subj_id, _, display_obj_id, _, predicate = rel
             try:
                 # 将显示ID转换为原始ID
@@ -1005,7 +1438,7 @@ class CustomRelationDialog(tb.Toplevel):
     def convert_new_relations_to_custom(self):
         """将本次新添加的关系列表转换为custom_relations字典格式"""
         self.temp_custom_relations = {}
-        for rel in self.new_relations:
+        for rel in self.relation_store.new_relations():
             display_subj_id, _, display_obj_id, _, predicate = rel
             try:
                 # 将显示ID转换为原始ID
@@ -1022,22 +1455,23 @@ class CustomRelationDialog(tb.Toplevel):
 
     def show_context_menu(self, event):
         """显示右键菜单 - 防止多选状态丢失"""
-        # 获取鼠标位置下的项目
-        item = self.subject_tree.identify_row(event.y)
-
-        # 如果点击在项目上，确保它被包含在选中项中
-        if item:
-            # 获取当前所有选中项
-            current_selection = set(self.subject_tree.selection())
-
-            # 如果点击的项目不在当前选中项中
-            if item not in current_selection:
-                # 清除所有选中项，只选中当前点击的项目
-                self.subject_tree.selection_set(item)
-                self.context_menu_selection = [item]
-            else:
-                # 保持当前多选状态
-                self.context_menu_selection = list(current_selection)
+        # 获取鼠标位置下的主体
+        slot = self.subject_tree.identify_row(event.y)
+        display_id = None
+        if slot in self.subject_slots:
+            display_id = self.subject_slot_ids[self.subject_slots.index(slot)]
+
+        # 如果点击在主体上，确保它被包含在选中项中
+        if display_id:
+            # 如果点击的主体不在当前选中项中
+            if display_id not in self.selected_subject_ids:
+                # 清除所有选中项，只选中当前点击的主体
+                self.selected_subject_ids = {display_id}
+                self.subject_anchor = self.subject_offset + self.subject_slots.index(slot)
+                self.render_subject_rows()
+                self.on_subject_selected(None)
+            # 保存选中的主体（显示ID, 类别）
+            self.context_menu_selection = self.get_selected_subjects()
 
             # 显示菜单
             self.context_menu.post(event.x_root, event.y_root)
@@ -1047,28 +1481,19 @@ class CustomRelationDialog(tb.Toplevel):
 
     def copy_relations(self):
         """复制选中主体的所有关系"""
-        selected_items = self.subject_tree.selection()
+        selected_items = self.get_selected_subjects()
         if not selected_items:
             return
 
-        # 保存当前状态用于撤销
-        self.save_state()
-
         # 清空之前的复制
         self.copied_relations = []
 
         # 收集所有选中主体的关系
-        for item in selected_items:
-            values = self.subject_tree.item(item, "values")
-            if not values:
-                continue
-            subj_display_id = values[0]  # 主体显示ID
-
-            # 从临时关系中找出该主体的所有关系
-            for rel in self.temp_relations:
-                if rel[0] == subj_display_id:
-                    # 存储关系：客体ID、客体类别、谓词
-                    self.copied_relations.append((rel[2], rel[3], rel[4]))
+        for subj_display_id, _ in selected_items:
+            # 从关系存储中取出该主体的所有关系
+            for rel in self.relation_store.for_subject(subj_display_id):
+                # 存储关系：客体ID、客体类别、谓词
+                self.copied_relations.append((rel[2], rel[3], rel[4]))
 
         #tb.dialogs.Messagebox.show_info(f"已复制 {len(self.copied_relations)} 条关系", "复制成功", parent=self)
 
@@ -1082,87 +1507,333 @@ class CustomRelationDialog(tb.Toplevel):
         if not selected_items:
             return
 
-        # 保存当前状态用于撤销
-        self.save_state()
-
         added_count = 0
 
         # 收集所有主体ID和类别
         subjects = []
-        for item in selected_items:
-            values = self.subject_tree.item(item, "values")
-            if values:
-                subjects.append({
-                    "id": values[0],
-                    "class": values[1]
-                })
+        for display_id, category in selected_items:
+            subjects.append({
+                "id": display_id,
+                "class": category
+            })
 
         # 如果当前选中的主体在粘贴列表中，更新其关系显示
         current_subject_in_selection = self.current_subject in [s["id"] for s in subjects]
 
-        # 创建关系存在性检查的缓存
-        existing_relations_cache = {}
-        for rel in self.temp_relations:
-            key = (rel[0], rel[2], rel[4])  # (subject, object, predicate)
-            existing_relations_cache[key] = True
+        # 为每个主体添加复制的每个关系（整批添加，作为一条可撤销命令）
+        new_relations = [
+            (subject["id"], subject["class"], obj_display_id, obj_class, predicate)
+            for subject in subjects
+            for obj_display_id, obj_class, predicate in self.copied_relations
+        ]
+        with self.relation_store.transaction("粘贴关系"):
+            # 已存在的关系由存储跳过
+            added_count = len(self.relation_store.add_many(new_relations))
+
+        # 如果有选中的主体在粘贴列表中，更新其关系列表
+        if self.current_subject and current_subject_in_selection:
+            self.update_relation_list()
 
-        # 为每个主体添加复制的每个关系
-        for subject in subjects:
-            subj_display_id = subject["id"]
-            subj_class = subject["class"]
+        # 更新主体列表显示（刷新颜色）
+        self.filter_subjects()
 
-            for rel in self.copied_relations:
-                obj_display_id, obj_class, predicate = rel
 
-                # 检查关系是否已存在（使用缓存）
-                key = (subj_display_id, obj_display_id, predicate)
-                if key in existing_relations_cache:
-                    continue  # 跳过已存在的关系
 
-                # 添加新关系
-                new_rel = (subj_display_id, subj_class, obj_display_id, obj_class, predicate)
-                self.temp_relations.append(new_rel)
-                self.new_relations.append(new_rel)  # 同时添加到 new_relations
-                added_count += 1
 
-                # 添加到缓存
-                existing_relations_cache[key] = True
+    def undo(self, event=None):
+        """撤销上一步操作"""
+        name = self.relation_store.undo()
+        if name is None:
+            self.status_label.config(text="没有可撤销的操作")
+            return
 
-                # 更新关系计数
-                if subj_display_id in self.subject_relation_counts:
-                    self.subject_relation_counts[subj_display_id] += 1
-                else:
-                    self.subject_relation_counts[subj_display_id] = 1
+        # 更新关系列表和主体列表显示
+        self.update_relation_list()
+        self.filter_subjects()
 
-        # 如果有选中的主体在粘贴列表中，更新其关系列表
-        if self.current_subject and current_subject_in_selection:
-            self.update_relation_list()
+        # 提示用户
+        self.status_label.config(text=f"已撤销: {name}（可撤销 {len(self.relation_store.undo_stack)} 步）")
 
-        # 更新主体列表显示（刷新颜色）
+    def redo(self, event=None):
+        """重做上一步撤销的操作"""
+        name = self.relation_store.redo()
+        if name is None:
+            self.status_label.config(text="没有可重做的操作")
+            return
+
+        self.update_relation_list()
         self.filter_subjects()
+        self.status_label.config(text=f"已重做: {name}（可重做 {len(self.relation_store.redo_stack)} 步）")
 
 
+class MotionCandidateDialog(tb.Toplevel):
+    """运动推断候选审核对话框 - 按置信度排序，可修改谓词后接受选中的候选"""
 
+    KIND_NAMES = {'follow': "跟随", 'together': "同行", 'attached': "携带"}
 
-    def save_state(self):
-        """保存当前状态到历史记录"""
-        # 最多保存10个历史状态
-        if len(self.history) >= 10:
-            self.history.pop(0)
+    def __init__(self, parent, candidates, predicates, id_to_category):
+        super().__init__(parent)
+        self.title("运动推断候选关系")
+        self.geometry("760x480")
+        self.candidates = {}  # {行: [主体ID, 客体ID, 谓词]}（原始ID）
+        self.result = None
 
-        # 保存当前状态
-        self.history.append(self.temp_relations.copy())
+        tb.Label(
+            self,
+            text="根据轨迹速度相关性推断的候选关系，选中后可修改谓词；谓词为空的候选需先设置谓词才会被接受",
+            bootstyle="info"
+        ).pack(fill=tk.X, padx=10, pady=(10, 5))
 
-    def undo(self, event=None):
-        """撤销上一步操作"""
-        if not self.history:
+        tree_frame = tb.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        columns = ("subject", "object", "kind", "predicate", "confidence", "windows")
+        self.tree = tb.Treeview(
+            tree_frame,
+            columns=columns,
+            show="headings",
+            selectmode="extended",
+            bootstyle="light"
+        )
+        headings = {
+            "subject": ("主体", 150), "object": ("客体", 150), "kind": ("类型", 60),
+            "predicate": ("谓词", 130), "confidence": ("置信度", 70), "windows": ("窗口", 80),
+        }
+        for column, (text, width) in headings.items():
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=tk.W if column in ("subject", "object", "predicate") else tk.CENTER)
+        vsb = tb.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview, bootstyle="round")
+        self.tree.configure(yscrollcommand=vsb.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        vsb.grid(row=0, column=1, sticky="ns")
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+
+        # 默认谓词只在标签配置的谓词中存在时填入，否则留空，需用户选择后才能接受
+        allowed_predicates = set(predicates)
+        for subject_id, object_id, kind, confidence, count, shared in candidates:
+            predicate = MOTION_PREDICATES.get(kind, "")
+            if predicate not in allowed_predicates:
+                predicate = ""
+            item = self.tree.insert("", tk.END, values=(
+                f"#{int(subject_id) + 1} {id_to_category.get(subject_id, '未知')}",
+                f"#{int(object_id) + 1} {id_to_category.get(object_id, '未知')}",
+                self.KIND_NAMES.get(kind, kind),
+                predicate,
+                f"{confidence:.2f}",
+                f"{count}/{shared}"
+            ))
+            self.candidates[item] = [subject_id, object_id, predicate]
+
+        # 修改选中候选的谓词
+        edit_frame = tb.Frame(self)
+        edit_frame.pack(fill=tk.X, padx=10, pady=5)
+        tb.Label(edit_frame, text="谓词:").pack(side=tk.LEFT)
+        self.pred_var = tk.StringVar()
+        tb.Combobox(
+            edit_frame,
+            textvariable=self.pred_var,
+            values=list(predicates),
+            width=25,
+            bootstyle="primary"
+        ).pack(side=tk.LEFT, padx=5)
+        tb.Button(
+            edit_frame,
+            text="应用到选中",
+            command=self.apply_predicate,
+            bootstyle="secondary-outline"
+        ).pack(side=tk.LEFT)
+
+        btn_frame = tb.Frame(self)
+        btn_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        tb.Button(btn_frame, text="接受选中", command=self.on_ok, bootstyle="success").pack(side=tk.RIGHT, padx=5)
+        tb.Button(btn_frame, text="取消", command=self.destroy, bootstyle="secondary").pack(side=tk.RIGHT)
+        tb.Button(btn_frame, text="全选", command=self.select_all, bootstyle="info-outline").pack(side=tk.LEFT)
+
+        self.bind("<Escape>", lambda e: self.destroy())
+        self.transient(parent)
+        self.grab_set()
+
+    def select_all(self):
+        self.tree.selection_set(self.tree.get_children())
+
+    def apply_predicate(self):
+        """把输入的谓词应用到选中的候选"""
+        predicate = self.pred_var.get().strip()
+        if not predicate:
+            return
+        for item in self.tree.selection():
+            self.candidates[item][2] = predicate
+            self.tree.set(item, "predicate", predicate)
+
+    def on_ok(self):
+        """接受选中的候选（没有谓词的候选跳过）"""
+        self.result = [
+            tuple(self.candidates[item])
+            for item in self.tree.selection()
+            if self.candidates[item][2]
+        ]
+        self.destroy()
+
+
+class BulkTemplateDialog(tb.Toplevel):
+    """批量模板对话框 - 选择主体范围（类别/筛选）、客体（ID/类别）和谓词，预览后一次性应用"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("批量关系模板")
+        self.geometry("520x330")
+        self.parent_dialog = parent
+        self.result = None  # 待添加的关系列表
+        categories = sorted(parent.category_to_trackids)
+
+        form = tb.Frame(self)
+        form.pack(fill=tk.BOTH, expand=True, padx=15, pady=10)
+        form.grid_columnconfigure(3, weight=1)
+
+        # 主体范围：某个类别的所有主体，或匹配搜索词的所有主体（默认使用当前主体筛选）
+        tb.Label(form, text="主体:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.subject_mode = tk.StringVar(value='class')
+        tb.Radiobutton(form, text="按类别", variable=self.subject_mode, value='class').grid(row=0, column=1, padx=5)
+        tb.Radiobutton(form, text="按筛选", variable=self.subject_mode, value='filter').grid(row=0, column=2, padx=5)
+        self.subject_var = tk.StringVar(value=parent.subject_filter_var.get().strip())
+        tb.Combobox(form, textvariable=self.subject_var, values=categories, bootstyle="primary").grid(
+            row=0, column=3, sticky="ew", pady=5)
+        if self.subject_var.get():
+            self.subject_mode.set('filter')
+
+        # 客体：指定的一个客体，或某个类别的所有客体
+        tb.Label(form, text="客体:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.object_mode = tk.StringVar(value='id')
+        tb.Radiobutton(form, text="指定ID", variable=self.object_mode, value='id').grid(row=1, column=1, padx=5)
+        tb.Radiobutton(form, text="按类别", variable=self.object_mode, value='class').grid(row=1, column=2, padx=5)
+        self.object_var = tk.StringVar(value=parent.object_id_var.get().strip())
+        tb.Combobox(form, textvariable=self.object_var, values=categories, bootstyle="primary").grid(
+            row=1, column=3, sticky="ew", pady=5)
+
+        tb.Label(form, text="谓词:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.pred_var = tk.StringVar(value=parent.pred_var.get().strip())
+        tb.Combobox(form, textvariable=self.pred_var, values=parent.predicates, bootstyle="primary").grid(
+            row=2, column=1, columnspan=3, sticky="ew", pady=5)
+
+        self.preview_label = tb.Label(form, text="点击“预览”查看将添加的关系数量", bootstyle="info")
+        self.preview_label.grid(row=3, column=0, columnspan=4, sticky=tk.W, pady=(15, 5))
+
+        btn_frame = tb.Frame(self)
+        btn_frame.pack(fill=tk.X, padx=15, pady=(5, 15))
+        tb.Button(btn_frame, text="应用", command=self.on_ok, bootstyle="success").pack(side=tk.RIGHT, padx=5)
+        tb.Button(btn_frame, text="取消", command=self.destroy, bootstyle="secondary").pack(side=tk.RIGHT)
+        tb.Button(btn_frame, text="预览", command=self.preview, bootstyle="info-outline").pack(side=tk.LEFT)
+
+        self.bind("<Escape>", lambda e: self.destroy())
+        self.transient(parent)
+        self.grab_set()
+
+    def get_template(self):
+        return {
+            'subject_mode': self.subject_mode.get(),
+            'subject': self.subject_var.get(),
+            'object_mode': self.object_mode.get(),
+            'object': self.object_var.get(),
+            'predicate': self.pred_var.get(),
+        }
+
+    def build(self):
+        """按当前模板生成关系，模板无效时显示错误并返回None"""
+        try:
+            return self.parent_dialog.build_template_relations(self.get_template())
+        except ValueError as e:
+            self.preview_label.config(text=str(e), bootstyle="danger")
+            return None
+
+    def preview(self):
+        built = self.build()
+        if built is not None:
+            relations, skipped = built
+            self.preview_label.config(
+                text=f"将添加 {len(relations)} 条关系，跳过 {skipped} 条已存在的关系",
+                bootstyle="info"
+            )
+
+    def on_ok(self):
+        built = self.build()
+        if built is None:
+            return
+        relations, _ = built
+        if not relations:
+            self.preview_label.config(text="没有需要添加的关系", bootstyle="warning")
             return
+        self.result = relations
+        self.destroy()
 
-        # 恢复上一步的状态
-        self.temp_relations = self.history.pop()
 
-        # 更新关系列表显示
-        self.update_relation_list()
+class PredicatePickerDialog(tb.Toplevel):
+    """谓词选择对话框 - 图片查看器点选关系时使用，输入过滤，回车确认"""
 
-        # 提示用户
-        self.status_label.config(text="已撤销上一步操作")
\ No newline at end of file
+    def __init__(self, parent, predicates, subject_text, object_text):
+        super().__init__(parent)
+        self.title("选择谓词")
+        self.geometry("320x380")
+        self.predicates = list(predicates)
+        self.filtered = self.predicates[:]
+        self.search_index = SearchIndex(self.predicates)
+        self.result = None
+
+        tb.Label(
+            self,
+            text=f"{subject_text}  →  {object_text}",
+            bootstyle="primary"
+        ).pack(fill=tk.X, padx=10, pady=(10, 5))
+
+        self.filter_var = tk.StringVar()
+        self.filter_entry = tb.Entry(self, textvariable=self.filter_var, bootstyle="primary")
+        self.filter_entry.pack(fill=tk.X, padx=10, pady=5)
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+
+        self.listbox = tk.Listbox(self, activestyle="dotbox", exportselection=False)
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.listbox.bind("<Double-Button-1>", lambda e: self.on_ok())
+
+        btn_frame = tb.Frame(self)
+        btn_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        tb.Button(btn_frame, text="确定", command=self.on_ok, bootstyle="success").pack(side=tk.RIGHT, padx=5)
+        tb.Button(btn_frame, text="取消", command=self.destroy, bootstyle="secondary").pack(side=tk.RIGHT)
+
+        self.bind("<Return>", lambda e: self.on_ok())
+        self.bind("<Escape>", lambda e: self.destroy())
+        self.bind("<Down>", lambda e: self.move_selection(1))
+        self.bind("<Up>", lambda e: self.move_selection(-1))
+
+        self.apply_filter()
+        self.transient(parent)
+        self.grab_set()
+        self.filter_entry.focus_set()
+
+    def apply_filter(self):
+        """按输入过滤谓词，默认选中第一项"""
+        text = self.filter_var.get().strip().lower()
+        self.filtered = self.search_index.filter(text, self.predicates)
+        self.listbox.delete(0, tk.END)
+        for predicate in self.filtered:
+            self.listbox.insert(tk.END, predicate)
+        if self.filtered:
+            self.listbox.selection_set(0)
+
+    def move_selection(self, step):
+        """上下键移动选中项"""
+        if not self.filtered:
+            return
+        selection = self.listbox.curselection()
+        index = selection[0] + step if selection else 0
+        index = max(0, min(len(self.filtered) - 1, index))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+
+    def on_ok(self):
+        """确认选择；列表为空时直接使用输入的文本"""
+        selection = self.listbox.curselection()
+        if selection:
+            self.result = self.filtered[selection[0]]
+        else:
+            self.result = self.filter_var.get().strip() or None
+        self.destroy()
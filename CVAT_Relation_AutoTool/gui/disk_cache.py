@@ -0,0 +1,113 @@
+import os
+import shutil
+import threading
+import time
+
+
+class DiskCacheBudget:
+    """
+    磁盘缓存容量上限 - 记录缓存目录中各条目的大小和最近使用时间（文件修改时间），
+    总大小超过上限时删除最久未使用的条目，直到降到上限的90%。
+    条目为缓存目录下的文件（entry_dirs=False）或一级子目录（entry_dirs=True，如每张图片的瓦片目录）。
+    首次写入时才扫描缓存目录，之后增量记录。
+    """
+
+    LOW_WATERMARK = 0.9  # 清理后保留的比例
+
+    def __init__(self, root, max_bytes, entry_dirs=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entry_dirs = entry_dirs
+        self.entries = None  # {路径: [字节数, 最近使用时间]}，首次写入时扫描
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def _scan(self):
+        """扫描缓存目录中已有的条目（调用方持有锁）"""
+        self.entries = {}
+        self.total_bytes = 0
+        if not os.path.isdir(self.root):
+            return
+        if self.entry_dirs:
+            with os.scandir(self.root) as items:
+                for item in items:
+                    if item.is_dir(follow_symlinks=False):
+                        self._record(item.path, _dir_bytes(item.path), item.stat().st_mtime)
+        else:
+            for dir_path, _, file_names in os.walk(self.root):
+                for file_name in file_names:
+                    path = os.path.join(dir_path, file_name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    self._record(path, st.st_size, st.st_mtime)
+
+    def _record(self, path, size, mtime):
+        old = self.entries.get(path)
+        if old is not None:
+            self.total_bytes -= old[0]
+        self.entries[path] = [size, mtime]
+        self.total_bytes += size
+
+    def add(self, path, size=None):
+        """记录新写入的条目（size为None时统计磁盘大小），超出上限时清理，返回删除的条目数"""
+        if size is None:
+            size = _dir_bytes(path) if self.entry_dirs else os.path.getsize(path)
+        with self.lock:
+            if self.entries is None:
+                self._scan()
+            self._record(path, size, time.time())
+            return self._prune(keep=path)
+
+    def touch(self, path):
+        """标记条目刚被使用（更新修改时间，使其最后被淘汰）"""
+        try:
+            os.utime(path)
+        except OSError:
+            return
+        with self.lock:
+            if self.entries is not None and path in self.entries:
+                self.entries[path][1] = time.time()
+
+    def _prune(self, keep=None):
+        """删除最久未使用的条目直到低于低水位（调用方持有锁），keep不删除"""
+        if self.max_bytes <= 0 or self.total_bytes <= self.max_bytes:
+            return 0
+        target = self.max_bytes * self.LOW_WATERMARK
+        removed = 0
+        for path, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                if self.entry_dirs:
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"清理磁盘缓存失败: {e}")
+                continue
+            del self.entries[path]
+            self.total_bytes -= size
+            removed += 1
+        return removed
+
+    def usage(self):
+        """已记录的磁盘占用字节数（尚未扫描时为0）"""
+        return self.total_bytes
+
+
+def _dir_bytes(path):
+    """目录中所有文件的总字节数"""
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+    return total
@@ -0,0 +1,139 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from .memory_budget import image_bytes
+
+
+def decode_image(image_path, scale=1.0):
+    """
+    解码图片（可在工作线程中调用）。
+    scale < 1 时对JPEG使用draft模式直接按1/2、1/4或1/8分辨率解码（DCT缩放），
+    解码结果不小于原图尺寸 * scale。
+    返回 (图片, 原图尺寸)。
+    """
+    img = Image.open(image_path)
+    full_size = img.size
+    if scale < 1.0:
+        img.draft(img.mode, (
+            max(1, math.ceil(full_size[0] * scale)),
+            max(1, math.ceil(full_size[1] * scale))
+        ))
+    img.load()
+    return img, full_size
+
+
+class FramePrefetcher:
+    """
+    帧预解码流水线 - 在工作线程中提前解码后续帧。
+    内存预算淘汰预解码帧时同时缩小预读窗口，避免下一次预读又重新解码被淘汰的帧；
+    之后没有再被淘汰时每隔一段时间恢复一帧，直到回到lookahead。
+    """
+
+    GROW_INTERVAL = 1.0  # 预读窗口恢复一帧的间隔（秒）
+
+    def __init__(self, path_getter, scale_getter=None, max_workers=2, lookahead=8):
+        self.path_getter = path_getter  # 帧号 -> 图片路径（不存在时返回None）
+        self.scale_getter = scale_getter  # 当前需要的解码比例（None表示完整分辨率）
+        self.lookahead = lookahead  # 预解码的最大帧数
+        self.window = lookahead  # 当前预读窗口（内存不足时缩小）
+        self.window_start = 0  # 最近一次预读的起始帧
+        self.window_changed = 0.0  # 预读窗口最近一次变化的时间
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="frame-decode"
+        )
+        self.pending = {}  # {frame: Future}，只在Tk线程中访问
+        self.submit_times = {}  # {frame: 提交时间}
+
+    def prefetch(self, start_frame, end_frame):
+        """提交[start_frame, end_frame)范围内、预读窗口以内的解码任务"""
+        now = time.monotonic()
+        if self.window < self.lookahead and now - self.window_changed >= self.GROW_INTERVAL:
+            self.window += 1
+            self.window_changed = now
+        self.window_start = start_frame
+        end_frame = min(end_frame, start_frame + self.window)
+        scale = self.scale_getter() if self.scale_getter else 1.0
+        for frame in range(start_frame, end_frame):
+            if frame in self.pending:
+                continue
+            image_path = self.path_getter(frame)
+            if image_path is None:
+                continue
+            self.pending[frame] = self.executor.submit(decode_image, image_path, scale)
+            self.submit_times[frame] = time.monotonic()
+
+    def is_ready(self, frame):
+        """指定帧是否已解码完成"""
+        future = self.pending.get(frame)
+        return future is not None and future.done()
+
+    def take(self, frame):
+        """取出已解码的帧 (图片, 原图尺寸)，未完成或解码失败时返回None"""
+        future = self.pending.get(frame)
+        if future is None or not future.done():
+            return None
+        del self.pending[frame]
+        self.submit_times.pop(frame, None)
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"预解码失败: {e}")
+            return None
+
+    def discard_outside(self, start_frame, end_frame):
+        """丢弃不在[start_frame, end_frame)范围内的任务"""
+        for frame in list(self.pending):
+            if not (start_frame <= frame < end_frame):
+                self.pending.pop(frame).cancel()
+                self.submit_times.pop(frame, None)
+
+    def clear(self):
+        """取消所有待处理任务"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.submit_times = {}
+
+    def _decoded_bytes(self, future):
+        """已完成任务的解码结果占用的字节数"""
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return 0
+        return image_bytes(future.result()[0])
+
+    def memory_usage(self):
+        """已解码但尚未显示的帧占用的字节数"""
+        return sum(self._decoded_bytes(f) for f in self.pending.values())
+
+    def evict_one(self):
+        """
+        丢弃最晚才会用到（帧号最大）的已解码帧，返回释放的字节数；
+        预读窗口缩小到该帧之前，不再重新提交该帧及之后的帧。
+        """
+        frame = self._eviction_candidate()
+        if frame is None:
+            return 0
+        released = self._decoded_bytes(self.pending.pop(frame))
+        self.submit_times.pop(frame, None)
+        self.window = max(1, min(self.window, frame - self.window_start))
+        self.window_changed = time.monotonic()
+        return released
+
+    def _eviction_candidate(self):
+        """evict_one将要丢弃的帧（帧号最大的已解码帧），没有则返回None"""
+        done = [frame for frame, f in self.pending.items() if self._decoded_bytes(f)]
+        return max(done) if done else None
+
+    def oldest_access(self):
+        """evict_one将要丢弃的帧的提交时间"""
+        frame = self._eviction_candidate()
+        if frame is None:
+            return None
+        return self.submit_times.get(frame)
+
+    def shutdown(self):
+        """关闭工作线程"""
+        self.clear()
+        self.executor.shutdown(wait=False)
@@ -1,35 +1,71 @@
 import tkinter as tk
 import ttkbootstrap as tb
-from PIL import Image, ImageDraw, ImageFont, ImageTk
+from PIL import Image, ImageDraw, ImageTk
 import os
+import math
+import re
+import time
+from collections import deque
 import xml.etree.ElementTree as ET
+from annotation_index import AnnotationIndex
+import annotation_renderer
+from frame_density import FrameDensity
+from config import DEFAULT_CONFIG
+from image_files import list_image_files, parse_frame_names, build_frame_file_map
+from .frame_loader import FramePrefetcher, decode_image
+from .timeline import ThumbnailCache, TimelineStrip, DensityStrip
+from .tile_pyramid import TilePyramid, DEFAULT_TILE_DIR
+from .disk_cache import DiskCacheBudget
+from .render_stats import RenderStats
+from .dialogs import PredicatePickerDialog
+from .memory_budget import MemoryBudget, image_bytes
 
 
 class ImageViewer(tb.Frame):
     """图片查看器组件 - 支持显示标注"""
 
-    def __init__(self, parent, **kwargs):
+    # 筛选下拉框中表示不限制的选项
+    FILTER_ALL = "全部"
+    
+    # 查找类型 -> AnnotationIndex倒排索引类型
+    SEARCH_KINDS = {"轨迹": "track", "类别": "label", "谓词": "predicate", "主宾对": "pair"}
+
+    def __init__(self, parent, config=None, on_relation_created=None, predicates_getter=None, **kwargs):
         super().__init__(parent, **kwargs)
         
+        self.app_config = config if config is not None else DEFAULT_CONFIG.copy()
+        # 点选关系：回调 (主体原始ID, 客体原始ID, 谓词) -> 是否添加成功；谓词列表来源
+        self.on_relation_created = on_relation_created
+        self.predicates_getter = predicates_getter
         self.image_folder = None
-        self.image_files = []
+        self.image_files = []  # 按自然顺序排序的图片文件名
+        self.frame_to_file = {}  # 帧号 -> 图片文件名
+        self.frame_names = {}  # XML中记录的帧号 -> 文件名
+        self.frame_count = 0
         self.current_frame = 0
         self.xml_root = None
-        self.original_image = None
+        self.xml_path = None  # 当前加载的XML文件（监视修改时间以自动重新加载）
+        self.xml_mtime = None
+        self.xml_watch_job = None
+        self.annotation_index = None  # 按帧索引的标注（加载XML时构建）
+        self.frame_density = FrameDensity()  # 逐帧标注密度（重新加载时增量更新）
+        self.original_image = None  # 当前帧解码结果（缩小查看时可能是降分辨率解码的）
+        self.full_image_size = (0, 0)  # 当前帧原图尺寸
+        self.decode_scale = 1.0  # 解码分辨率 / 原图分辨率
         self.display_image = None
         self.zoom_scale = 1.0
         
         # 颜色映射（根据类别分配颜色）
         self.color_map = {}
-        self.default_colors = [
-            '#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8',
-            '#F7DC6F', '#BB8FCE', '#85C1E2', '#F8B739', '#52B788'
-        ]
         
         # 鼠标拖动相关
         self.drag_start_x = 0
         self.drag_start_y = 0
         self.is_dragging = False
+        self.press_position = None  # 按下鼠标时的位置（区分点击和拖动）
+        
+        # 点选关系模式
+        self.relate_subject = None  # 已选中的主体track_id
         
         # 高亮相关
         self.hovered_box = None  # (track_id, frame)
@@ -39,10 +75,52 @@ class ImageViewer(tb.Frame):
         # 性能优化
         self.last_hover_check = 0  # 上次检查高亮的时间
         self.hover_check_interval = 0.1  # 检查间隔（秒）100ms，减少检查频率
-        self.boxes_cache = {}  # 缓存当前帧的框信息 {frame: [(track_id, xtl, ytl, xbr, ybr, area, label), ...]}
         self.pending_hover_update = None  # 待处理的高亮更新
         
+        # 矢量叠加模式（标注作为Canvas图元绘制在单个图片图元之上）
+        self.image_item = None  # 底图图元ID
+        self.overlay_dirty = True  # 标注图元是否需要重建
+        self.overlay_scale = 1.0  # 当前标注图元对应的缩放比例
+        
+        # 播放模式
+        self.is_playing = False
+        self.play_job = None  # 播放定时任务
+        self.play_start_time = 0  # 播放时钟起点
+        self.play_start_frame = 0  # 播放时钟起点对应的帧
+        self.play_fps = 0  # 当前播放时钟使用的帧率
+        self.dropped_frames = 0  # 因渲染跟不上而跳过的帧数
+        self.shown_frame_times = deque(maxlen=30)  # 最近显示帧的时间戳（计算实际帧率）
+        self.prefetcher = FramePrefetcher(self.get_frame_path, self.get_decode_scale)
+        
+        # 瓦片模式（超大图只渲染视口内的瓦片）
+        self.tile_pyramid = None  # 当前帧的瓦片金字塔
+        # 所有图片的瓦片目录共用一个磁盘容量上限，超出时删除最久未使用的金字塔
+        self.tile_disk_budget = DiskCacheBudget(
+            self.app_config.get("tile_cache_dir") or DEFAULT_TILE_DIR,
+            self.app_config.get("tile_cache_mb", 4096) * 1024 * 1024,
+            entry_dirs=True
+        )
+        self.tiled_redraw_job = None  # 滚动后的合并重绘任务
+        self.arrow_region = None  # 位图模式下已绘制箭头的原图范围（滚出该范围时重绘）
+        self.arrow_redraw_job = None
+        
+        # 筛选（None表示不限制），按帧缓存筛选结果
+        self.filter_labels = None
+        self.filter_predicates = None
+        self.filter_tracks = None
+        self.visible_selection = None  # (帧号, 边界框列表, 关系点列表)
+        self.visible_box_ids = None  # (筛选后的边界框列表, 其track_id集合)
+        
+        # 渲染耗时统计（性能HUD）
+        self.render_stats = RenderStats()
+        
+        # 内存预算（解码帧、缩略图、瓦片、空间索引统一限额）
+        self.memory_budget = MemoryBudget(self.app_config.get("memory_budget_mb", 1024))
+        self.memory_job = None
+        
         self.create_widgets()
+        self.register_memory_caches()
+        self.check_memory_budget()
         
     def create_widgets(self):
         """创建控件"""
@@ -87,6 +165,39 @@ class ImageViewer(tb.Frame):
             width=10
         ).pack(side=tk.LEFT, padx=2)
         
+        # 播放控制
+        play_frame = tb.Frame(toolbar)
+        play_frame.pack(side=tk.LEFT, padx=10)
+        
+        self.play_button = tb.Button(
+            play_frame,
+            text="▶ 播放",
+            command=self.toggle_playback,
+            bootstyle="warning-outline",
+            width=8
+        )
+        self.play_button.pack(side=tk.LEFT, padx=2)
+        
+        tb.Label(play_frame, text="FPS:").pack(side=tk.LEFT, padx=(5, 2))
+        
+        self.fps_var = tk.StringVar(value=str(self.app_config.get("playback_fps", 25)))
+        tb.Spinbox(
+            play_frame,
+            from_=1,
+            to=120,
+            textvariable=self.fps_var,
+            width=4,
+            bootstyle="warning"
+        ).pack(side=tk.LEFT)
+        
+        self.fps_label = tb.Label(
+            play_frame,
+            text="",
+            bootstyle="inverse-light",
+            padding=(5, 5)
+        )
+        self.fps_label.pack(side=tk.LEFT, padx=5)
+        
         # 跳转到指定帧
         jump_frame = tb.Frame(toolbar)
         jump_frame.pack(side=tk.LEFT, padx=10)
@@ -114,7 +225,7 @@ class ImageViewer(tb.Frame):
             options_frame,
             text="显示边界框",
             variable=self.show_boxes_var,
-            command=self.update_display,
+            command=self.on_layer_toggle,
             bootstyle="primary-round-toggle"
         ).pack(side=tk.LEFT, padx=5)
         
@@ -123,7 +234,7 @@ class ImageViewer(tb.Frame):
             options_frame,
             text="显示关系点",
             variable=self.show_relations_var,
-            command=self.update_display,
+            command=self.on_layer_toggle,
             bootstyle="success-round-toggle"
         ).pack(side=tk.LEFT, padx=5)
         
@@ -132,10 +243,28 @@ class ImageViewer(tb.Frame):
             options_frame,
             text="显示标签",
             variable=self.show_labels_var,
-            command=self.update_display,
+            command=self.on_layer_toggle,
             bootstyle="info-round-toggle"
         ).pack(side=tk.LEFT, padx=5)
         
+        self.tiled_mode_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(
+            options_frame,
+            text="瓦片模式",
+            variable=self.tiled_mode_var,
+            command=self.on_tiled_mode_changed,
+            bootstyle="secondary-round-toggle"
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.vector_overlay_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(
+            options_frame,
+            text="矢量叠加",
+            variable=self.vector_overlay_var,
+            command=self.on_render_mode_changed,
+            bootstyle="warning-round-toggle"
+        ).pack(side=tk.LEFT, padx=5)
+        
         # 缩放控制
         zoom_frame = tb.Frame(toolbar)
         zoom_frame.pack(side=tk.RIGHT, padx=10)
@@ -164,6 +293,113 @@ class ImageViewer(tb.Frame):
             width=3
         ).pack(side=tk.LEFT, padx=2)
         
+        # 第二行：按轨迹/类别/谓词/主宾对查找出现的帧
+        search_bar = tb.Frame(self, bootstyle="light")
+        search_bar.pack(fill=tk.X, padx=5)
+        
+        tb.Label(search_bar, text="查找:").pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.search_kind_var = tk.StringVar(value="轨迹")
+        tb.Combobox(
+            search_bar,
+            textvariable=self.search_kind_var,
+            values=list(self.SEARCH_KINDS),
+            state="readonly",
+            width=6
+        ).pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.search_entry = tb.Entry(search_bar, width=16, bootstyle="primary")
+        self.search_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.search_entry.bind("<Return>", lambda e: self.find_occurrence(forward=True))
+        self.search_entry.bind("<Shift-Return>", lambda e: self.find_occurrence(forward=False))
+        
+        tb.Button(
+            search_bar,
+            text="◀",
+            command=lambda: self.find_occurrence(forward=False),
+            bootstyle="info-outline",
+            width=3
+        ).pack(side=tk.LEFT, padx=2)
+        
+        tb.Button(
+            search_bar,
+            text="▶",
+            command=lambda: self.find_occurrence(forward=True),
+            bootstyle="info-outline",
+            width=3
+        ).pack(side=tk.LEFT, padx=2)
+        
+        # 筛选：类别 / 谓词 / 轨迹
+        tb.Label(search_bar, text="筛选:").pack(side=tk.LEFT, padx=(15, 5))
+        
+        self.filter_label_var = tk.StringVar(value=self.FILTER_ALL)
+        self.filter_label_combo = tb.Combobox(
+            search_bar,
+            textvariable=self.filter_label_var,
+            values=[self.FILTER_ALL],
+            state="readonly",
+            width=12
+        )
+        self.filter_label_combo.pack(side=tk.LEFT, padx=(0, 5))
+        self.filter_label_combo.bind("<<ComboboxSelected>>", lambda e: self.on_filter_changed())
+        
+        self.filter_predicate_var = tk.StringVar(value=self.FILTER_ALL)
+        self.filter_predicate_combo = tb.Combobox(
+            search_bar,
+            textvariable=self.filter_predicate_var,
+            values=[self.FILTER_ALL],
+            state="readonly",
+            width=12
+        )
+        self.filter_predicate_combo.pack(side=tk.LEFT, padx=(0, 5))
+        self.filter_predicate_combo.bind("<<ComboboxSelected>>", lambda e: self.on_filter_changed())
+        
+        tb.Label(search_bar, text="轨迹:").pack(side=tk.LEFT, padx=(0, 5))
+        self.filter_tracks_entry = tb.Entry(search_bar, width=12, bootstyle="primary")
+        self.filter_tracks_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.filter_tracks_entry.bind("<Return>", lambda e: self.on_filter_changed())
+        
+        tb.Button(
+            search_bar,
+            text="清除",
+            command=self.clear_filters,
+            bootstyle="secondary-outline"
+        ).pack(side=tk.LEFT, padx=2)
+        
+        tb.Button(
+            search_bar,
+            text="导出统计",
+            command=self.export_render_stats,
+            bootstyle="secondary-outline"
+        ).pack(side=tk.RIGHT, padx=2)
+        
+        self.relate_mode_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(
+            search_bar,
+            text="点选关系",
+            variable=self.relate_mode_var,
+            command=self.on_relate_mode_changed,
+            bootstyle="success-round-toggle"
+        ).pack(side=tk.RIGHT, padx=5)
+        
+        self.show_arrows_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(
+            search_bar,
+            text="关系箭头",
+            variable=self.show_arrows_var,
+            command=self.on_layer_toggle,
+            bootstyle="danger-round-toggle"
+        ).pack(side=tk.RIGHT, padx=5)
+        
+        self.show_hud_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(
+            search_bar,
+            text="性能HUD",
+            variable=self.show_hud_var,
+            command=self.on_hud_toggle,
+            bootstyle="secondary-round-toggle"
+        ).pack(side=tk.RIGHT, padx=5)
+        
         # 画布容器（带滚动条）
         canvas_container = tb.Frame(self, bootstyle="light")
         canvas_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -179,13 +415,13 @@ class ImageViewer(tb.Frame):
         v_scrollbar = tb.Scrollbar(
             canvas_container,
             orient=tk.VERTICAL,
-            command=self.canvas.yview,
+            command=self.on_yscroll,
             bootstyle="round"
         )
         h_scrollbar = tb.Scrollbar(
             canvas_container,
             orient=tk.HORIZONTAL,
-            command=self.canvas.xview,
+            command=self.on_xscroll,
             bootstyle="round"
         )
         
@@ -202,9 +438,44 @@ class ImageViewer(tb.Frame):
         canvas_container.grid_rowconfigure(0, weight=1)
         canvas_container.grid_columnconfigure(0, weight=1)
         
+        # 性能HUD（叠放在画布左上角，不受画布重绘影响）
+        self.hud_label = tk.Label(
+            canvas_container,
+            text="",
+            justify=tk.LEFT,
+            anchor=tk.NW,
+            font=("Consolas", 9),
+            bg='#000000',
+            fg='#7CFC00',
+            padx=6,
+            pady=4
+        )
+        
         # 绑定鼠标事件
         self.bind_mouse_events()
         
+        # 标注密度热力条（框 / 关系点 / 未覆盖主体）
+        self.density_strip = DensityStrip(
+            self,
+            on_seek=self.seek_to_frame,
+            on_hover=self.show_density_at
+        )
+        self.density_strip.pack(fill=tk.X, padx=5, pady=(0, 2))
+        
+        # 缩略图时间轴
+        self.timeline = TimelineStrip(
+            self,
+            self.get_frame_path,
+            on_seek=self.seek_to_frame,
+            on_preview=self.show_thumbnail_preview,
+            cache=ThumbnailCache(
+                self.app_config.get("thumbnail_cache_dir") or None,
+                disk_limit_mb=self.app_config.get("thumbnail_cache_mb", 512)
+            ),
+            bootstyle="light"
+        )
+        self.timeline.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
         # 状态栏
         status_frame = tb.Frame(self, bootstyle="light")
         status_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
@@ -217,6 +488,15 @@ class ImageViewer(tb.Frame):
         )
         self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        # 各缓存内存占用
+        self.memory_label = tb.Label(
+            status_frame,
+            text="",
+            bootstyle="inverse-secondary",
+            padding=(10, 5)
+        )
+        self.memory_label.pack(side=tk.RIGHT, padx=(10, 0))
+        
         # 统计信息
         self.stats_label = tb.Label(
             status_frame,
@@ -226,6 +506,67 @@ class ImageViewer(tb.Frame):
         )
         self.stats_label.pack(side=tk.RIGHT, padx=(10, 0))
         
+    def register_memory_caches(self):
+        """把各缓存注册到内存预算（代价越高越晚淘汰）"""
+        budget = self.memory_budget
+        
+        # 当前帧的解码图和显示图不可淘汰，只计入占用
+        budget.register("当前帧", self.current_frame_bytes)
+        budget.register(
+            "预解码",
+            self.prefetcher.memory_usage,
+            self.prefetcher.evict_one,
+            self.prefetcher.oldest_access,
+            cost=2.0
+        )
+        cache = self.timeline.cache
+        budget.register(
+            "缩略图", cache.memory_usage, cache.evict_one, cache.oldest_access, cost=1.0
+        )
+        budget.register(
+            "瓦片",
+            lambda: self.tile_pyramid.memory_usage() if self.tile_pyramid else 0,
+            lambda: self.tile_pyramid.evict_one() if self.tile_pyramid else 0,
+            lambda: self.tile_pyramid.oldest_access() if self.tile_pyramid else None,
+            cost=1.0
+        )
+        budget.register("索引", self.index_cache_bytes, self.evict_index_cache, cost=0.5)
+    
+    def current_frame_bytes(self):
+        """当前帧解码图和显示图的占用（PhotoImage按每像素4字节估算）"""
+        used = image_bytes(self.original_image)
+        if self.display_image is not None:
+            used += self.display_image.width() * self.display_image.height() * 4
+        return used
+    
+    def index_cache_bytes(self):
+        """按需构建的空间索引的估算占用"""
+        if not self.annotation_index:
+            return 0
+        return sum(g.estimated_bytes() for g in self.annotation_index.spatial_grids.values())
+    
+    def evict_index_cache(self):
+        """淘汰一个非当前帧的空间索引"""
+        if not self.annotation_index:
+            return 0
+        grids = self.annotation_index.spatial_grids
+        for frame in grids:
+            if frame != self.current_frame:
+                self.annotation_index.frame_groups.pop(frame, None)
+                return grids.pop(frame).estimated_bytes() or 1
+        return 0
+    
+    def check_memory_budget(self):
+        """定时检查内存预算并更新占用显示"""
+        self.memory_job = None
+        self.enforce_memory_budget()
+        self.memory_job = self.after(1000, self.check_memory_budget)
+    
+    def enforce_memory_budget(self):
+        """超出预算时淘汰缓存"""
+        self.memory_budget.enforce()
+        self.memory_label.config(text=self.memory_budget.summary_text())
+    
     def load_image_folder(self):
         """加载图片文件夹"""
         from tkinter import filedialog
@@ -233,342 +574,1058 @@ class ImageViewer(tb.Frame):
         if not folder:
             return
             
-        self.image_folder = folder
-        
-        # 获取所有图片文件（支持常见格式）
-        extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff')
-        self.image_files = sorted([
-            f for f in os.listdir(folder)
-            if f.lower().endswith(extensions)
-        ])
+        self.stop_playback()
+        self.prefetcher.clear()
+        # 获取所有图片文件（支持常见格式，自然排序，按文件夹缓存）
+        image_files = list_image_files(folder)
         
-        if not self.image_files:
+        if not image_files:
             from tkinter import messagebox
             messagebox.showwarning("警告", "该文件夹中没有找到图片文件")
             return
         
+        self.image_folder = folder
+        self.image_files = image_files
+        self.update_frame_mapping()
+        
         self.current_frame = 0
         self.zoom_scale = 1.0
+        self.timeline.set_frame_count(self.frame_count)
+        self.refresh_density()
         self.load_current_frame()
         self.status_label.config(
             text=f"已加载 {len(self.image_files)} 张图片"
         )
         
     def load_xml(self, xml_path):
-        """加载XML标注文件"""
+        """加载XML标注文件（与当前文件相同时只增量更新变化的轨迹）"""
         try:
+            mtime = os.stat(xml_path).st_mtime_ns
             tree = ET.parse(xml_path)
             self.xml_root = tree.getroot()
             
-            # 重新生成颜色映射
-            self.generate_color_map()
+            same_file = (
+                self.annotation_index is not None and self.xml_path is not None and
+                os.path.abspath(xml_path) == os.path.abspath(self.xml_path)
+            )
+            if same_file:
+                # 按轨迹ID和内容哈希比较，只重新索引变化的轨迹
+                changed, frames = self.annotation_index.update(self.xml_root)
+            else:
+                # 一次性构建帧索引，重绘时只访问当前帧的标注
+                self.annotation_index = AnnotationIndex(self.xml_root)
+                changed, frames = None, None
             
-            self.update_display()
+            self.xml_path = xml_path
+            self.xml_mtime = mtime
+            self.apply_annotation_changes(changed, frames)
+            self.schedule_xml_watch()
         except Exception as e:
             print(f"加载XML失败: {e}")
+    
+    def apply_annotation_changes(self, changed=None, frames=None):
+        """
+        标注索引变化后更新视图相关状态。
+        changed/frames为增量更新返回的变化轨迹和受影响帧，None表示整体重新加载。
+        """
+        if changed is not None and not changed:
+            return
+        self.visible_selection = None
+        
+        # XML中记录了帧文件名时按文件名对应帧号（文件名未变时保留现有映射）
+        frame_names = parse_frame_names(self.xml_root)
+        if changed is None or frame_names != self.frame_names:
+            self.frame_names = frame_names
+            if self.image_folder:
+                self.update_frame_mapping()
+                self.timeline.set_frame_count(self.frame_count)
+                self.timeline.set_current(self.current_frame)
+        
+        # 只有变化的轨迹参与密度统计的增减
+        self.refresh_density()
+        
+        # 颜色映射只为新出现的类别分配颜色
+        self.generate_color_map()
+        self.update_filter_choices()
+        
+        if changed is not None:
+            self.status_label.config(
+                text=f"标注已更新: {len(changed)} 条轨迹变化，影响 {len(frames)} 帧"
+            )
+        
+        # 当前帧不受影响时无需重绘
+        if changed is None or self.current_frame in frames:
+            if self.relate_subject is not None and changed is not None and self.relate_subject in changed:
+                self.cancel_relate()
+            self.overlay_dirty = True
+            self.update_display()
+    
+    def schedule_xml_watch(self):
+        """定时检查XML文件的修改时间"""
+        if self.xml_watch_job is not None:
+            return
+        interval = self.app_config.get("xml_watch_interval_ms", 1000)
+        if interval and interval > 0:
+            self.xml_watch_job = self.after(interval, self.check_xml_changed)
+    
+    def check_xml_changed(self):
+        """XML文件在磁盘上被修改（重新导出或处理输出）时自动重新加载"""
+        self.xml_watch_job = None
+        if not self.xml_path:
+            return
+        try:
+            mtime = os.stat(self.xml_path).st_mtime_ns
+        except OSError:
+            # 文件暂时不存在（正在被替换），下次再检查
+            mtime = self.xml_mtime
+        if mtime != self.xml_mtime:
+            # 文件写入未完成时解析失败，修改时间不更新，下次检查重试
+            self.load_xml(self.xml_path)
+        self.schedule_xml_watch()
             
     def generate_color_map(self):
-        """为不同类别生成颜色映射"""
-        if not self.xml_root:
+        """为不同类别生成颜色映射（已有类别保持原颜色，新类别依次分配）"""
+        if not self.annotation_index:
             return
-            
-        labels = set()
-        for track in self.xml_root.findall('track'):
-            label = track.get('label')
-            if label and label != 'Relation':
-                labels.add(label)
         
         # 分配颜色
-        for i, label in enumerate(sorted(labels)):
-            self.color_map[label] = self.default_colors[i % len(self.default_colors)]
+        self.color_map = annotation_renderer.build_color_map(
+            self.annotation_index.labels, self.color_map
+        )
             
-    def load_current_frame(self):
-        """加载当前帧的图片"""
-        if not self.image_files or self.current_frame >= len(self.image_files):
+    def update_filter_choices(self):
+        """加载标注后更新筛选下拉框的选项"""
+        labels = sorted(self.annotation_index.labels)
+        predicates = sorted(p for p in self.annotation_index.predicate_intervals if p)
+        self.filter_label_combo.configure(values=[self.FILTER_ALL] + labels)
+        self.filter_predicate_combo.configure(values=[self.FILTER_ALL] + predicates)
+        
+        # 原筛选项已不存在时恢复为全部
+        if self.filter_label_var.get() not in labels:
+            self.filter_label_var.set(self.FILTER_ALL)
+        if self.filter_predicate_var.get() not in predicates:
+            self.filter_predicate_var.set(self.FILTER_ALL)
+        try:
+            self.read_filters()
+        except ValueError:
+            self.filter_tracks_entry.delete(0, tk.END)
+            self.read_filters()
+    
+    def read_filters(self):
+        """从筛选控件读取筛选条件（轨迹ID按界面显示的编号输入）"""
+        label = self.filter_label_var.get()
+        predicate = self.filter_predicate_var.get()
+        self.filter_labels = None if label == self.FILTER_ALL else {label}
+        self.filter_predicates = None if predicate == self.FILTER_ALL else {predicate}
+        
+        text = self.filter_tracks_entry.get().strip()
+        if text:
+            self.filter_tracks = {
+                str(int(part) - 1) for part in re.split(r'[\s,，]+', text) if part
+            }
+        else:
+            self.filter_tracks = None
+        self.visible_selection = None
+    
+    def on_filter_changed(self):
+        """筛选条件变化：只重新选择当前帧的标注并重绘"""
+        try:
+            self.read_filters()
+        except ValueError:
+            from tkinter import messagebox
+            messagebox.showerror("错误", "轨迹请输入ID，多个ID用逗号分隔")
             return
-            
-        image_path = os.path.join(
-            self.image_folder,
-            self.image_files[self.current_frame]
+        self.overlay_dirty = True
+        self.update_display()
+    
+    def clear_filters(self):
+        """清除所有筛选"""
+        self.filter_label_var.set(self.FILTER_ALL)
+        self.filter_predicate_var.set(self.FILTER_ALL)
+        self.filter_tracks_entry.delete(0, tk.END)
+        self.on_filter_changed()
+    
+    def has_filters(self):
+        """是否设置了任何筛选条件"""
+        return (
+            self.filter_labels is not None or
+            self.filter_predicates is not None or
+            self.filter_tracks is not None
+        )
+    
+    def get_visible_selection(self):
+        """当前帧筛选后的 (边界框列表, 关系点列表)，同一帧内重复绘制直接复用"""
+        selection = self.visible_selection
+        if selection is not None and selection[0] == self.current_frame:
+            return selection[1], selection[2]
+        boxes = self.annotation_index.select_boxes(
+            self.current_frame, self.filter_labels, self.filter_tracks
         )
+        relations = self.annotation_index.select_relations(
+            self.current_frame, self.filter_predicates, self.filter_tracks
+        )
+        self.visible_selection = (self.current_frame, boxes, relations)
+        return boxes, relations
+    
+    def get_visible_boxes(self):
+        """当前帧筛选后的边界框"""
+        return self.get_visible_selection()[0]
+    
+    def get_visible_box_ids(self):
+        """当前帧筛选后可见框的track_id集合（同一筛选结果只构建一次）"""
+        boxes = self.get_visible_boxes()
+        cached = self.visible_box_ids
+        if cached is not None and cached[0] is boxes:
+            return cached[1]
+        track_ids = {box[0] for box in boxes}
+        self.visible_box_ids = (boxes, track_ids)
+        return track_ids
+    
+    def get_visible_relations(self):
+        """当前帧筛选后的关系点"""
+        return self.get_visible_selection()[1]
+    
+    def refresh_density(self):
+        """更新标注密度统计和热力条"""
+        if self.annotation_index is None:
+            return
+        self.frame_density.update(self.annotation_index, self.frame_count)
+        self.density_strip.set_counts(
+            self.frame_density.get_counts(),
+            self.frame_count or self.frame_density.frame_count
+        )
+    
+    def show_density_at(self, frame):
+        """在状态栏显示热力条上悬停帧的统计"""
+        boxes, relations, uncovered = self.frame_density.counts_at(frame)
+        self.status_label.config(
+            text=f"帧 {frame}: 边界框 {boxes} | 关系点 {relations} | 未覆盖主体 {uncovered}"
+        )
+    
+    def update_frame_mapping(self):
+        """重建帧号到图片文件的映射"""
+        self.frame_to_file = build_frame_file_map(
+            self.image_folder, self.image_files, self.frame_names
+        )
+        self.frame_count = max(self.frame_to_file) + 1 if self.frame_to_file else 0
+        self.prefetcher.clear()
+    
+    def get_frame_path(self, frame):
+        """获取指定帧的图片路径"""
+        file_name = self.frame_to_file.get(frame)
+        if file_name is None:
+            return None
+        return os.path.join(self.image_folder, file_name)
+        
+    def load_current_frame(self, decoded=None):
+        """加载当前帧的图片（decoded为预解码好的(图片, 原图尺寸)时直接使用）"""
+        image_path = self.get_frame_path(self.current_frame)
+        if image_path is None:
+            if self.image_files:
+                self.status_label.config(text=f"帧 {self.current_frame} 没有对应的图片")
+            return
         
         try:
-            self.original_image = Image.open(image_path)
+            self.render_stats.begin_frame()
+            if self.tiled_mode_var.get() and not self.is_playing:
+                # 瓦片模式不在内存中保留整张原图
+                self.original_image = None
+                self.load_tile_pyramid(image_path)
+            else:
+                # 播放时（包括瓦片模式）直接显示按缩放比例降采样解码的预解码帧，
+                # 不为一闪而过的帧构建金字塔，暂停后再切换回瓦片
+                if self.tile_pyramid is not None:
+                    self.tile_pyramid.release()
+                self.tile_pyramid = None
+                if self.is_playing:
+                    self.render_stats.count("预解码", decoded is not None)
+                if decoded is None:
+                    with self.render_stats.measure('decode'):
+                        decoded = decode_image(image_path, self.get_decode_scale())
+                self.set_decoded_image(*decoded)
             
-            # 清空高亮状态
+            # 清空高亮状态和点选中的主体
             self.hovered_box = None
+            self.relate_subject = None
+            self.overlay_dirty = True
             
             # 清空缓存（切换帧时）
-            # 只保留当前帧和相邻帧的缓存以节省内存
-            frames_to_keep = {
-                self.current_frame - 1,
-                self.current_frame,
-                self.current_frame + 1
-            }
-            self.boxes_cache = {
-                k: v for k, v in self.boxes_cache.items()
-                if k in frames_to_keep
-            }
+            # 只保留当前帧和相邻帧的空间索引以节省内存
+            if self.annotation_index:
+                self.annotation_index.prune_spatial_grids({
+                    self.current_frame - 1,
+                    self.current_frame,
+                    self.current_frame + 1
+                })
             
             self.update_display()
             self.update_frame_label()
+            self.timeline.set_current(self.current_frame)
+            self.density_strip.set_current(self.current_frame)
+            self.enforce_memory_budget()
         except Exception as e:
             print(f"加载图片失败: {e}")
             
+    def get_decode_scale(self):
+        """当前缩放下所需的解码比例（缩小查看时无需完整分辨率）"""
+        return min(1.0, self.zoom_scale)
+    
+    def set_decoded_image(self, image, full_size):
+        """设置当前帧的解码结果"""
+        self.original_image = image
+        self.full_image_size = full_size
+        self.decode_scale = image.width / full_size[0] if full_size[0] else 1.0
+    
+    def ensure_decode_resolution(self):
+        """放大后解码分辨率不够时按当前缩放重新解码"""
+        if self.original_image is None:
+            return
+        if self.decode_scale >= self.get_decode_scale() - 1e-6:
+            return
+        image_path = self.get_frame_path(self.current_frame)
+        if image_path is None:
+            return
+        try:
+            with self.render_stats.measure('decode'):
+                decoded = decode_image(image_path, self.get_decode_scale())
+            self.set_decoded_image(*decoded)
+        except Exception as e:
+            print(f"加载图片失败: {e}")
+    
+    def has_image(self):
+        """当前是否有可显示的帧"""
+        return self.original_image is not None or self.tile_pyramid is not None
+    
+    def get_image_size(self):
+        """当前帧原图尺寸"""
+        if self.tile_pyramid is not None:
+            return self.tile_pyramid.width, self.tile_pyramid.height
+        if self.original_image is not None:
+            return self.full_image_size
+        return 0, 0
+    
+    def get_display_size(self):
+        """当前帧缩放后的显示尺寸"""
+        width, height = self.get_image_size()
+        return int(width * self.zoom_scale), int(height * self.zoom_scale)
+    
+    def get_min_zoom(self):
+        """最小缩放比例（瓦片模式允许缩得更小以浏览整张大图）"""
+        return 0.05 if self.tile_pyramid is not None else 0.3
+    
     def update_display(self):
         """更新显示（绘制标注）"""
-        if not self.original_image:
+        if not self.has_image():
+            return
+        self.arrow_region = None
+        
+        # 瓦片模式：只渲染视口内的瓦片
+        if self.tile_pyramid is not None:
+            self.update_display_tiled()
+            self.update_hud()
+            self.draw_relate_marker()
             return
+        
+        # 放大后升级到足够的解码分辨率
+        self.ensure_decode_resolution()
+        
+        # 矢量叠加模式：标注作为Canvas图元，不再烧录进位图
+        if self.vector_overlay_var.get():
+            self.update_display_vector()
+            self.update_hud()
+            self.draw_relate_marker()
+            return
+        
+        draw_start = time.perf_counter()
             
         # 创建图片副本用于绘制
         img = self.original_image.copy()
         draw = ImageDraw.Draw(img, 'RGBA')
         
         # 尝试加载字体
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-            small_font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            font = ImageFont.load_default()
-            small_font = font
+        font, small_font = annotation_renderer.load_fonts()
         
         # 统计信息
         box_count = 0
         relation_count = 0
         
-        if self.xml_root:
+        # 降分辨率解码时标注坐标按解码比例映射
+        transform = (self.decode_scale, 0, 0) if self.decode_scale != 1.0 else None
+        
+        if self.annotation_index:
             # 绘制边界框
             if self.show_boxes_var.get():
-                box_count = self.draw_boxes(draw, font)
+                box_count = self.draw_boxes(draw, font, transform)
             
             # 绘制关系点
             if self.show_relations_var.get():
-                relation_count = self.draw_relations(draw, small_font)
+                relation_count = self.draw_relations(draw, small_font, transform)
+            
+            # 绘制主体->客体箭头：只绘制可见范围（四周各留半个视口）内的连线，
+            # 滚动超出该范围时再重绘
+            if self.show_arrows_var.get():
+                self.arrow_region = self.get_visible_image_region(margin=0.5)
+                self.draw_relation_arrows(draw, transform, self.arrow_region)
+        self.render_stats.record('draw', time.perf_counter() - draw_start)
         
         # 应用缩放
-        if self.zoom_scale != 1.0:
-            new_size = (
-                int(img.width * self.zoom_scale),
-                int(img.height * self.zoom_scale)
-            )
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
+        new_size = self.get_display_size()
+        with self.render_stats.measure('resize'):
+            if img.size != new_size:
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
         
         # 转换为PhotoImage
-        self.display_image = ImageTk.PhotoImage(img)
+        with self.render_stats.measure('photo'):
+            self.display_image = ImageTk.PhotoImage(img)
         
         # 更新Canvas
         self.canvas.delete("all")
         self.canvas.create_image(0, 0, anchor=tk.NW, image=self.display_image)
         self.canvas.config(scrollregion=self.canvas.bbox("all"))
+        self.image_item = None
+        self.overlay_dirty = True
         
         # 更新统计信息
         self.stats_label.config(
             text=f"边界框: {box_count} | 关系点: {relation_count}"
         )
+        self.update_hud()
+        self.draw_relate_marker()
+        
+    def load_tile_pyramid(self, image_path):
+        """为当前帧准备瓦片金字塔，未构建时在工作线程中构建"""
+        # 内存中的瓦片数只与屏幕尺寸相关：两个层级各覆盖一屏
+        tile_size = 512
+        screen_tiles = (
+            (math.ceil(self.winfo_screenwidth() / tile_size) + 1) *
+            (math.ceil(self.winfo_screenheight() / tile_size) + 1)
+        )
+        pyramid = TilePyramid(
+            image_path,
+            cache_dir=self.app_config.get("tile_cache_dir") or None,
+            tile_size=tile_size,
+            memory_tiles=screen_tiles * 2,
+            disk_budget=self.tile_disk_budget
+        )
+        self.tile_pyramid = pyramid
         
-    def draw_boxes(self, draw, font):
-        """绘制边界框"""
-        count = 0
+        if not pyramid.is_built:
+            self.status_label.config(text="正在构建瓦片金字塔...")
+            future = self.prefetcher.executor.submit(pyramid.build)
+            self.after(100, lambda: self._wait_for_pyramid(pyramid, future))
+    
+    def _wait_for_pyramid(self, pyramid, future):
+        """等待金字塔构建完成后刷新显示"""
+        if not future.done():
+            self.after(100, lambda: self._wait_for_pyramid(pyramid, future))
+            return
+        if pyramid is not self.tile_pyramid:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print(f"构建瓦片金字塔失败: {e}")
+            self.status_label.config(text=f"构建瓦片金字塔失败: {e}")
+            return
+        self.status_label.config(text=f"已加载 {len(self.image_files)} 张图片（瓦片模式）")
+        self.update_display()
+    
+    def update_display_tiled(self):
+        """瓦片模式下更新显示：只合成并绘制视口范围"""
+        if not self.tile_pyramid.is_built:
+            return
         
-        for track in self.xml_root.findall('track'):
-            label = track.get('label')
-            if label == 'Relation':
-                continue
-                
-            track_id = track.get('id')
-            color = self.color_map.get(label, '#FFFFFF')
-            
-            # 检查是否是高亮框
-            is_hovered = (track_id == self.hovered_box)
-            
-            # 查找当前帧的box
-            for box in track.findall('box'):
-                frame = int(box.get('frame'))
-                if frame != self.current_frame:
-                    continue
-                    
-                outside = box.get('outside', '0')
-                if outside == '1':
-                    continue
-                
-                # 获取坐标
-                xtl = float(box.get('xtl'))
-                ytl = float(box.get('ytl'))
-                xbr = float(box.get('xbr'))
-                ybr = float(box.get('ybr'))
-                
-                # 根据是否高亮调整样式
-                if is_hovered:
-                    # 高亮：更粗的边框，更明显的填充
-                    line_width = 5
-                    fill_alpha = '40'  # 更明显的填充
-                else:
-                    # 普通：正常边框，淡填充
-                    line_width = 3
-                    fill_alpha = '20'
-                
-                # 绘制矩形边框
-                draw.rectangle(
-                    [(xtl, ytl), (xbr, ybr)],
-                    outline=color,
-                    width=line_width
-                )
-                
-                # 绘制半透明填充
-                draw.rectangle(
-                    [(xtl, ytl), (xbr, ybr)],
-                    fill=color + fill_alpha
+        disp_w, disp_h = self.get_display_size()
+        self.canvas.config(scrollregion=(0, 0, disp_w, disp_h))
+        
+        # 视口在显示坐标系中的范围
+        vx0 = max(0, min(disp_w, self.canvas.canvasx(0)))
+        vy0 = max(0, min(disp_h, self.canvas.canvasy(0)))
+        vx1 = min(disp_w, vx0 + max(1, self.canvas.winfo_width()))
+        vy1 = min(disp_h, vy0 + max(1, self.canvas.winfo_height()))
+        
+        scale = self.zoom_scale
+        # 瓦片合成与重采样计入缩放阶段
+        with self.render_stats.measure('resize'):
+            img = self.tile_pyramid.render_region(
+                vx0 / scale, vy0 / scale, vx1 / scale, vy1 / scale, scale
+            )
+        draw_start = time.perf_counter()
+        draw = ImageDraw.Draw(img, 'RGBA')
+        
+        font, small_font = annotation_renderer.load_fonts()
+        
+        # 标注坐标映射到视口图像：原图坐标 * 缩放 - 视口偏移
+        transform = (scale, vx0, vy0)
+        box_count = 0
+        relation_count = 0
+        if self.annotation_index:
+            if self.show_boxes_var.get():
+                box_count = self.draw_boxes(draw, font, transform)
+            if self.show_relations_var.get():
+                relation_count = self.draw_relations(draw, small_font, transform)
+            if self.show_arrows_var.get():
+                self.draw_relation_arrows(
+                    draw, transform, (vx0 / scale, vy0 / scale, vx1 / scale, vy1 / scale)
                 )
-                
-                # 绘制标签（新样式：无背景，带描边）
-                if self.show_labels_var.get():
-                    text = f"{label} #{int(track_id)+1}"
-                    
-                    # 标签位置
-                    text_x = xtl + 5
-                    text_y = ytl + 5
-                    
-                    # 优化的描边绘制：只绘制8个方向而不是25次
-                    # 这样可以大幅提升性能
-                    outline_offsets = [
-                        (-1, -1), (0, -1), (1, -1),
-                        (-1, 0),           (1, 0),
-                        (-1, 1),  (0, 1),  (1, 1)
-                    ]
-                    
-                    for dx, dy in outline_offsets:
-                        draw.text(
-                            (text_x + dx, text_y + dy),
-                            text,
-                            fill='white',
-                            font=font
-                        )
-                    
-                    # 绘制文字主体（使用边框颜色）
-                    draw.text(
-                        (text_x, text_y),
-                        text,
-                        fill=color,
-                        font=font
-                    )
-                
-                count += 1
-                break
+        self.render_stats.record('draw', time.perf_counter() - draw_start)
         
-        return count
+        with self.render_stats.measure('photo'):
+            self.display_image = ImageTk.PhotoImage(img)
+        self.canvas.delete("all")
+        self.canvas.create_image(vx0, vy0, anchor=tk.NW, image=self.display_image)
+        self.image_item = None
+        self.overlay_dirty = True
+        
+        self.stats_label.config(
+            text=f"边界框: {box_count} | 关系点: {relation_count}"
+        )
+    
+    def update_hud(self):
+        """刷新性能HUD"""
+        if not self.show_hud_var.get():
+            return
+        if self.tile_pyramid is not None:
+            self.render_stats.set_cache_counts(
+                "瓦片", self.tile_pyramid.hits, self.tile_pyramid.misses
+            )
+        self.hud_label.config(text=self.render_stats.summary_text())
+    
+    def on_hud_toggle(self):
+        """显示或隐藏性能HUD"""
+        if self.show_hud_var.get():
+            self.hud_label.place(x=4, y=4)
+            self.hud_label.lift()
+            self.update_hud()
+        else:
+            self.hud_label.place_forget()
+    
+    def export_render_stats(self):
+        """导出渲染耗时直方图和缓存命中率到JSON"""
+        from tkinter import filedialog, messagebox
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            self.render_stats.export_json(file_path)
+            messagebox.showinfo("成功", f"渲染统计已导出到:\n{file_path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出渲染统计失败: {e}")
+    
+    def get_visible_image_region(self, margin=0.0):
+        """画布可见范围换算到原图坐标 (x0, y0, x1, y1)，margin为四周扩展的视口比例"""
+        scale = self.zoom_scale
+        x0 = self.canvas.canvasx(0) / scale
+        y0 = self.canvas.canvasy(0) / scale
+        width = max(1, self.canvas.winfo_width()) / scale
+        height = max(1, self.canvas.winfo_height()) / scale
+        return (
+            x0 - width * margin, y0 - height * margin,
+            x0 + width * (1 + margin), y0 + height * (1 + margin)
+        )
+    
+    def schedule_arrow_redraw(self):
+        """位图模式下可见范围滚出已绘制箭头的范围时合并重绘"""
+        region = self.arrow_region
+        if region is None or self.arrow_redraw_job is not None:
+            return
+        x0, y0, x1, y1 = self.get_visible_image_region()
+        if region[0] <= x0 and region[1] <= y0 and x1 <= region[2] and y1 <= region[3]:
+            return
+        self.arrow_redraw_job = self.after(15, self._arrow_redraw)
+    
+    def _arrow_redraw(self):
+        self.arrow_redraw_job = None
+        self.update_display()
+    
+    def schedule_tiled_redraw(self):
+        """滚动或视口变化后合并重绘（瓦片模式；位图模式下箭头需要时也重绘）"""
+        if self.tile_pyramid is None:
+            self.schedule_arrow_redraw()
+            return
+        if self.tiled_redraw_job is not None:
+            return
+        self.tiled_redraw_job = self.after(15, self._tiled_redraw)
+    
+    def _tiled_redraw(self):
+        self.tiled_redraw_job = None
+        if self.tile_pyramid is not None:
+            self.update_display_tiled()
+            self.update_hud()
+            self.draw_relate_marker()
+    
+    def on_xscroll(self, *args):
+        """水平滚动条"""
+        self.canvas.xview(*args)
+        self.schedule_tiled_redraw()
+    
+    def on_yscroll(self, *args):
+        """垂直滚动条"""
+        self.canvas.yview(*args)
+        self.schedule_tiled_redraw()
+    
+    def on_tiled_mode_changed(self):
+        """切换瓦片模式"""
+        if self.tile_pyramid is not None:
+            self.tile_pyramid.release()
+        self.tile_pyramid = None
+        self.zoom_scale = max(self.zoom_scale, 0.3)
+        self.zoom_label.config(text=f"{int(self.zoom_scale*100)}%")
+        self.load_current_frame()
+    
+    def update_display_vector(self):
+        """矢量叠加模式下更新显示：只替换底图，标注图元按需重建或缩放"""
+        # 底图只做缩放，不绘制任何标注
+        img = self.original_image
+        new_size = self.get_display_size()
+        with self.render_stats.measure('resize'):
+            if img.size != new_size:
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
+        with self.render_stats.measure('photo'):
+            self.display_image = ImageTk.PhotoImage(img)
+        
+        if self.image_item is None:
+            self.canvas.delete("all")
+            self.image_item = self.canvas.create_image(
+                0, 0, anchor=tk.NW, image=self.display_image
+            )
+            self.overlay_dirty = True
+        else:
+            self.canvas.itemconfigure(self.image_item, image=self.display_image)
+        
+        if self.overlay_dirty:
+            # 切换帧或重新加载标注：重建标注图元
+            self.canvas.delete("annotation")
+            self.overlay_scale = self.zoom_scale
+            with self.render_stats.measure('draw'):
+                if self.annotation_index:
+                    self.draw_boxes_overlay()
+                    self.draw_relations_overlay()
+                    self.draw_arrows_overlay()
+            self.overlay_dirty = False
+            self.apply_overlay_visibility()
+        elif self.overlay_scale != self.zoom_scale:
+            # 仅缩放变化：直接缩放已有图元
+            ratio = self.zoom_scale / self.overlay_scale
+            self.canvas.scale("annotation", 0, 0, ratio, ratio)
+            self.overlay_scale = self.zoom_scale
+        
+        self.canvas.tag_raise("annotation", self.image_item)
+        self.canvas.config(scrollregion=(0, 0, img.width, img.height))
+        
+        self.update_overlay_stats()
     
-    def draw_relations(self, draw, font):
-        """绘制关系点"""
-        count = 0
+    def update_overlay_stats(self):
+        """矢量叠加模式下更新统计信息"""
+        box_count = 0
+        relation_count = 0
+        if self.annotation_index:
+            if self.show_boxes_var.get():
+                box_count = len(self.get_visible_boxes())
+            if self.show_relations_var.get():
+                relation_count = len(self.get_visible_relations())
+        self.stats_label.config(
+            text=f"边界框: {box_count} | 关系点: {relation_count}"
+        )
+    
+    def draw_boxes_overlay(self):
+        """以Canvas图元绘制边界框，每个图元带有轨迹标签"""
+        scale = self.zoom_scale
         
-        for track in self.xml_root.findall('track'):
-            if track.get('label') != 'Relation':
-                continue
+        for track_id, xtl, ytl, xbr, ybr, area, label, attributes in self.get_visible_boxes():
+            color = self.color_map.get(label, '#FFFFFF')
+            track_tag = f"track_{track_id}"
+            is_hovered = (track_id == self.hovered_box)
             
-            # 查找当前帧的点
-            for points in track.findall('points'):
-                frame = int(points.get('frame'))
-                if frame != self.current_frame:
-                    continue
-                    
-                outside = points.get('outside', '0')
-                if outside == '1':
-                    continue
-                
-                # 获取点坐标
-                points_str = points.get('points')
-                if not points_str or points_str == "0.00,0.00":
-                    continue
-                
-                try:
-                    x, y = map(float, points_str.split(','))
-                except:
-                    continue
-                
-                # 获取关系属性
-                predicate = ""
-                subject_id = ""
-                object_id = ""
-                
-                for attr in points.findall('attribute'):
-                    name = attr.get('name')
-                    if name == 'predicate':
-                        predicate = attr.text or ""
-                    elif name == 'subject_id':
-                        subject_id = attr.text or ""
-                    elif name == 'object_id':
-                        object_id = attr.text or ""
-                
-                # 绘制关系点（圆形）
-                radius = 8
-                draw.ellipse(
-                    [(x-radius, y-radius), (x+radius, y+radius)],
+            # 矩形：边框 + 点画填充模拟半透明
+            self.canvas.create_rectangle(
+                xtl * scale, ytl * scale, xbr * scale, ybr * scale,
+                outline=color,
+                width=5 if is_hovered else 3,
+                fill=color,
+                stipple='gray25' if is_hovered else 'gray12',
+                tags=("annotation", "box", track_tag)
+            )
+            
+            # 标签：白色阴影 + 彩色文字
+            text = f"{label} #{int(track_id)+1}"
+            text_x = xtl * scale + 5
+            text_y = ytl * scale + 5
+            self.canvas.create_text(
+                text_x + 1, text_y + 1,
+                text=text,
+                anchor=tk.NW,
+                fill='white',
+                font=("Arial", 11),
+                tags=("annotation", "box_label", track_tag)
+            )
+            self.canvas.create_text(
+                text_x, text_y,
+                text=text,
+                anchor=tk.NW,
+                fill=color,
+                font=("Arial", 11),
+                tags=("annotation", "box_label", track_tag)
+            )
+    
+    def draw_relations_overlay(self):
+        """以Canvas图元绘制关系点"""
+        scale = self.zoom_scale
+        radius = 8
+        
+        for x, y, predicate, subject_id, object_id, track_id in self.get_visible_relations():
+            rel_tag = f"relation_{track_id}"
+            x, y = x * scale, y * scale
+            
+            self.canvas.create_oval(
+                x - radius, y - radius, x + radius, y + radius,
+                fill='#FF6B6B',
+                outline='white',
+                width=2,
+                tags=("annotation", "relation", rel_tag)
+            )
+            
+            try:
+                text = f"#{int(subject_id)+1} {predicate} #{int(object_id)+1}"
+            except:
+                text = predicate
+            
+            text_item = self.canvas.create_text(
+                x + 15, y - 10,
+                text=text,
+                anchor=tk.NW,
+                fill='white',
+                font=("Arial", 9),
+                tags=("annotation", "relation_label", rel_tag)
+            )
+            bbox = self.canvas.bbox(text_item)
+            if bbox:
+                bg_item = self.canvas.create_rectangle(
+                    bbox[0] - 3, bbox[1] - 2, bbox[2] + 3, bbox[3] + 2,
                     fill='#FF6B6B',
                     outline='white',
-                    width=2
+                    width=1,
+                    tags=("annotation", "relation_label", rel_tag)
                 )
-                
-                # 绘制关系信息
-                if self.show_labels_var.get():
-                    try:
-                        text = f"#{int(subject_id)+1} {predicate} #{int(object_id)+1}"
-                    except:
-                        text = predicate
-                    
-                    # 背景
-                    bbox = draw.textbbox((x + 15, y - 10), text, font=font)
-                    draw.rectangle(
-                        [bbox[0]-3, bbox[1]-2, bbox[2]+3, bbox[3]+2],
-                        fill='#FF6B6B',
-                        outline='white',
-                        width=1
-                    )
-                    
-                    # 文字
-                    draw.text(
-                        (x + 15, y - 10),
-                        text,
-                        fill='white',
-                        font=font
-                    )
-                
-                count += 1
-                break
-        
-        return count
+                self.canvas.tag_lower(bg_item, text_item)
+    
+    def draw_arrows_overlay(self):
+        """以Canvas图元绘制主体->客体箭头（整帧绘制，视口外的图元由Canvas自行裁剪）"""
+        scale = self.zoom_scale
+        
+        for x1, y1, x2, y2, predicate, subject_label, track_id in self.annotation_index.relation_edges(self.current_frame, self.get_visible_relations()):
+            self.canvas.create_line(
+                x1 * scale, y1 * scale, x2 * scale, y2 * scale,
+                fill=self.color_map.get(subject_label, '#FF6B6B'),
+                width=2,
+                arrow=tk.LAST,
+                arrowshape=(12, 14, 5),
+                tags=("annotation", "arrow", f"relation_{track_id}")
+            )
+    
+    def apply_overlay_visibility(self):
+        """根据显示选项隐藏或显示标注图元（不重绘）"""
+        show_boxes = self.show_boxes_var.get()
+        show_relations = self.show_relations_var.get()
+        show_labels = self.show_labels_var.get()
+        
+        def state(visible):
+            return tk.NORMAL if visible else tk.HIDDEN
+        
+        self.canvas.itemconfigure("box", state=state(show_boxes))
+        self.canvas.itemconfigure("box_label", state=state(show_boxes and show_labels))
+        self.canvas.itemconfigure("relation", state=state(show_relations))
+        self.canvas.itemconfigure("relation_label", state=state(show_relations and show_labels))
+        self.canvas.itemconfigure("arrow", state=state(self.show_arrows_var.get()))
+    
+    def update_hover_overlay(self, old_track_id, new_track_id):
+        """矢量叠加模式下只修改高亮框的线宽和填充"""
+        if old_track_id is not None:
+            self.canvas.itemconfigure(
+                f"box&&track_{old_track_id}", width=3, stipple='gray12'
+            )
+        if new_track_id is not None:
+            self.canvas.itemconfigure(
+                f"box&&track_{new_track_id}", width=5, stipple='gray25'
+            )
+    
+    def on_layer_toggle(self):
+        """显示选项切换"""
+        if self.vector_overlay_var.get() and self.image_item is not None:
+            self.apply_overlay_visibility()
+            self.update_overlay_stats()
+        else:
+            self.update_display()
+    
+    def on_render_mode_changed(self):
+        """切换位图/矢量叠加渲染模式"""
+        self.image_item = None
+        self.overlay_dirty = True
+        self.update_display()
+    
+    def draw_boxes(self, draw, font, transform=None):
+        """绘制边界框（transform为(缩放, x偏移, y偏移)，默认按原图坐标绘制）"""
+        # 直接从帧索引取当前帧（筛选后）的框，无需遍历所有轨迹
+        return annotation_renderer.draw_boxes(
+            draw,
+            self.get_visible_boxes(),
+            self.color_map,
+            font,
+            transform,
+            hovered=self.hovered_box,
+            show_labels=self.show_labels_var.get()
+        )
+    
+    def draw_relations(self, draw, font, transform=None):
+        """绘制关系点（transform同draw_boxes）"""
+        return annotation_renderer.draw_relations(
+            draw,
+            self.get_visible_relations(),
+            font,
+            transform,
+            show_labels=self.show_labels_var.get()
+        )
+    
+    def draw_relation_arrows(self, draw, transform=None, viewport=None):
+        """
+        绘制主体框指向客体框的箭头（transform同draw_boxes）。
+        viewport为原图坐标系中的可见范围 (x0, y0, x1, y1)，完全在其外的连线直接跳过。
+        """
+        edges = self.annotation_index.relation_edges(self.current_frame, self.get_visible_relations())
+        return annotation_renderer.draw_relation_arrows(
+            draw, edges, self.color_map, transform, viewport
+        )
     
     def prev_frame(self):
         """上一帧"""
         if self.current_frame > 0:
             self.current_frame -= 1
             self.load_current_frame()
+            self.sync_playback_clock()
             
     def next_frame(self):
         """下一帧"""
-        if self.current_frame < len(self.image_files) - 1:
+        if self.current_frame < self.frame_count - 1:
             self.current_frame += 1
             self.load_current_frame()
+            self.sync_playback_clock()
             
     def jump_to_frame(self):
         """跳转到指定帧"""
         try:
             frame = int(self.frame_entry.get())
-            if 0 <= frame < len(self.image_files):
+            if 0 <= frame < self.frame_count:
                 self.current_frame = frame
                 self.load_current_frame()
+                self.sync_playback_clock()
             else:
                 from tkinter import messagebox
                 messagebox.showwarning(
                     "警告",
-                    f"帧号必须在 0 到 {len(self.image_files)-1} 之间"
+                    f"帧号必须在 0 到 {self.frame_count-1} 之间"
                 )
         except ValueError:
             from tkinter import messagebox
             messagebox.showerror("错误", "请输入有效的帧号")
             
+    def seek_to_frame(self, frame):
+        """跳转到指定帧（时间轴点击或拖动结束时调用）"""
+        if not (0 <= frame < self.frame_count):
+            return
+        self.current_frame = frame
+        self.load_current_frame()
+        self.sync_playback_clock()
+    
+    def parse_search_key(self, kind, text):
+        """将查找框输入转换为倒排索引的键（ID按界面显示的编号输入，即原始ID+1）"""
+        if kind == "track":
+            return str(int(text) - 1)
+        if kind == "pair":
+            parts = [p for p in re.split(r'[\s,，>-]+', text) if p]
+            if len(parts) != 2:
+                raise ValueError(text)
+            return (str(int(parts[0]) - 1), str(int(parts[1]) - 1))
+        return text
+    
+    def find_occurrence(self, forward=True):
+        """跳转到查找目标在当前帧之后（或之前）的下一次出现"""
+        from tkinter import messagebox
+        
+        if self.annotation_index is None:
+            messagebox.showwarning("警告", "请先加载XML标注文件")
+            return
+        
+        text = self.search_entry.get().strip()
+        if not text:
+            return
+        
+        kind_name = self.search_kind_var.get()
+        kind = self.SEARCH_KINDS.get(kind_name, "track")
+        try:
+            key = self.parse_search_key(kind, text)
+        except ValueError:
+            if kind == "pair":
+                messagebox.showerror("错误", "主宾对请输入两个ID，例如: 3,7")
+            else:
+                messagebox.showerror("错误", "请输入有效的ID")
+            return
+        
+        frame = self.annotation_index.find_occurrence(kind, key, self.current_frame, forward)
+        if frame is None or not (0 <= frame < self.frame_count):
+            direction = "之后" if forward else "之前"
+            self.status_label.config(text=f"{kind_name} {text} 在当前帧{direction}没有出现")
+            return
+        
+        self.seek_to_frame(frame)
+        self.status_label.config(text=f"{kind_name} {text} 出现在帧 {frame}")
+    
+    def show_thumbnail_preview(self, frame, thumb):
+        """拖动时间轴时显示缩略图预览（放大到当前显示尺寸）"""
+        if self.has_image():
+            size = self.get_display_size()
+        else:
+            size = thumb.size
+        preview = thumb.resize(size, Image.Resampling.BILINEAR)
+        
+        self.display_image = ImageTk.PhotoImage(preview)
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.display_image)
+        self.image_item = None
+        self.overlay_dirty = True
+        
+        total = self.frame_count
+        self.frame_label.config(text=f"帧: {frame}/{total-1} (预览)")
+    
+    def get_target_fps(self):
+        """获取目标帧率"""
+        try:
+            fps = int(self.fps_var.get())
+        except (ValueError, tk.TclError):
+            fps = self.app_config.get("playback_fps", 25)
+        return max(1, min(120, fps))
+    
+    def toggle_playback(self):
+        """播放/暂停"""
+        if self.is_playing:
+            self.pause_playback()
+        else:
+            self.start_playback()
+    
+    def start_playback(self):
+        """开始播放"""
+        if not self.image_files:
+            return
+        self.is_playing = True
+        # 已在最后一帧时从头播放
+        if self.current_frame >= self.frame_count - 1:
+            self.current_frame = 0
+            self.load_current_frame()
+        
+        self.dropped_frames = 0
+        self.shown_frame_times.clear()
+        self.play_button.config(text="⏸ 暂停")
+        self.sync_playback_clock()
+        self.play_job = self.after(1, self._playback_tick)
+    
+    def pause_playback(self):
+        """暂停或播放到结尾：停止播放，瓦片模式下为停留的帧加载瓦片金字塔"""
+        self.stop_playback()
+        if self.tiled_mode_var.get():
+            self.load_current_frame()
+    
+    def stop_playback(self):
+        """暂停播放"""
+        self.is_playing = False
+        if self.play_job:
+            self.after_cancel(self.play_job)
+            self.play_job = None
+        self.prefetcher.clear()
+        self.play_button.config(text="▶ 播放")
+        self.fps_label.config(text="")
+    
+    def sync_playback_clock(self):
+        """以当前帧重置播放时钟（播放中跳转或修改帧率时调用）"""
+        if not self.is_playing:
+            return
+        self.play_start_time = time.perf_counter()
+        self.play_start_frame = self.current_frame
+        self.play_fps = self.get_target_fps()
+        self.prefetcher.discard_outside(self.current_frame + 1, self.frame_count)
+    
+    def _playback_tick(self):
+        """播放定时任务：按时钟计算目标帧，渲染跟不上时跳帧"""
+        self.play_job = None
+        if not self.is_playing:
+            return
+        
+        fps = self.get_target_fps()
+        if fps != self.play_fps:
+            self.sync_playback_clock()
+        
+        last_frame = self.frame_count - 1
+        now = time.perf_counter()
+        target = self.play_start_frame + int((now - self.play_start_time) * fps)
+        target = min(target, last_frame)
+        
+        # 取目标帧之前最新一个已解码完成的帧，中间的帧直接丢弃
+        shown = None
+        for frame in range(target, self.current_frame, -1):
+            if self.prefetcher.is_ready(frame):
+                shown = frame
+                break
+        
+        if shown is not None:
+            decoded = self.prefetcher.take(shown)
+            self.dropped_frames += shown - self.current_frame - 1
+            self.current_frame = shown
+            if decoded is not None:
+                self.load_current_frame(decoded)
+            self.shown_frame_times.append(time.perf_counter())
+            self.update_fps_label(fps)
+        
+        # 丢弃已过期的任务，并预解码目标帧之后的帧
+        self.prefetcher.discard_outside(self.current_frame + 1, last_frame + 1)
+        self.prefetcher.prefetch(self.current_frame + 1, last_frame + 1)
+        
+        if self.current_frame >= last_frame:
+            self.pause_playback()
+            return
+        
+        # 对齐到下一帧的时间点，期间Tk事件循环保持响应
+        next_time = self.play_start_time + (target + 1 - self.play_start_frame) / fps
+        delay = max(1, int((next_time - time.perf_counter()) * 1000))
+        self.play_job = self.after(delay, self._playback_tick)
+    
+    def update_fps_label(self, target_fps):
+        """显示实际帧率和丢帧数"""
+        if len(self.shown_frame_times) < 2:
+            return
+        span = self.shown_frame_times[-1] - self.shown_frame_times[0]
+        if span <= 0:
+            return
+        achieved = (len(self.shown_frame_times) - 1) / span
+        self.fps_label.config(
+            text=f"{achieved:.1f}/{target_fps} FPS | 丢帧: {self.dropped_frames}"
+        )
+    
+    def destroy(self):
+        """销毁时停止播放并关闭解码线程"""
+        self.stop_playback()
+        self.prefetcher.shutdown()
+        if self.xml_watch_job is not None:
+            self.after_cancel(self.xml_watch_job)
+            self.xml_watch_job = None
+        if self.memory_job is not None:
+            self.after_cancel(self.memory_job)
+            self.memory_job = None
+        super().destroy()
+        
     def update_frame_label(self):
         """更新帧标签"""
-        total = len(self.image_files)
+        total = self.frame_count
         self.frame_label.config(text=f"帧: {self.current_frame}/{total-1}")
         self.frame_entry.delete(0, tk.END)
         self.frame_entry.insert(0, str(self.current_frame))
@@ -582,7 +1639,7 @@ class ImageViewer(tb.Frame):
             
     def zoom_out(self):
         """缩小"""
-        if self.zoom_scale > 0.3:
+        if self.zoom_scale > self.get_min_zoom():
             self.zoom_scale -= 0.05  # 改为5%步进
             self.zoom_label.config(text=f"{int(self.zoom_scale*100)}%")
             self.update_display()
@@ -607,10 +1664,16 @@ class ImageViewer(tb.Frame):
         # 鼠标进入/离开（改变光标样式）
         self.canvas.bind("<Enter>", self.on_canvas_enter)
         self.canvas.bind("<Leave>", self.on_canvas_leave)
+        
+        # 右键取消点选的主体
+        self.canvas.bind("<Button-3>", lambda e: self.cancel_relate())
+        
+        # 视口尺寸变化时瓦片模式需要重绘
+        self.canvas.bind("<Configure>", lambda e: self.schedule_tiled_redraw())
     
     def on_mouse_wheel(self, event):
         """鼠标滚轮事件 - 缩放"""
-        if not self.original_image:
+        if not self.has_image():
             return
         
         # 缩放时取消待处理的高亮更新，避免性能问题
@@ -628,10 +1691,10 @@ class ImageViewer(tb.Frame):
         
         # 确定缩放方向
         if event.num == 5 or event.delta < 0:  # 向下滚动 - 缩小
-            if self.zoom_scale > 0.3:
+            if self.zoom_scale > self.get_min_zoom():
                 old_scale = self.zoom_scale
                 self.zoom_scale -= 0.05  # 改为5%步进
-                self.zoom_scale = max(0.3, self.zoom_scale)
+                self.zoom_scale = max(self.get_min_zoom(), self.zoom_scale)
         else:  # 向上滚动 - 放大
             if self.zoom_scale < 3.0:
                 old_scale = self.zoom_scale
@@ -644,7 +1707,8 @@ class ImageViewer(tb.Frame):
         
         # 调整滚动位置，使缩放中心接近鼠标位置
         self.canvas.update_idletasks()
-        if hasattr(self, 'display_image') and self.display_image:
+        disp_w, disp_h = self.get_display_size()
+        if disp_w > 0 and disp_h > 0:
             new_x = x_ratio * (self.canvas.winfo_width() * self.zoom_scale)
             new_y = y_ratio * (self.canvas.winfo_height() * self.zoom_scale)
             
@@ -652,22 +1716,24 @@ class ImageViewer(tb.Frame):
             canvas_width = self.canvas.winfo_width()
             canvas_height = self.canvas.winfo_height()
             
-            scroll_x = (new_x - event.x) / (self.display_image.width())
-            scroll_y = (new_y - event.y) / (self.display_image.height())
+            scroll_x = (new_x - event.x) / disp_w
+            scroll_y = (new_y - event.y) / disp_h
             
-            if self.display_image.width() > canvas_width:
+            if disp_w > canvas_width:
                 self.canvas.xview_moveto(max(0, min(1, scroll_x)))
-            if self.display_image.height() > canvas_height:
+            if disp_h > canvas_height:
                 self.canvas.yview_moveto(max(0, min(1, scroll_y)))
+            self.schedule_tiled_redraw()
     
     def on_drag_start(self, event):
         """开始拖动"""
-        if not self.original_image:
+        if not self.has_image():
             return
         
         self.is_dragging = True
         self.drag_start_x = event.x
         self.drag_start_y = event.y
+        self.press_position = (event.x, event.y)
         
         # 拖动时取消待处理的高亮更新
         if self.pending_hover_update:
@@ -679,7 +1745,7 @@ class ImageViewer(tb.Frame):
     
     def on_drag_motion(self, event):
         """拖动中"""
-        if not self.is_dragging or not self.original_image:
+        if not self.is_dragging or not self.has_image():
             return
         
         # 计算移动距离
@@ -691,14 +1757,13 @@ class ImageViewer(tb.Frame):
         self.drag_start_y = event.y
         
         # 移动canvas视图
-        if hasattr(self, 'display_image') and self.display_image:
+        img_width, img_height = self.get_display_size()
+        if img_width > 0 and img_height > 0:
             # 获取当前滚动位置
             x_view = self.canvas.xview()
             y_view = self.canvas.yview()
             
             # 计算图片和canvas的尺寸
-            img_width = self.display_image.width()
-            img_height = self.display_image.height()
             canvas_width = self.canvas.winfo_width()
             canvas_height = self.canvas.winfo_height()
             
@@ -716,18 +1781,106 @@ class ImageViewer(tb.Frame):
                 new_y = y_view[0] + scroll_fraction_y
                 new_y = max(0, min(1 - (canvas_height / img_height), new_y))
                 self.canvas.yview_moveto(new_y)
+            
+            self.schedule_tiled_redraw()
     
     def on_drag_end(self, event):
         """结束拖动"""
         self.is_dragging = False
         # 恢复鼠标样式
         self.canvas.config(cursor="")
+        
+        # 点选关系模式下，没有移动的按下/抬起视为点击
+        if self.relate_mode_var.get() and self.press_position:
+            px, py = self.press_position
+            if abs(event.x - px) <= 3 and abs(event.y - py) <= 3:
+                self.on_relate_click(event.x, event.y)
+        self.press_position = None
         # 延迟触发高亮检查，避免立即重绘
         self.after(100, lambda: self._do_hover_check(event.x, event.y))
     
+    def on_relate_mode_changed(self):
+        """切换点选关系模式"""
+        self.cancel_relate()
+        if self.relate_mode_var.get():
+            self.status_label.config(text="点选关系：先点击主体框，再点击客体框（右键取消）")
+    
+    def cancel_relate(self):
+        """取消已选中的主体"""
+        self.relate_subject = None
+        self.canvas.delete("relate_marker")
+    
+    def on_relate_click(self, x, y):
+        """点选关系：第一次点击选主体，第二次点击选客体并选择谓词"""
+        if not self.annotation_index:
+            return
+        
+        img_x = self.canvas.canvasx(x) / self.zoom_scale
+        img_y = self.canvas.canvasy(y) / self.zoom_scale
+        track_id = self.find_box_at_position_cached(img_x, img_y)
+        if track_id is None:
+            return
+        
+        if self.relate_subject is None or self.relate_subject == track_id:
+            self.relate_subject = track_id
+            self.draw_relate_marker()
+            self.status_label.config(text=f"主体 #{int(track_id)+1}，请点击客体框")
+            return
+        
+        subject_id = self.relate_subject
+        self.cancel_relate()
+        self.create_relation(subject_id, track_id)
+    
+    def create_relation(self, subject_id, object_id):
+        """弹出谓词选择并把关系交给回调加入自定义关系列表"""
+        predicates = self.predicates_getter() if self.predicates_getter else []
+        if not predicates:
+            predicates = sorted(p for p in self.annotation_index.predicate_intervals if p)
+        
+        subject = self.annotation_index.get_box(subject_id, self.current_frame)
+        obj = self.annotation_index.get_box(object_id, self.current_frame)
+        picker = PredicatePickerDialog(
+            self.winfo_toplevel(),
+            predicates,
+            f"{subject[6]} #{int(subject_id)+1}",
+            f"{obj[6]} #{int(object_id)+1}"
+        )
+        self.wait_window(picker)
+        predicate = picker.result
+        if not predicate:
+            self.status_label.config(text="已取消添加关系")
+            return
+        
+        if self.on_relation_created is None:
+            self.status_label.config(text="当前没有可添加关系的目标")
+            return
+        added = self.on_relation_created(subject_id, object_id, predicate)
+        if added:
+            text = f"已添加关系: #{int(subject_id)+1} {predicate} #{int(object_id)+1}"
+        else:
+            text = f"关系已存在: #{int(subject_id)+1} {predicate} #{int(object_id)+1}"
+        self.status_label.config(text=text)
+    
+    def draw_relate_marker(self):
+        """在已选中的主体框上绘制虚线标记"""
+        self.canvas.delete("relate_marker")
+        if self.relate_subject is None or not self.annotation_index:
+            return
+        box = self.annotation_index.get_box(self.relate_subject, self.current_frame)
+        if box is None:
+            return
+        scale = self.zoom_scale
+        self.canvas.create_rectangle(
+            box[1] * scale - 3, box[2] * scale - 3, box[3] * scale + 3, box[4] * scale + 3,
+            outline='#F8B739',
+            width=3,
+            dash=(6, 4),
+            tags=("relate_marker",)
+        )
+    
     def on_canvas_enter(self, event):
         """鼠标进入canvas"""
-        if self.original_image:
+        if self.has_image():
             self.canvas.config(cursor="hand2")
     
     def on_canvas_leave(self, event):
@@ -736,12 +1889,11 @@ class ImageViewer(tb.Frame):
             self.canvas.config(cursor="")
         # 清除高亮
         if self.hovered_box:
-            self.hovered_box = None
-            self.update_display()
+            self.set_hovered_box(None)
     
     def on_mouse_move(self, event):
         """鼠标移动事件 - 用于高亮（优化版）"""
-        if self.is_dragging or not self.original_image:
+        if self.is_dragging or not self.has_image():
             return
         
         # 防抖：限制检查频率
@@ -763,7 +1915,7 @@ class ImageViewer(tb.Frame):
     
     def _do_hover_check(self, x, y):
         """实际执行高亮检查"""
-        if not self.original_image:
+        if not self.has_image():
             return
         
         # 获取鼠标在原始图片上的坐标
@@ -775,11 +1927,25 @@ class ImageViewer(tb.Frame):
         img_y = canvas_y / self.zoom_scale
         
         # 查找鼠标位置的框（使用缓存）
-        new_hovered = self.find_box_at_position_cached(img_x, img_y)
+        if self.annotation_index:
+            self.render_stats.count(
+                "空间索引", self.current_frame in self.annotation_index.spatial_grids
+            )
+        with self.render_stats.measure('hover'):
+            new_hovered = self.find_box_at_position_cached(img_x, img_y)
         
         # 只在高亮框改变时重新绘制
         if new_hovered != self.hovered_box:
-            self.hovered_box = new_hovered
+            self.set_hovered_box(new_hovered)
+        self.update_hud()
+    
+    def set_hovered_box(self, track_id):
+        """更新高亮框：矢量模式只改图元样式，位图模式整体重绘"""
+        old_track_id = self.hovered_box
+        self.hovered_box = track_id
+        if self.vector_overlay_var.get() and self.image_item is not None:
+            self.update_hover_overlay(old_track_id, track_id)
+        else:
             self.update_display()
     
     def find_box_at_position(self, x, y):
@@ -787,62 +1953,11 @@ class ImageViewer(tb.Frame):
         return self.find_box_at_position_cached(x, y)
     
     def find_box_at_position_cached(self, x, y):
-        """查找指定位置的最小边界框（使用缓存优化）"""
-        # 构建当前帧的缓存（如果需要）
-        if self.current_frame not in self.boxes_cache:
-            self._build_boxes_cache()
-        
-        # 从缓存中查找
-        cache = self.boxes_cache.get(self.current_frame, [])
-        candidates = []
-        
-        for track_id, xtl, ytl, xbr, ybr, area, label in cache:
-            # 检查点是否在框内
-            if xtl <= x <= xbr and ytl <= y <= ybr:
-                candidates.append((track_id, area))
-        
-        # 返回面积最小的框
-        if candidates:
-            candidates.sort(key=lambda item: item[1])
-            return candidates[0][0]
-        
-        return None
-    
-    def _build_boxes_cache(self):
-        """构建当前帧的框缓存"""
-        if not self.xml_root:
-            return
-        
-        cache = []
-        
-        for track in self.xml_root.findall('track'):
-            label = track.get('label')
-            if label == 'Relation':
-                continue
-            
-            track_id = track.get('id')
-            
-            # 查找当前帧的box
-            for box in track.findall('box'):
-                frame = int(box.get('frame'))
-                if frame != self.current_frame:
-                    continue
-                
-                outside = box.get('outside', '0')
-                if outside == '1':
-                    continue
-                
-                # 获取坐标
-                xtl = float(box.get('xtl'))
-                ytl = float(box.get('ytl'))
-                xbr = float(box.get('xbr'))
-                ybr = float(box.get('ybr'))
-                
-                # 计算面积
-                area = (xbr - xtl) * (ybr - ytl)
-                
-                cache.append((track_id, xtl, ytl, xbr, ybr, area, label))
-                break
-        
-        # 存储到缓存
-        self.boxes_cache[self.current_frame] = cache
+        """查找指定位置的最小边界框（使用空间索引）"""
+        if not self.annotation_index:
+            return None
+        
+        # 空间索引按帧懒加载构建，命中测试只检查鼠标所在格子；
+        # 有筛选时只在可见框中查找，被隐藏的框下面的可见框仍可高亮
+        allowed = self.get_visible_box_ids() if self.has_filters() else None
+        return self.annotation_index.find_box_at(self.current_frame, x, y, allowed)
@@ -7,8 +7,11 @@ import xml.etree.ElementTree as ET
 from config import load_config
 from labels_manager import load_labels_config
 from xml_processor import process_xml_file
+from annotation_index import AnnotationIndex
+from relation_rules import load_rules, evaluate_rules, add_to_custom_relations
 from .dialogs import CustomRelationDialog
 from .image_viewer import ImageViewer
+from .tile_pyramid import set_max_image_pixels
 import pandas as pd
 from datetime import datetime
 import json
@@ -38,6 +41,8 @@ class XMLRelationApp:
 
         # 初始化配置
         self.config = load_config()
+        # 超大航拍/监控帧的像素上限（进程内只设置一次，瓦片模式读取和构建都使用）
+        set_max_image_pixels(self.config.get("max_image_megapixels", 1000))
         self.entity_classes, self.predicates = load_labels_config()
         self.category_to_trackids = {}
         self.custom_relations = {}
@@ -98,6 +103,10 @@ class XMLRelationApp:
             command=self.open_custom_relation_dialog,
             accelerator="Ctrl+R"
         )
+        relation_menu.add_command(
+            label="按空间规则生成关系...",
+            command=self.generate_rule_relations
+        )
         menubar.add_cascade(label="自定义关系", menu=relation_menu)
 
         # 标签配置菜单
@@ -218,9 +227,27 @@ class XMLRelationApp:
     def create_viewer_tab(self, parent):
         """创建标注可视化标签页"""
         # 创建图片查看器
-        self.image_viewer = ImageViewer(parent, bootstyle="light")
+        self.image_viewer = ImageViewer(
+            parent,
+            config=self.config,
+            on_relation_created=self.add_viewer_relation,
+            predicates_getter=lambda: self.predicates,
+            bootstyle="light"
+        )
         self.image_viewer.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
+    def add_viewer_relation(self, subj_id, obj_id, predicate):
+        """图片查看器中点选的关系加入自定义关系列表（原始ID），已存在时返回False"""
+        rel_list = self.custom_relations.setdefault(subj_id, [])
+        if (obj_id, predicate) in rel_list:
+            return False
+        rel_list.append((obj_id, predicate))
+        self.update_custom_relations_display()
+        self.status_label.config(
+            text=f"已添加关系: #{int(subj_id) + 1} {predicate} #{int(obj_id) + 1}"
+        )
+        return True
+
     def toggle_viewer(self):
         """切换到标注视图"""
         self.notebook.select(1)
@@ -703,29 +730,17 @@ class XMLRelationApp:
             return
 
         try:
-            tree = ET.parse(input_file)
-            root = tree.getroot()
-
             entity_classes = self.entity_classes
             predicates = self.predicates
 
-            category_to_trackids = {}
-            for track in root.findall('track'):
-                label = track.get('label')
-                track_id = track.get('id')
-                if label and label != "Relation":
-                    key = label.lower()
-                    if key not in category_to_trackids:
-                        category_to_trackids[key] = []
-                    category_to_trackids[key].append(track_id)
-
+            # XML解析和主体列表构建在对话框的后台线程中进行，对话框立即显示
             custom_dialog = CustomRelationDialog(
                 self.root,
                 input_file,
-                root,
+                None,
                 entity_classes,
                 predicates,
-                category_to_trackids,
+                None,
                 self.custom_relations,
                 self.relations_to_delete,
                 self.relations_to_delete_details,
@@ -739,6 +754,56 @@ class XMLRelationApp:
         except Exception as e:
             messagebox.showerror("错误", f"解析XML文件失败: {str(e)}")
 
+    def generate_rule_relations(self):
+        """按规则文件中的几何条件在所有帧上自动生成关系，加入自定义关系列表"""
+        input_file = self.input_entry.get()
+        if not input_file:
+            messagebox.showwarning("警告", "请先选择XML文件")
+            return
+
+        rules_file = filedialog.askopenfilename(
+            title="选择关系规则文件",
+            initialfile="relation_rules.json",
+            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+        )
+        if not rules_file:
+            return
+
+        try:
+            rules = load_rules(rules_file)
+        except Exception as e:
+            messagebox.showerror("错误", f"加载规则文件失败: {str(e)}")
+            return
+
+        self.status_label.config(text=f"正在按 {len(rules)} 条规则生成关系...")
+
+        def progress_callback(done, total):
+            self.root.after(0, lambda: self.update_progress(
+                done * 100 / max(total, 1), f"规则求值: {done}/{total} 帧"
+            ))
+
+        def worker():
+            try:
+                index = AnnotationIndex.from_file(input_file)
+                matches, stats = evaluate_rules(index, rules, progress_callback=progress_callback)
+                self.root.after(0, lambda: self.finish_rule_relations(matches, stats))
+            except Exception as e:
+                message = f"规则生成关系失败: {str(e)}"
+                self.root.after(0, lambda: messagebox.showerror("错误", message))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish_rule_relations(self, matches, stats):
+        """规则求值完成：并入自定义关系并刷新显示"""
+        added = add_to_custom_relations(self.custom_relations, matches)
+        self.update_custom_relations_display()
+        message = (
+            f"共 {stats['frames']} 帧，候选框对 {stats['candidates']}，"
+            f"匹配 {len(matches)} 条，新增自定义关系 {added} 条"
+        )
+        self.status_label.config(text=message)
+        messagebox.showinfo("规则生成完成", message)
+
     def clear_deletion_list(self):
         """清空预删除关系点列表"""
         self.relations_to_delete = []
@@ -0,0 +1,89 @@
+import time
+
+
+def image_bytes(image):
+    """PIL图片占用的像素内存（字节）"""
+    if image is None:
+        return 0
+    return image.width * image.height * len(image.getbands())
+
+
+class MemoryBudget:
+    """
+    内存预算 - 统一管理查看器各缓存的内存上限。
+    每个缓存注册自己的占用统计和逐项淘汰函数；超出上限时按
+    “最久未使用时长 / 重建代价” 选择缓存淘汰，直到回到预算以内。
+    """
+
+    def __init__(self, limit_mb=1024):
+        self.limit_bytes = int(limit_mb * 1024 * 1024)
+        self.caches = {}  # {名称: (占用函数, 淘汰函数, 最久访问时间函数, 代价)}
+
+    def register(self, name, usage, evict_one=None, oldest_access=None, cost=1.0):
+        """
+        注册缓存：
+        usage() -> 当前占用字节数
+        evict_one() -> 淘汰最久未使用的一项，返回释放的字节数（0表示无可淘汰项）；None表示不可淘汰
+        oldest_access() -> 最久未使用项的访问时间（time.monotonic()），None表示未知
+        cost: 重建一项的相对代价，代价越高越晚淘汰
+        """
+        self.caches[name] = (usage, evict_one, oldest_access, cost)
+
+    def usage(self):
+        """各缓存当前占用 {名称: 字节数}"""
+        result = {}
+        for name, (usage, _, _, _) in self.caches.items():
+            try:
+                result[name] = usage()
+            except Exception as e:
+                print(f"统计缓存占用失败: {e}")
+                result[name] = 0
+        return result
+
+    def total_usage(self):
+        return sum(self.usage().values())
+
+    def enforce(self):
+        """超出预算时淘汰缓存项，返回释放的字节数"""
+        usage = self.usage()
+        total = sum(usage.values())
+        freed = 0
+        exhausted = set()
+
+        while total > self.limit_bytes:
+            name = self._pick_victim(usage, exhausted)
+            if name is None:
+                break
+            released = self.caches[name][1]()
+            if not released:
+                exhausted.add(name)
+                continue
+            usage[name] -= released
+            total -= released
+            freed += released
+
+        return freed
+
+    def _pick_victim(self, usage, exhausted):
+        """选择淘汰得分最高的缓存：闲置越久、占用越大、重建代价越低越先淘汰"""
+        now = time.monotonic()
+        best = None
+        best_score = -1.0
+        for name, (_, evict_one, oldest_access, cost) in self.caches.items():
+            if evict_one is None or name in exhausted or usage.get(name, 0) <= 0:
+                continue
+            oldest = oldest_access() if oldest_access else None
+            idle = now - oldest if oldest is not None else 0.0
+            score = (idle + 1.0) * usage[name] / max(cost, 1e-6)
+            if score > best_score:
+                best, best_score = name, score
+        return best
+
+    def summary_text(self):
+        """状态栏显示的各缓存占用"""
+        usage = self.usage()
+        total = sum(usage.values())
+        parts = [f"内存 {total / 1048576:.0f}/{self.limit_bytes / 1048576:.0f}MB"]
+        for name, used in usage.items():
+            parts.append(f"{name} {used / 1048576:.1f}")
+        return " | ".join(parts)
@@ -0,0 +1,123 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class RenderStats:
+    """渲染耗时统计 - 记录各阶段耗时和缓存命中率，保留滚动窗口用于直方图"""
+
+    # 阶段名称 -> 显示名称
+    STAGES = {
+        'decode': "解码",
+        'draw': "绘制",
+        'resize': "缩放",
+        'photo': "PhotoImage",
+        'hover': "高亮检测",
+    }
+    # 直方图各桶上限（毫秒），最后一个桶收集更慢的样本
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = {stage: deque(maxlen=window) for stage in self.STAGES}
+        self.last = {}  # 当前帧各阶段最近一次耗时（秒）
+        self.cache_counts = {}  # {缓存名称: [命中, 未命中]}
+
+    @contextmanager
+    def measure(self, stage):
+        """计时上下文：with stats.measure('draw'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        """记录一次阶段耗时"""
+        self.last[stage] = seconds
+        self.samples[stage].append(seconds)
+
+    def count(self, cache, hit):
+        """记录一次缓存访问"""
+        counts = self.cache_counts.setdefault(cache, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def set_cache_counts(self, cache, hits, misses):
+        """直接设置由缓存自身维护的命中计数"""
+        self.cache_counts[cache] = [hits, misses]
+
+    def begin_frame(self):
+        """切换帧时清空当前帧的阶段耗时"""
+        self.last = {}
+
+    def hit_rate(self, cache):
+        """缓存命中率，没有访问记录时返回None"""
+        hits, misses = self.cache_counts.get(cache, (0, 0))
+        total = hits + misses
+        return hits / total if total else None
+
+    def histogram(self, stage):
+        """滚动窗口内该阶段耗时的直方图（各桶样本数）"""
+        buckets = [0] * (len(self.BUCKETS_MS) + 1)
+        for seconds in self.samples[stage]:
+            ms = seconds * 1000
+            for i, limit in enumerate(self.BUCKETS_MS):
+                if ms <= limit:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+        return buckets
+
+    def percentile(self, stage, q):
+        """滚动窗口内该阶段耗时的分位数（秒）"""
+        values = sorted(self.samples[stage])
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary_text(self):
+        """HUD显示的文本"""
+        lines = []
+        for stage, name in self.STAGES.items():
+            last = self.last.get(stage)
+            p95 = self.percentile(stage, 0.95)
+            last_text = f"{last * 1000:6.1f}ms" if last is not None else "     -  "
+            p95_text = f"p95 {p95 * 1000:.1f}ms" if p95 is not None else ""
+            lines.append(f"{name:<10} {last_text}  {p95_text}")
+        for cache in sorted(self.cache_counts):
+            rate = self.hit_rate(cache)
+            if rate is not None:
+                lines.append(f"{cache:<10} 命中率 {rate * 100:.0f}%")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        """导出为可序列化的字典"""
+        labels = [f"<={limit}ms" for limit in self.BUCKETS_MS]
+        labels.append(f">{self.BUCKETS_MS[-1]}ms")
+        stages = {}
+        for stage in self.STAGES:
+            samples = self.samples[stage]
+            stages[stage] = {
+                "count": len(samples),
+                "mean_ms": sum(samples) * 1000 / len(samples) if samples else None,
+                "p50_ms": _ms(self.percentile(stage, 0.5)),
+                "p95_ms": _ms(self.percentile(stage, 0.95)),
+                "max_ms": max(samples) * 1000 if samples else None,
+                "histogram": dict(zip(labels, self.histogram(stage))),
+            }
+        caches = {
+            cache: {"hits": hits, "misses": misses, "hit_rate": self.hit_rate(cache)}
+            for cache, (hits, misses) in self.cache_counts.items()
+        }
+        return {"window": self.window, "stages": stages, "caches": caches}
+
+    def export_json(self, path):
+        """导出统计到JSON文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def _ms(seconds):
+    return seconds * 1000 if seconds is not None else None
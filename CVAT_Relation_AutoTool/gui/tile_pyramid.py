@@ -0,0 +1,192 @@
+from PIL import Image
+import os
+import math
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .memory_budget import image_bytes
+
+
+# 默认瓦片缓存目录
+DEFAULT_TILE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cvat_relation_autotool", "tiles"
+)
+
+
+def set_max_image_pixels(megapixels):
+    """
+    设置PIL解压炸弹检查的像素上限（启动时调用一次，读取文件头和构建金字塔都使用该上限）。
+    超过上限时PIL发出警告，超过两倍时拒绝解码；megapixels <= 0 表示不限制。
+    """
+    Image.MAX_IMAGE_PIXELS = int(megapixels * 1000000) if megapixels > 0 else None
+
+
+class TilePyramid:
+    """
+    多分辨率瓦片金字塔 - 每张图片构建一次并缓存到磁盘，显示时只读取视口内的瓦片。
+    disk_budget（DiskCacheBudget，以每张图片的瓦片目录为条目）限制所有金字塔的磁盘总占用。
+    """
+
+    def __init__(self, image_path, cache_dir=None, tile_size=512, memory_tiles=64, disk_budget=None):
+        self.image_path = image_path
+        self.disk_budget = disk_budget
+        self.tile_size = tile_size
+        self.memory_tiles = memory_tiles  # 内存中最多保留的瓦片数
+        self.tiles = OrderedDict()  # {(level, tx, ty): Image}
+        self.access_times = {}  # {(level, tx, ty): 最近访问时间}
+        self.memory_bytes = 0  # 内存中瓦片的像素字节数
+        self.lock = threading.Lock()
+        self.hits = 0  # 内存瓦片缓存命中次数
+        self.misses = 0
+
+        # 只读取文件头获取尺寸，不解码像素
+        with Image.open(image_path) as img:
+            self.width, self.height = img.size
+
+        # 层级：第L层为原图的 1/2^L，直到整张图能放进一个瓦片
+        self.levels = 1 + max(0, math.ceil(math.log2(max(self.width, self.height) / tile_size)))
+
+        st = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{tile_size}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        self.tile_dir = os.path.join(cache_dir or DEFAULT_TILE_DIR, digest)
+        if self.disk_budget is not None and self.is_built:
+            # 重新打开的金字塔最后被淘汰
+            self.disk_budget.touch(self.tile_dir)
+
+    @property
+    def is_built(self):
+        """金字塔是否已构建（磁盘上有完成标记）"""
+        return os.path.exists(os.path.join(self.tile_dir, "done"))
+
+    def build(self):
+        """构建金字塔：解码一次原图，逐层减半并切片写入磁盘（可在工作线程中调用）"""
+        if self.is_built:
+            return
+
+        os.makedirs(self.tile_dir, exist_ok=True)
+        level_image = Image.open(self.image_path).convert('RGB')
+
+        for level in range(self.levels):
+            if level > 0:
+                level_image = level_image.reduce(2)
+            cols = math.ceil(level_image.width / self.tile_size)
+            rows = math.ceil(level_image.height / self.tile_size)
+            for ty in range(rows):
+                for tx in range(cols):
+                    box = (
+                        tx * self.tile_size,
+                        ty * self.tile_size,
+                        min(level_image.width, (tx + 1) * self.tile_size),
+                        min(level_image.height, (ty + 1) * self.tile_size)
+                    )
+                    level_image.crop(box).save(self._tile_path(level, tx, ty), "JPEG", quality=90)
+
+        level_image = None
+        with open(os.path.join(self.tile_dir, "done"), "w") as f:
+            f.write(f"{self.width}x{self.height}")
+        if self.disk_budget is not None:
+            self.disk_budget.add(self.tile_dir)
+
+    def _tile_path(self, level, tx, ty):
+        return os.path.join(self.tile_dir, f"{level}_{tx}_{ty}.jpg")
+
+    def get_tile(self, level, tx, ty):
+        """读取一个瓦片（内存LRU缓存）"""
+        key = (level, tx, ty)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                self.access_times[key] = time.monotonic()
+                self.hits += 1
+                return tile
+            self.misses += 1
+
+        tile = Image.open(self._tile_path(level, tx, ty))
+        tile.load()
+
+        with self.lock:
+            if key not in self.tiles:
+                self.memory_bytes += image_bytes(tile)
+            self.tiles[key] = tile
+            self.access_times[key] = time.monotonic()
+            while len(self.tiles) > self.memory_tiles:
+                self._pop_oldest()
+        return tile
+
+    def _pop_oldest(self):
+        """移除最久未使用的瓦片（调用方持有锁），返回释放的字节数"""
+        key, tile = self.tiles.popitem(last=False)
+        self.access_times.pop(key, None)
+        released = image_bytes(tile)
+        self.memory_bytes -= released
+        return released
+
+    def memory_usage(self):
+        """内存中瓦片占用的字节数"""
+        return self.memory_bytes
+
+    def evict_one(self):
+        """淘汰一个最久未使用的瓦片，返回释放的字节数"""
+        with self.lock:
+            if not self.tiles:
+                return 0
+            return self._pop_oldest()
+
+    def oldest_access(self):
+        """最久未使用的瓦片的访问时间"""
+        with self.lock:
+            if not self.tiles:
+                return None
+            return self.access_times.get(next(iter(self.tiles)))
+
+    def level_for_zoom(self, zoom_scale):
+        """选择最接近缩放比例且分辨率不低于显示需要的层级"""
+        if zoom_scale >= 1.0:
+            return 0
+        level = int(math.floor(math.log2(1.0 / zoom_scale)))
+        return max(0, min(self.levels - 1, level))
+
+    def render_region(self, x0, y0, x1, y1, zoom_scale):
+        """
+        渲染原图坐标系中[x0, x1) x [y0, y1)区域，输出为缩放后的显示尺寸。
+        只读取与该区域相交的瓦片，内存占用与视口大小成正比。
+        """
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width, x1), min(self.height, y1)
+        out_w = max(1, int(round((x1 - x0) * zoom_scale)))
+        out_h = max(1, int(round((y1 - y0) * zoom_scale)))
+        if x1 <= x0 or y1 <= y0:
+            return Image.new('RGB', (out_w, out_h))
+
+        level = self.level_for_zoom(zoom_scale)
+        factor = 2 ** level
+        # 区域在该层级上的像素坐标
+        lx0, ly0 = int(x0 // factor), int(y0 // factor)
+        lx1, ly1 = int(math.ceil(x1 / factor)), int(math.ceil(y1 / factor))
+
+        tx0, ty0 = lx0 // self.tile_size, ly0 // self.tile_size
+        tx1, ty1 = (lx1 - 1) // self.tile_size, (ly1 - 1) // self.tile_size
+
+        region = Image.new('RGB', (lx1 - lx0, ly1 - ly0))
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                try:
+                    tile = self.get_tile(level, tx, ty)
+                except (OSError, ValueError):
+                    continue
+                region.paste(tile, (tx * self.tile_size - lx0, ty * self.tile_size - ly0))
+
+        # 用浮点裁剪框消除层级取整带来的偏移，保证与标注坐标对齐
+        crop_box = (x0 / factor - lx0, y0 / factor - ly0, x1 / factor - lx0, y1 / factor - ly0)
+        return region.resize((out_w, out_h), Image.Resampling.BILINEAR, box=crop_box)
+
+    def release(self):
+        """释放内存中的瓦片"""
+        with self.lock:
+            self.tiles.clear()
+            self.access_times.clear()
+            self.memory_bytes = 0
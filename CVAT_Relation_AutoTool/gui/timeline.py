@@ -0,0 +1,470 @@
+import tkinter as tk
+import ttkbootstrap as tb
+from PIL import Image, ImageTk
+import os
+import hashlib
+import queue
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .disk_cache import DiskCacheBudget
+from .memory_budget import image_bytes
+
+
+# 默认缩略图缓存目录
+DEFAULT_THUMBNAIL_DIR = os.path.join(
+    os.path.expanduser("~"), ".cvat_relation_autotool", "thumbnails"
+)
+
+
+class ThumbnailCache:
+    """
+    缩略图缓存 - 内存LRU + 磁盘持久化（按图片路径和修改时间区分）。
+    磁盘缓存有容量上限，超出时删除最久未使用的缩略图；缓存目录在首次写入时创建。
+    """
+
+    def __init__(self, cache_dir=None, size=(96, 54), memory_limit=512, disk_limit_mb=512):
+        self.cache_dir = cache_dir or DEFAULT_THUMBNAIL_DIR
+        self.size = size
+        self.memory_limit = memory_limit
+        self.memory = OrderedDict()  # {image_path: Image}
+        self.access_times = {}  # {image_path: 最近访问时间}
+        self.memory_bytes = 0  # 内存中缩略图的像素字节数
+        self.lock = threading.Lock()  # 内存缓存会被工作线程访问
+        self.disk_budget = DiskCacheBudget(self.cache_dir, disk_limit_mb * 1024 * 1024)
+
+    def _disk_path(self, image_path):
+        """缩略图在磁盘上的路径（图片路径 + 修改时间 + 文件大小作为键）"""
+        st = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{self.size}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".jpg")
+
+    def _remember(self, image_path, thumb):
+        with self.lock:
+            old = self.memory.get(image_path)
+            if old is not None:
+                self.memory_bytes -= image_bytes(old)
+            self.memory[image_path] = thumb
+            self.memory.move_to_end(image_path)
+            self.access_times[image_path] = time.monotonic()
+            self.memory_bytes += image_bytes(thumb)
+            while len(self.memory) > self.memory_limit:
+                self._pop_oldest()
+
+    def _pop_oldest(self):
+        """移除最久未使用的缩略图（调用方持有锁），返回释放的字节数"""
+        image_path, thumb = self.memory.popitem(last=False)
+        self.access_times.pop(image_path, None)
+        released = image_bytes(thumb)
+        self.memory_bytes -= released
+        return released
+
+    def memory_usage(self):
+        """内存中缩略图占用的字节数"""
+        return self.memory_bytes
+
+    def evict_one(self):
+        """淘汰一张最久未使用的缩略图，返回释放的字节数"""
+        with self.lock:
+            if not self.memory:
+                return 0
+            return self._pop_oldest()
+
+    def oldest_access(self):
+        """最久未使用的缩略图的访问时间"""
+        with self.lock:
+            if not self.memory:
+                return None
+            return self.access_times.get(next(iter(self.memory)))
+
+    def get_cached(self, image_path, check_disk=False):
+        """取已缓存的缩略图，不生成新的；不存在返回None（Tk线程调用）"""
+        with self.lock:
+            thumb = self.memory.get(image_path)
+            if thumb is not None:
+                self.memory.move_to_end(image_path)
+                self.access_times[image_path] = time.monotonic()
+                return thumb
+
+        if check_disk:
+            return self._load_from_disk(image_path)
+        return None
+
+    def _load_from_disk(self, image_path):
+        """从磁盘读取缩略图，不存在或已失效返回None"""
+        try:
+            disk_path = self._disk_path(image_path)
+            if not os.path.exists(disk_path):
+                return None
+            thumb = Image.open(disk_path)
+            thumb.load()
+        except Exception:
+            return None
+        self.disk_budget.touch(disk_path)
+        self._remember(image_path, thumb)
+        return thumb
+
+    def load_or_create(self, image_path):
+        """从磁盘读取缩略图，不存在时生成并写入磁盘（工作线程调用）"""
+        thumb = self.get_cached(image_path, check_disk=True)
+        if thumb is not None:
+            return thumb
+
+        img = Image.open(image_path)
+        # JPEG可直接按缩小比例解码
+        img.draft('RGB', self.size)
+        img = img.convert('RGB')
+        img.thumbnail(self.size)
+
+        disk_path = self._disk_path(image_path)
+        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+        tmp_path = disk_path + ".tmp"
+        img.save(tmp_path, "JPEG", quality=80)
+        os.replace(tmp_path, disk_path)
+        self.disk_budget.add(disk_path)
+
+        self._remember(image_path, img)
+        return img
+
+
+class TimelineStrip(tb.Frame):
+    """缩略图时间轴 - 可拖动的帧缩略图条"""
+
+    SLOT_GAP = 4  # 缩略图间距
+    MAX_PENDING = 4  # 同时进行的后台生成任务数
+
+    def __init__(self, parent, path_getter, on_seek, on_preview, cache=None, **kwargs):
+        super().__init__(parent, **kwargs)
+
+        self.path_getter = path_getter  # 帧号 -> 图片路径
+        self.on_seek = on_seek  # 拖动结束或点击缩略图时加载完整帧
+        self.on_preview = on_preview  # 拖动过程中显示缩略图预览
+        self.cache = cache or ThumbnailCache()
+
+        self.frame_count = 0
+        self.current_frame = 0
+        self.scrub_frame = None  # 正在拖动时的帧号
+        self.is_updating_scale = False
+
+        # 后台生成
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnail")
+        self.results = queue.Queue()  # 工作线程 -> Tk线程
+        self.pending = set()  # 正在生成的帧
+        self.prewarm_cursor = 0  # 后台预生成进度
+        self.generation = 0  # 切换文件夹后丢弃旧任务的结果
+        self.poll_job = None
+
+        self.slot_images = {}  # 当前显示的PhotoImage引用 {frame: PhotoImage}
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        """创建控件"""
+        thumb_w, thumb_h = self.cache.size
+
+        self.strip_canvas = tk.Canvas(
+            self,
+            height=thumb_h + 8,
+            bg='#1e1e1e',
+            highlightthickness=0
+        )
+        self.strip_canvas.pack(fill=tk.X)
+        self.strip_canvas.bind("<Configure>", lambda e: self.redraw())
+        self.strip_canvas.bind("<Button-1>", self.on_strip_click)
+
+        self.scale_var = tk.DoubleVar(value=0)
+        self.scale = tb.Scale(
+            self,
+            from_=0,
+            to=0,
+            orient=tk.HORIZONTAL,
+            variable=self.scale_var,
+            command=self.on_scrub,
+            bootstyle="info"
+        )
+        self.scale.pack(fill=tk.X, pady=(2, 0))
+        self.scale.bind("<ButtonRelease-1>", self.on_scrub_end)
+
+    def set_frame_count(self, frame_count):
+        """设置总帧数（加载新图片文件夹时调用）"""
+        self.frame_count = frame_count
+        self.current_frame = 0
+        self.scrub_frame = None
+        self.pending.clear()
+        self.prewarm_cursor = 0
+        self.generation += 1
+        self.slot_images = {}
+
+        self.is_updating_scale = True
+        self.scale.configure(to=max(0, frame_count - 1))
+        self.scale_var.set(0)
+        self.is_updating_scale = False
+
+        self.redraw()
+        self._schedule_poll()
+
+    def set_current(self, frame):
+        """同步当前帧（不触发预览回调）"""
+        self.current_frame = frame
+        if self.scrub_frame is None:
+            self.is_updating_scale = True
+            self.scale_var.set(frame)
+            self.is_updating_scale = False
+        self.redraw()
+
+    def on_scrub(self, value):
+        """拖动滑块：立即显示缓存的缩略图"""
+        if self.is_updating_scale or not self.frame_count:
+            return
+        frame = int(float(value))
+        if frame == self.scrub_frame:
+            return
+        self.scrub_frame = frame
+        self.redraw()
+
+        image_path = self.path_getter(frame)
+        thumb = self.cache.get_cached(image_path, check_disk=True) if image_path else None
+        if thumb is not None:
+            self.on_preview(frame, thumb)
+        else:
+            self.request(frame)
+
+    def on_scrub_end(self, event=None):
+        """拖动结束：加载完整帧"""
+        if self.scrub_frame is None:
+            return
+        frame = self.scrub_frame
+        self.scrub_frame = None
+        self.on_seek(frame)
+
+    def on_strip_click(self, event):
+        """点击缩略图跳转"""
+        frame = self._frame_at(event.x)
+        if frame is not None:
+            self.on_seek(frame)
+
+    def _visible_frames(self):
+        """当前缩略图条上可见的帧（以当前帧为中心）"""
+        if not self.frame_count:
+            return []
+        slot_w = self.cache.size[0] + self.SLOT_GAP
+        slots = max(1, self.strip_canvas.winfo_width() // slot_w)
+        center = self.scrub_frame if self.scrub_frame is not None else self.current_frame
+        start = max(0, min(center - slots // 2, self.frame_count - slots))
+        return list(range(start, min(self.frame_count, start + slots)))
+
+    def _frame_at(self, x):
+        slot_w = self.cache.size[0] + self.SLOT_GAP
+        frames = self._visible_frames()
+        index = int(x // slot_w)
+        if 0 <= index < len(frames):
+            return frames[index]
+        return None
+
+    def redraw(self):
+        """重绘缩略图条"""
+        self.strip_canvas.delete("all")
+        thumb_w, thumb_h = self.cache.size
+        slot_w = thumb_w + self.SLOT_GAP
+        highlight = self.scrub_frame if self.scrub_frame is not None else self.current_frame
+
+        slot_images = {}
+        for i, frame in enumerate(self._visible_frames()):
+            x = i * slot_w + self.SLOT_GAP // 2
+            y = 4
+            image_path = self.path_getter(frame)
+            thumb = self.cache.get_cached(image_path) if image_path else None
+
+            if thumb is not None:
+                photo = self.slot_images.get(frame) or ImageTk.PhotoImage(thumb)
+                slot_images[frame] = photo
+                self.strip_canvas.create_image(x, y, anchor=tk.NW, image=photo)
+            else:
+                self.strip_canvas.create_rectangle(
+                    x, y, x + thumb_w, y + thumb_h, fill='#3a3a3a', outline=''
+                )
+                self.strip_canvas.create_text(
+                    x + thumb_w // 2, y + thumb_h // 2,
+                    text=str(frame), fill='#aaaaaa'
+                )
+                self.request(frame)
+
+            if frame == highlight:
+                self.strip_canvas.create_rectangle(
+                    x - 1, y - 1, x + thumb_w + 1, y + thumb_h + 1,
+                    outline='#F8B739', width=2
+                )
+
+        # 只保留可见缩略图的PhotoImage引用
+        self.slot_images = slot_images
+
+    def request(self, frame):
+        """请求后台生成指定帧的缩略图"""
+        if frame in self.pending:
+            return
+        image_path = self.path_getter(frame)
+        if image_path is None:
+            return
+        self.pending.add(frame)
+        self.executor.submit(self._generate, self.generation, frame, image_path)
+        self._schedule_poll()
+
+    def _generate(self, generation, frame, image_path):
+        """工作线程：生成缩略图"""
+        try:
+            thumb = self.cache.load_or_create(image_path)
+        except Exception as e:
+            print(f"生成缩略图失败: {e}")
+            thumb = None
+        self.results.put((generation, frame, thumb))
+
+    def _schedule_poll(self):
+        if self.poll_job is None:
+            self.poll_job = self.after(50, self._poll_results)
+
+    def _poll_results(self):
+        """Tk线程：接收生成结果，并在空闲时继续预生成后续缩略图"""
+        self.poll_job = None
+        visible = set(self._visible_frames())
+        need_redraw = False
+
+        while True:
+            try:
+                generation, frame, thumb = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            self.pending.discard(frame)
+            if thumb is None:
+                continue
+            if frame in visible:
+                need_redraw = True
+            if frame == self.scrub_frame:
+                self.on_preview(frame, thumb)
+
+        # 后台逐步预生成整个序列的缩略图，任务数保持有界
+        while len(self.pending) < self.MAX_PENDING and self.prewarm_cursor < self.frame_count:
+            frame = self.prewarm_cursor
+            self.prewarm_cursor += 1
+            image_path = self.path_getter(frame)
+            if image_path and self.cache.get_cached(image_path) is None:
+                self.request(frame)
+
+        if need_redraw:
+            self.redraw()
+
+        if self.pending or self.prewarm_cursor < self.frame_count:
+            self._schedule_poll()
+
+    def destroy(self):
+        """销毁时关闭后台线程"""
+        if self.poll_job:
+            self.after_cancel(self.poll_job)
+            self.poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
+
+
+class DensityStrip(tb.Frame):
+    """标注密度热力条 - 逐帧显示边界框、关系点和未覆盖主体的数量（每层一行）"""
+
+    # (计数键, 颜色)：颜色越亮表示该帧数量越多
+    LAYERS = (
+        ('boxes', (69, 183, 209)),
+        ('relations', (124, 252, 0)),
+        ('uncovered', (255, 107, 107)),
+    )
+    ROW_HEIGHT = 6
+    BACKGROUND = (30, 30, 30)
+
+    def __init__(self, parent, on_seek, on_hover, **kwargs):
+        super().__init__(parent, **kwargs)
+
+        self.on_seek = on_seek  # 点击热力条跳转到对应帧
+        self.on_hover = on_hover  # 鼠标悬停时显示对应帧的统计
+        self.counts = {}
+        self.frame_count = 0
+        self.current_frame = 0
+        self.photo = None  # 热力图PhotoImage引用
+
+        self.canvas = tk.Canvas(
+            self,
+            height=self.ROW_HEIGHT * len(self.LAYERS),
+            bg='#1e1e1e',
+            highlightthickness=0
+        )
+        self.canvas.pack(fill=tk.X)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Motion>", self.on_motion)
+
+    def set_counts(self, counts, frame_count):
+        """设置逐帧计数 {'boxes': 数组, 'relations': 数组, 'uncovered': 数组}"""
+        self.counts = counts or {}
+        self.frame_count = frame_count
+        self.redraw()
+
+    def set_current(self, frame):
+        """移动当前帧标记（不重新生成热力图）"""
+        self.current_frame = frame
+        self._draw_marker()
+
+    def _frame_at(self, x):
+        width = self.canvas.winfo_width()
+        if not self.frame_count or width <= 0:
+            return None
+        return min(self.frame_count - 1, max(0, int(x * self.frame_count / width)))
+
+    def on_click(self, event):
+        frame = self._frame_at(event.x)
+        if frame is not None:
+            self.on_seek(frame)
+
+    def on_motion(self, event):
+        frame = self._frame_at(event.x)
+        if frame is not None:
+            self.on_hover(frame)
+
+    def redraw(self):
+        """按画布宽度把逐帧计数分桶（取桶内最大值）生成热力图"""
+        self.canvas.delete("all")
+        self.photo = None
+        width = self.canvas.winfo_width()
+        if not self.counts or not self.frame_count or width <= 1:
+            return
+
+        # 每个像素列对应的起始帧；帧数少于像素数时相邻列对应同一帧
+        starts = np.arange(width, dtype=np.int64) * self.frame_count // width
+        rows = []
+        for key, color in self.LAYERS:
+            values = np.zeros(self.frame_count, dtype=np.float64)
+            layer = np.asarray(self.counts.get(key, ()), dtype=np.float64)[:self.frame_count]
+            values[:len(layer)] = layer
+            bucketed = np.maximum.reduceat(values, starts)
+            peak = bucketed.max()
+            level = bucketed / peak if peak > 0 else bucketed
+            background = np.array(self.BACKGROUND, dtype=np.float64)
+            row = background + level[:, None] * (np.array(color, dtype=np.float64) - background)
+            rows.append(np.repeat(row[None, :, :], self.ROW_HEIGHT, axis=0))
+
+        image = Image.fromarray(np.concatenate(rows).astype(np.uint8), 'RGB')
+        self.photo = ImageTk.PhotoImage(image)
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        self._draw_marker()
+
+    def _draw_marker(self):
+        """绘制当前帧标记线"""
+        self.canvas.delete("marker")
+        width = self.canvas.winfo_width()
+        if not self.frame_count or width <= 1:
+            return
+        x = (self.current_frame + 0.5) * width / self.frame_count
+        self.canvas.create_line(
+            x, 0, x, self.ROW_HEIGHT * len(self.LAYERS),
+            fill='#F8B739', width=2, tags="marker"
+        )
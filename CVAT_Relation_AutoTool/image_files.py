@@ -0,0 +1,104 @@
+"""图片文件夹枚举和帧号到图片文件的映射（只依赖标准库）"""
+import os
+import re
+
+# 支持的图片格式
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff')
+
+# 图片文件夹缓存 {文件夹: (目录修改时间, 排序后的文件名列表)}
+_image_folder_cache = {}
+# 帧号映射缓存 {(文件夹, 目录修改时间, 帧名哈希): {frame: 文件名}}
+_frame_map_cache = {}
+
+_DIGITS = re.compile(r'(\d+)', re.ASCII)
+
+
+def natural_sort_key(name):
+    """自然排序键：frame_2.jpg 排在 frame_10.jpg 之前"""
+    parts = _DIGITS.split(name.lower())
+    # 奇数位置是数字段
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return parts
+
+
+def iter_image_files(folder, extensions=IMAGE_EXTENSIONS):
+    """使用os.scandir逐个枚举文件夹中的图片文件名（只看文件名，不逐个stat）"""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(extensions):
+                yield entry.name
+
+
+def list_image_files(folder):
+    """按自然顺序列出文件夹中的图片（按文件夹缓存，目录有变动时重新枚举）"""
+    folder = os.path.abspath(folder)
+    mtime = os.stat(folder).st_mtime_ns
+    cached = _image_folder_cache.get(folder)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    files = sorted(iter_image_files(folder), key=natural_sort_key)
+    _image_folder_cache[folder] = (mtime, files)
+    return files
+
+
+def parse_frame_names(root):
+    """从CVAT XML中读取帧号到图片文件名的映射（<meta>中的帧列表或<image>元素），没有则返回空字典"""
+    frame_names = {}
+    if root is None:
+        return frame_names
+
+    candidates = list(root.findall('image'))
+    meta = root.find('meta')
+    if meta is not None:
+        candidates.extend(meta.iter('frame'))
+        candidates.extend(meta.iter('image'))
+
+    for elem in candidates:
+        name = elem.get('name')
+        frame = elem.get('id', elem.get('frame'))
+        if not name or frame is None:
+            continue
+        try:
+            frame_names[int(frame)] = name
+        except ValueError:
+            continue
+    return frame_names
+
+
+def build_frame_file_map(folder, image_files, frame_names=None):
+    """
+    构建帧号到图片文件名的映射（按文件夹缓存）。
+    XML中有帧名时按文件名匹配，否则按自然排序后的顺序对应帧号。
+    """
+    folder = os.path.abspath(folder)
+    mtime = os.stat(folder).st_mtime_ns
+    names_key = hash(frozenset(frame_names.items())) if frame_names else None
+    cache_key = (folder, mtime, names_key)
+    cached = _frame_map_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    frame_to_file = {}
+    if frame_names:
+        by_name = {}
+        by_stem = {}
+        for file_name in image_files:
+            by_name[file_name] = file_name
+            by_stem.setdefault(os.path.splitext(file_name)[0], file_name)
+
+        for frame, name in frame_names.items():
+            base_name = os.path.basename(name.replace('\\', '/'))
+            file_name = by_name.get(base_name) or by_stem.get(os.path.splitext(base_name)[0])
+            if file_name:
+                frame_to_file[frame] = file_name
+
+    # XML中没有帧名或一个都匹配不上时按顺序对应
+    if not frame_to_file:
+        frame_to_file = dict(enumerate(image_files))
+
+    # 同一文件夹只保留最新的映射
+    for key in [k for k in _frame_map_cache if k[0] == folder]:
+        del _frame_map_cache[key]
+    _frame_map_cache[cache_key] = frame_to_file
+    return frame_to_file
@@ -0,0 +1,336 @@
+"""
+空间规则引擎 - 根据边界框几何关系自动生成关系（不依赖Tk）
+
+规则文件为JSON列表，每条规则：
+    {
+        "predicate": "on",                # 生成的谓词
+        "subject": ["vase"],              # 主体类别，"*"或省略表示任意类别
+        "object": ["desk", "table"],      # 客体类别
+        "conditions": [                   # 所有条件同时满足
+            {"type": "above", "tolerance": 0.2},
+            {"type": "near", "max_gap": 10}
+        ],
+        "min_frames": 3,                  # 至少满足的帧数
+        "min_ratio": 0.5                  # 满足帧数 / 两者同时出现的帧数
+    }
+
+条件类型：
+    contains  主体包含客体    threshold: 交集/客体面积（默认0.9）
+    inside    主体在客体内    threshold: 交集/主体面积（默认0.9）
+    iou       交并比          min_iou（默认0.5）、max_iou（默认1.0）
+    near      边缘间距        max_gap: 像素（默认20）
+    above / below / left_of / right_of
+              方位关系（需要在另一方向上有重叠）  tolerance: 允许的重叠比例（默认0.1）
+
+用法示例:
+    python relation_rules.py annotations.xml relation_rules.json -o output.xml
+    python relation_rules.py annotations.xml relation_rules.json --dry-run
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from annotation_index import AnnotationIndex
+
+
+CONDITION_TYPES = ('contains', 'inside', 'iou', 'near', 'above', 'below', 'left_of', 'right_of')
+
+# 条件参数默认值
+CONDITION_DEFAULTS = {
+    'contains': {'threshold': 0.9},
+    'inside': {'threshold': 0.9},
+    'iou': {'min_iou': 0.5, 'max_iou': 1.0},
+    'near': {'max_gap': 20.0},
+    'above': {'tolerance': 0.1},
+    'below': {'tolerance': 0.1},
+    'left_of': {'tolerance': 0.1},
+    'right_of': {'tolerance': 0.1},
+}
+
+
+def load_rules(path):
+    """从JSON文件加载并校验规则"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    return [normalize_rule(rule, i) for i, rule in enumerate(data)]
+
+
+def normalize_rule(rule, position=0):
+    """校验规则并补全默认值，类别统一为小写"""
+    name = f"规则 {position + 1}"
+    predicate = rule.get("predicate")
+    if not predicate:
+        raise ValueError(f"{name} 缺少 predicate")
+
+    conditions = []
+    for condition in rule.get("conditions", []):
+        kind = condition.get("type")
+        if kind not in CONDITION_TYPES:
+            raise ValueError(f"{name} 的条件类型无效: {kind}")
+        conditions.append({**CONDITION_DEFAULTS[kind], **condition})
+    if not conditions:
+        raise ValueError(f"{name} 至少需要一个条件")
+
+    return {
+        'predicate': predicate,
+        'subject': _normalize_labels(rule.get("subject")),
+        'object': _normalize_labels(rule.get("object")),
+        'conditions': conditions,
+        'min_frames': max(1, int(rule.get("min_frames", 1))),
+        'min_ratio': float(rule.get("min_ratio", 0.0)),
+    }
+
+
+def _normalize_labels(labels):
+    """类别列表转为小写集合，None表示任意类别"""
+    if labels is None or labels == "*":
+        return None
+    if isinstance(labels, str):
+        labels = [labels]
+    labels = {label.lower() for label in labels}
+    return None if "*" in labels else labels
+
+
+def _pruning_axis(conditions):
+    """
+    根据条件选择候选对的剪枝方式 (轴, 扩展距离)：
+    轴0按x区间、轴1按y区间，只保留该方向上区间（扩展后）相交的框对；None表示不剪枝。
+    所有条件需同时满足，因此任一条件的剪枝都是安全的。
+    """
+    for condition in conditions:
+        kind = condition['type']
+        if kind in ('contains', 'inside') and condition['threshold'] > 0:
+            return 0, 0.0
+        if kind == 'iou' and condition['min_iou'] > 0:
+            return 0, 0.0
+    for condition in conditions:
+        if condition['type'] == 'near':
+            return 0, float(condition['max_gap'])
+    for condition in conditions:
+        if condition['type'] in ('above', 'below'):
+            return 0, 0.0
+        if condition['type'] in ('left_of', 'right_of'):
+            return 1, 0.0
+    return None, 0.0
+
+
+def candidate_pairs(coords, subjects, objects, axis=None, reach=0.0):
+    """
+    生成候选框对 (主体下标数组, 客体下标数组)。
+    按axis方向排序客体后用二分查找确定每个主体的候选范围，避免全部两两组合。
+    """
+    if not len(subjects) or not len(objects):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    if axis is None:
+        return np.repeat(subjects, len(objects)), np.tile(objects, len(subjects))
+
+    low, high = axis, axis + 2
+    object_low = coords[objects, low]
+    order = np.argsort(object_low, kind='stable')
+    sorted_objects = objects[order]
+    sorted_low = object_low[order]
+    max_length = (coords[objects, high] - object_low).max()
+
+    # 客体起点落在 [主体起点 - 扩展 - 最大客体长度, 主体终点 + 扩展] 内才可能相交
+    start = np.searchsorted(sorted_low, coords[subjects, low] - reach - max_length, 'left')
+    end = np.searchsorted(sorted_low, coords[subjects, high] + reach, 'right')
+    counts = end - start
+    total = int(counts.sum())
+    if not total:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    pair_subjects = np.repeat(subjects, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+    pair_objects = sorted_objects[offsets]
+
+    keep = (
+        (coords[pair_objects, low] <= coords[pair_subjects, high] + reach) &
+        (coords[pair_objects, high] >= coords[pair_subjects, low] - reach)
+    )
+    return pair_subjects[keep], pair_objects[keep]
+
+
+def evaluate_conditions(s, o, conditions):
+    """对框对数组（N×4: xtl, ytl, xbr, ybr）逐条件求值，返回同时满足的掩码"""
+    inter_w = np.minimum(s[:, 2], o[:, 2]) - np.maximum(s[:, 0], o[:, 0])
+    inter_h = np.minimum(s[:, 3], o[:, 3]) - np.maximum(s[:, 1], o[:, 1])
+    s_w, s_h = s[:, 2] - s[:, 0], s[:, 3] - s[:, 1]
+    o_w, o_h = o[:, 2] - o[:, 0], o[:, 3] - o[:, 1]
+    mask = np.ones(len(s), dtype=bool)
+
+    for condition in conditions:
+        kind = condition['type']
+        if kind in ('contains', 'inside', 'iou'):
+            intersection = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+            s_area, o_area = s_w * s_h, o_w * o_h
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if kind == 'contains':
+                    ratio = intersection / o_area
+                    mask &= ratio >= condition['threshold']
+                elif kind == 'inside':
+                    ratio = intersection / s_area
+                    mask &= ratio >= condition['threshold']
+                else:
+                    iou = intersection / (s_area + o_area - intersection)
+                    mask &= (iou >= condition['min_iou']) & (iou <= condition['max_iou'])
+        elif kind == 'near':
+            gap = np.hypot(np.clip(-inter_w, 0, None), np.clip(-inter_h, 0, None))
+            mask &= gap <= condition['max_gap']
+        elif kind == 'above':
+            mask &= (s[:, 3] <= o[:, 1] + condition['tolerance'] * o_h) & (inter_w > 0)
+        elif kind == 'below':
+            mask &= (s[:, 1] >= o[:, 3] - condition['tolerance'] * o_h) & (inter_w > 0)
+        elif kind == 'left_of':
+            mask &= (s[:, 2] <= o[:, 0] + condition['tolerance'] * o_w) & (inter_h > 0)
+        elif kind == 'right_of':
+            mask &= (s[:, 0] >= o[:, 2] - condition['tolerance'] * o_w) & (inter_h > 0)
+
+    return mask
+
+
+def existing_relation_keys(index):
+    """XML中已有的关系 {(主体ID, 客体ID, 谓词)}（原始ID）"""
+    keys = set()
+    for relations in index.frame_relations.values():
+        for x, y, predicate, subject_id, object_id, track_id in relations:
+            keys.add((subject_id, object_id, predicate))
+    return keys
+
+
+def evaluate_rules(index, rules, existing=None, progress_callback=None):
+    """
+    在所有帧上对规则求值。
+    返回 (匹配列表, 统计)；匹配为 (主体ID, 客体ID, 谓词, 满足帧数, 同时出现帧数)，ID为原始ID；
+    existing中已有的 (主体ID, 客体ID, 谓词) 不再生成。
+    """
+    if existing is None:
+        existing = existing_relation_keys(index)
+
+    # 类别编码：规则的类别集合转为编码数组，逐帧用np.isin筛选
+    label_codes = {}
+    for label in index.track_labels.values():
+        label_codes.setdefault(label.lower(), len(label_codes))
+
+    def codes_of(labels):
+        if labels is None:
+            return None
+        return np.array([label_codes[label] for label in labels if label in label_codes], dtype=np.int64)
+
+    plans = []
+    for rule in rules:
+        axis, reach = _pruning_axis(rule['conditions'])
+        plans.append((rule, codes_of(rule['subject']), codes_of(rule['object']), axis, reach))
+
+    hits = [[] for _ in rules]  # 每条规则逐帧满足的 主体*K+客体 编码
+    track_ids = {int(tid) for tid in index.track_labels if tid.lstrip('-').isdigit()}
+    pair_base = max(track_ids, default=0) + 1
+    candidate_count = 0
+    frames = sorted(index.frame_boxes)
+
+    for done, frame in enumerate(frames, 1):
+        boxes = index.frame_boxes[frame]
+        tids = np.array([int(box[0]) for box in boxes], dtype=np.int64)
+        coords = np.array([box[1:5] for box in boxes], dtype=np.float64)
+        codes = np.array([label_codes.get((box[6] or "").lower(), -1) for box in boxes], dtype=np.int64)
+        everyone = np.arange(len(boxes))
+
+        for rule_index, (rule, subject_codes, object_codes, axis, reach) in enumerate(plans):
+            subjects = everyone if subject_codes is None else everyone[np.isin(codes, subject_codes)]
+            objects = everyone if object_codes is None else everyone[np.isin(codes, object_codes)]
+            pair_s, pair_o = candidate_pairs(coords, subjects, objects, axis, reach)
+            distinct = tids[pair_s] != tids[pair_o]
+            pair_s, pair_o = pair_s[distinct], pair_o[distinct]
+            candidate_count += len(pair_s)
+            if not len(pair_s):
+                continue
+
+            mask = evaluate_conditions(coords[pair_s], coords[pair_o], rule['conditions'])
+            if mask.any():
+                hits[rule_index].append(tids[pair_s[mask]] * pair_base + tids[pair_o[mask]])
+
+        if progress_callback and (done % 200 == 0 or done == len(frames)):
+            progress_callback(done, len(frames))
+
+    # 按框对汇总满足的帧数，再按最少帧数和同时出现比例筛选
+    track_frames = {tid: np.asarray(frames, dtype=np.int64) for tid, frames in index.track_frames.items()}
+    matches = []
+    for rule, rule_hits in zip(rules, hits):
+        if not rule_hits:
+            continue
+        keys, counts = np.unique(np.concatenate(rule_hits), return_counts=True)
+        selected = counts >= rule['min_frames']
+        for key, count in zip(keys[selected].tolist(), counts[selected].tolist()):
+            subject_id, object_id = str(key // pair_base), str(key % pair_base)
+            if (subject_id, object_id, rule['predicate']) in existing:
+                continue
+            covisible = len(np.intersect1d(
+                track_frames[subject_id], track_frames[object_id], assume_unique=True
+            ))
+            if covisible and count / covisible < rule['min_ratio']:
+                continue
+            matches.append((subject_id, object_id, rule['predicate'], count, covisible))
+
+    matches.sort(key=lambda m: (int(m[0]), int(m[1]), m[2]))
+    stats = {'frames': len(frames), 'candidates': candidate_count, 'matches': len(matches)}
+    return matches, stats
+
+
+def add_to_custom_relations(custom_relations, matches):
+    """把匹配结果并入custom_relations {主体ID: [(客体ID, 谓词)]}，返回新增数量"""
+    added = 0
+    for subject_id, object_id, predicate, _, _ in matches:
+        rel_list = custom_relations.setdefault(subject_id, [])
+        if (object_id, predicate) not in rel_list:
+            rel_list.append((object_id, predicate))
+            added += 1
+    return added
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="按边界框几何规则自动生成CVAT关系")
+    parser.add_argument("xml", help="CVAT XML标注文件")
+    parser.add_argument("rules", help="规则JSON文件")
+    parser.add_argument("-o", "--output", help="输出XML路径（默认覆盖输入文件）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印匹配结果，不写入XML")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rules = load_rules(args.rules)
+
+    start_time = time.perf_counter()
+    index = AnnotationIndex.from_file(args.xml)
+    matches, stats = evaluate_rules(index, rules)
+    elapsed = time.perf_counter() - start_time
+
+    for subject_id, object_id, predicate, count, covisible in matches:
+        print(f"#{int(subject_id) + 1} {predicate} #{int(object_id) + 1}  ({count}/{covisible} 帧)")
+    print(
+        f"共 {stats['frames']} 帧，候选框对 {stats['candidates']}，生成关系 {stats['matches']} 条，"
+        f"耗时 {elapsed:.1f} 秒"
+    )
+    if args.dry_run or not matches:
+        return 0
+
+    from config import load_config
+    from xml_processor import process_xml_file
+
+    custom_relations = {}
+    add_to_custom_relations(custom_relations, matches)
+    success, message = process_xml_file(
+        args.xml, args.output or args.xml, load_config(), custom_relations=custom_relations
+    )
+    print(message)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+
+
+class RelationStore:
+    """
+    关系存储 - 自定义关系对话框中的关系集合。
+    关系为 (主体显示ID, 主体类别, 客体显示ID, 客体类别, 谓词)，
+    按 (主体, 客体, 谓词) 去重；维护按主体的索引、关系计数和本次新增的关系，
+    添加/删除只需处理变化的关系。
+    在transaction中的修改记录为一条命令（只保存变化的关系），用于撤销/重做。
+    """
+
+    def __init__(self):
+        self.undo_stack = []  # [(命令名称, [操作, ...])]
+        self.redo_stack = []
+        self._recording = None  # 正在记录的命令操作列表
+        self._reset()
+
+    def _reset(self):
+        self.relations = {}  # {(主体, 客体, 谓词): 关系}，保持添加顺序
+        self.by_subject = {}  # {主体: {(主体, 客体, 谓词): 关系}}
+        self.new_keys = {}  # 本次会话新增的关系键（有序，值无意义）
+        self.count_histogram = {}  # {关系数: 主体数}，用于维护最大关系数
+        self.max_count = 0
+
+    @staticmethod
+    def key_of(relation):
+        """关系的去重键 (主体, 客体, 谓词)"""
+        return relation[0], relation[2], relation[4]
+
+    def __len__(self):
+        return len(self.relations)
+
+    def __iter__(self):
+        return iter(list(self.relations.values()))
+
+    def __contains__(self, key):
+        return key in self.relations
+
+    def add(self, relation, new=True):
+        """添加关系，已存在时返回False；new表示本次会话新增（确认时写回主窗口）"""
+        key = self.key_of(relation)
+        if key in self.relations:
+            return False
+
+        self.relations[key] = relation
+        subject_relations = self.by_subject.setdefault(relation[0], {})
+        self._move_count(len(subject_relations), len(subject_relations) + 1)
+        subject_relations[key] = relation
+        if new:
+            self.new_keys[key] = None
+        if self._recording is not None:
+            self._recording.append(('add', relation, new))
+        return True
+
+    def add_many(self, relations, new=True):
+        """
+        批量添加，返回实际添加的关系（已存在和批内重复的跳过）。
+        按主体分组后每个主体只更新一次索引和计数，用于大批量模板。
+        """
+        added = []
+        grouped = {}  # {主体: [(键, 关系)]}
+        for relation in relations:
+            key = self.key_of(relation)
+            if key in self.relations:
+                continue
+            self.relations[key] = relation
+            grouped.setdefault(relation[0], []).append((key, relation))
+            added.append(relation)
+
+        for subject, items in grouped.items():
+            subject_relations = self.by_subject.setdefault(subject, {})
+            old_count = len(subject_relations)
+            subject_relations.update(items)
+            self._move_count(old_count, len(subject_relations))
+        if new:
+            self.new_keys.update((self.key_of(relation), None) for relation in added)
+        if self._recording is not None:
+            self._recording.extend(('add', relation, new) for relation in added)
+        return added
+
+    def remove(self, subject, obj, predicate):
+        """删除关系，返回被删除的关系（不存在时返回None）"""
+        key = (subject, obj, predicate)
+        relation = self.relations.pop(key, None)
+        if relation is None:
+            return None
+
+        subject_relations = self.by_subject[subject]
+        del subject_relations[key]
+        self._move_count(len(subject_relations) + 1, len(subject_relations))
+        if not subject_relations:
+            del self.by_subject[subject]
+        was_new = key in self.new_keys
+        self.new_keys.pop(key, None)
+        if self._recording is not None:
+            self._recording.append(('remove', relation, was_new))
+        return relation
+
+    def clear(self):
+        """清空关系和撤销/重做记录"""
+        self._reset()
+        self.undo_stack = []
+        self.redo_stack = []
+
+    @contextmanager
+    def transaction(self, name):
+        """
+        把一组修改记录为一条可撤销的命令：
+        with store.transaction("添加关系"): store.add(...)
+        没有修改时不记录。
+        """
+        if self._recording is not None:
+            # 嵌套时并入外层命令
+            yield
+            return
+
+        self._recording = []
+        try:
+            yield
+        finally:
+            operations, self._recording = self._recording, None
+            if operations:
+                self.undo_stack.append((name, operations))
+                self.redo_stack = []
+
+    def log(self, undo, redo):
+        """在当前命令中记录存储之外的修改（撤销/重做时调用对应函数）"""
+        if self._recording is not None:
+            self._recording.append(('call', undo, redo))
+
+    def undo(self):
+        """撤销最近一条命令，返回命令名称（没有可撤销的命令时返回None）"""
+        if not self.undo_stack:
+            return None
+        name, operations = self.undo_stack.pop()
+        for operation in reversed(operations):
+            self._apply(operation, inverse=True)
+        self.redo_stack.append((name, operations))
+        return name
+
+    def redo(self):
+        """重做最近撤销的命令，返回命令名称（没有可重做的命令时返回None）"""
+        if not self.redo_stack:
+            return None
+        name, operations = self.redo_stack.pop()
+        for operation in operations:
+            self._apply(operation, inverse=False)
+        self.undo_stack.append((name, operations))
+        return name
+
+    def _apply(self, operation, inverse):
+        """执行一条操作或其逆操作（不记录到命令）"""
+        kind, first, second = operation
+        if kind == 'call':
+            (first if inverse else second)()
+        elif (kind == 'add') != inverse:
+            self.add(first, second)
+        else:
+            self.remove(*self.key_of(first))
+
+    def for_subject(self, subject):
+        """主体的所有关系（按添加顺序）"""
+        return list(self.by_subject.get(subject, {}).values())
+
+    def count(self, subject):
+        """主体的关系数量"""
+        return len(self.by_subject.get(subject, ()))
+
+    def is_new(self, key):
+        return key in self.new_keys
+
+    def new_relations(self):
+        """本次会话新增的关系（按添加顺序）"""
+        return [self.relations[key] for key in self.new_keys]
+
+    def _move_count(self, old, new):
+        """主体关系数从old变为new时更新计数直方图和最大值"""
+        histogram = self.count_histogram
+        if old:
+            histogram[old] -= 1
+            if not histogram[old]:
+                del histogram[old]
+        if new:
+            histogram[new] = histogram.get(new, 0) + 1
+        if new > self.max_count:
+            self.max_count = new
+        while self.max_count and self.max_count not in histogram:
+            self.max_count -= 1
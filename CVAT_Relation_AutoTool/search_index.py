@@ -0,0 +1,89 @@
+class SearchIndex:
+    """
+    子串搜索索引 - 按1~3字符片段（n-gram）缓存倒排表。
+    build() 一次生成所有片段的倒排表（在后台线程中调用）；未预先生成时，
+    片段的倒排表在首次查询时生成并缓存（长片段在其前缀的倒排表中筛选），
+    更长的查询词取倒排表候选后再做子串校验；
+    查询词在上次查询基础上追加字符时，直接在上次结果中继续筛选。
+    """
+
+    def __init__(self, texts, max_gram=3):
+        self.max_gram = max_gram
+        self.texts = [str(text).lower() for text in texts]
+        self.postings = {}  # {片段: [文本下标（升序）]}
+        self.complete = False  # 是否已生成所有片段的倒排表（此时不存在的片段没有匹配）
+        self.last_query = None
+        self.last_result = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def extend(self, texts):
+        """追加文本（分批加载时使用），已缓存的倒排表失效后按需重建"""
+        self.texts.extend(str(text).lower() for text in texts)
+        self.postings = {}
+        self.complete = False
+        self.last_query = None
+        self.last_result = None
+
+    def build(self):
+        """一次遍历生成所有片段的倒排表，之后的查询不再需要线性扫描（可在工作线程中调用）"""
+        postings = {}
+        max_gram = self.max_gram
+        for i, text in enumerate(self.texts):
+            grams = set()
+            for n in range(1, max_gram + 1):
+                for start in range(len(text) - n + 1):
+                    grams.add(text[start:start + n])
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = [i]
+                else:
+                    posting.append(i)
+        self.postings = postings
+        self.complete = True
+        self.last_query = None
+        self.last_result = None
+        return self
+
+    def search(self, query):
+        """返回包含查询词（不区分大小写）的文本下标，保持原顺序"""
+        query = query.lower()
+        if not query:
+            result = list(range(len(self.texts)))
+        elif len(query) <= self.max_gram:
+            result = list(self._posting(query))
+        else:
+            candidates = self._posting(query[:self.max_gram])
+            if self.last_query and query.startswith(self.last_query) and len(self.last_result) < len(candidates):
+                # 增量筛选：新结果一定是上次结果的子集
+                candidates = self.last_result
+            texts = self.texts
+            result = [i for i in candidates if query in texts[i]]
+
+        self.last_query = query
+        self.last_result = result
+        return result
+
+    def filter(self, query, items):
+        """按查询词筛选与索引文本一一对应的items"""
+        return [items[i] for i in self.search(query)]
+
+    def _posting(self, gram):
+        """片段的倒排表（缓存）"""
+        posting = self.postings.get(gram)
+        if posting is not None:
+            return posting
+        if self.complete:
+            return []
+
+        if len(gram) > 1:
+            # 包含该片段的文本一定包含其前缀
+            candidates = self._posting(gram[:-1])
+        else:
+            candidates = range(len(self.texts))
+        texts = self.texts
+        posting = [i for i in candidates if gram in texts[i]]
+        self.postings[gram] = posting
+        return posting
@@ -0,0 +1,213 @@
+"""
+轨迹相关性推断 - 根据运动推断"跟随"、"同行"、"携带"类关系（不依赖Tk）
+
+在滑动窗口内比较运动中轨迹的逐帧速度：速度方向一致、速度大小接近、
+且整个窗口内距离有界的轨迹对作为候选。每个窗口先用轨迹外接框做空间预筛选，
+只对可能靠近的轨迹对做向量化比较。结果为带置信度的候选关系，由用户在对话框中审核。
+"""
+import numpy as np
+
+from relation_rules import candidate_pairs
+
+
+# 运动关系类型 -> 默认谓词
+MOTION_PREDICATES = {
+    'follow': "following",  # 一前一后：主体跟随客体
+    'together': "walking with",  # 并排同行
+    'attached': "carrying",  # 框重叠且一起运动：大框携带小框
+}
+
+# 不区分主体和客体方向的关系类型（已有任一方向的关系即不再推断）
+SYMMETRIC_KINDS = {'together'}
+
+# 推断参数默认值
+INFERENCE_DEFAULTS = {
+    'window': 30,  # 窗口长度（帧）
+    'stride': 15,  # 窗口步长（帧）
+    'min_speed': 1.0,  # 视为运动的最小平均速度（像素/帧）
+    'min_correlation': 0.8,  # 速度方向余弦相似度下限
+    'min_speed_ratio': 0.5,  # 速度大小之比下限
+    'max_distance': 3.0,  # 中心距离上限（以两框平均对角线长度为单位）
+    'min_windows': 2,  # 至少满足的窗口数
+}
+
+
+def build_trajectories(index):
+    """
+    从AnnotationIndex构建所有实体轨迹的中心点轨迹。
+    返回 {track_id: (帧号数组, 中心点数组 N×2, 对角线长度数组)}。
+    """
+    trajectories = {}
+    for track_id in index.track_labels:
+        frames = index.track_frames.get(track_id)
+        if not frames:
+            continue
+        boxes = np.array([index.box_lookup[(track_id, frame)][1:5] for frame in frames], dtype=np.float64)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        diagonals = np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        trajectories[track_id] = (np.asarray(frames, dtype=np.int64), centers, diagonals)
+    return trajectories
+
+
+def infer_motion_relations(index, params=None, existing=None, progress_callback=None):
+    """
+    推断运动关系候选。
+    返回 [(主体ID, 客体ID, 类型, 置信度, 满足窗口数, 共同运动窗口数)]（原始ID，按置信度降序），
+    置信度 = 满足窗口比例 × 平均速度相关性；existing中已有的 (主体ID, 客体ID) 对不再返回，
+    同行等对称关系已有任一方向时也不再返回。
+    """
+    params = {**INFERENCE_DEFAULTS, **(params or {})}
+    window, stride = int(params['window']), max(1, int(params['stride']))
+    existing = existing or set()
+
+    trajectories = build_trajectories(index)
+    track_ids = list(trajectories)
+    if len(track_ids) < 2:
+        return []
+    first = np.array([trajectories[tid][0][0] for tid in track_ids])
+    last = np.array([trajectories[tid][0][-1] for tid in track_ids])
+
+    # 各窗口满足条件的轨迹对统计 {(a, b): [窗口数, 相关性之和, 沿运动方向偏移之和, 重叠窗口数]}
+    pair_stats = {}
+    moving_windows = {}  # {轨迹下标: 该轨迹处于运动状态的窗口集合}
+    # 最后一个窗口对齐到序列结尾，步长不整除时末尾的帧也参与比较
+    final_start = int(last.max()) - window + 1
+    starts = list(range(int(first.min()), final_start + 1, stride))
+    if not starts:
+        starts = [int(first.min())]
+    elif starts[-1] != final_start:
+        starts.append(final_start)
+
+    for window_index, start in enumerate(starts):
+        active = np.nonzero((first < start + window) & (last >= start))[0]
+        if len(active) >= 2:
+            _evaluate_window(trajectories, track_ids, active, start, window, params,
+                             window_index, pair_stats, moving_windows)
+        if progress_callback and ((window_index + 1) % 50 == 0 or window_index + 1 == len(starts)):
+            progress_callback(window_index + 1, len(starts))
+
+    candidates = []
+    for (a, b), (count, correlation, along, attached) in pair_stats.items():
+        if count < params['min_windows']:
+            continue
+        # 满足窗口比例 × 平均相关性 = 相关性之和 / 共同运动窗口数
+        shared = len(moving_windows[a] & moving_windows[b])
+        confidence = correlation / max(shared, 1)
+        id_a, id_b = track_ids[a], track_ids[b]
+        scale = (np.mean(trajectories[id_a][2]) + np.mean(trajectories[id_b][2])) / 2
+        mean_along = along / count
+
+        if attached * 2 >= count:
+            # 大框携带小框
+            kind = 'attached'
+            if np.mean(trajectories[id_a][2]) >= np.mean(trajectories[id_b][2]):
+                subject_id, object_id = id_a, id_b
+            else:
+                subject_id, object_id = id_b, id_a
+        elif abs(mean_along) > 0.5 * scale:
+            # b在a前方（沿运动方向）时a跟随b
+            kind = 'follow'
+            subject_id, object_id = (id_a, id_b) if mean_along > 0 else (id_b, id_a)
+        else:
+            kind = 'together'
+            subject_id, object_id = id_a, id_b
+
+        if (subject_id, object_id) in existing:
+            continue
+        if kind in SYMMETRIC_KINDS and (object_id, subject_id) in existing:
+            continue
+        candidates.append((subject_id, object_id, kind, round(float(confidence), 3), count, shared))
+
+    candidates.sort(key=lambda c: (-c[3], int(c[0]), int(c[1])))
+    return candidates
+
+
+def _evaluate_window(trajectories, track_ids, active, start, window, params,
+                     window_index, pair_stats, moving_windows):
+    """在一个窗口内比较活动轨迹的速度，累加满足条件的轨迹对"""
+    # 稠密中心点矩阵（缺帧为NaN），n×window×2
+    n = len(active)
+    centers = np.full((n, window, 2), np.nan)
+    diagonals = np.full((n, window), np.nan)
+    for row, track in enumerate(active):
+        frames, track_centers, track_diagonals = trajectories[track_ids[track]]
+        lo, hi = np.searchsorted(frames, [start, start + window])
+        offsets = frames[lo:hi] - start
+        centers[row, offsets] = track_centers[lo:hi]
+        diagonals[row, offsets] = track_diagonals[lo:hi]
+
+    velocity = centers[:, 1:] - centers[:, :-1]
+    speed = np.hypot(velocity[..., 0], velocity[..., 1])
+    valid = ~np.isnan(speed)
+    valid_count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        mean_speed = np.where(valid_count > 0, np.nansum(speed, axis=1) / np.maximum(valid_count, 1), 0.0)
+    moving = (valid_count >= (window - 1) // 2) & (mean_speed >= params['min_speed'])
+    rows = np.nonzero(moving)[0]
+    for row in rows:
+        moving_windows.setdefault(int(active[row]), set()).add(window_index)
+    if len(rows) < 2:
+        return
+
+    # 空间预筛选：窗口内轨迹外接框按最大允许距离扩展后相交的轨迹对
+    bounds = np.stack([
+        np.nanmin(centers[rows, :, 0], axis=1), np.nanmin(centers[rows, :, 1], axis=1),
+        np.nanmax(centers[rows, :, 0], axis=1), np.nanmax(centers[rows, :, 1], axis=1),
+    ], axis=1)
+    scale = np.nanmean(diagonals[rows], axis=1)
+    reach = float(params['max_distance'] * np.nanmax(scale))
+    local = np.arange(len(rows))
+    pair_a, pair_b = candidate_pairs(bounds, local, local, axis=0, reach=reach)
+    keep = pair_a < pair_b
+    pair_a, pair_b = pair_a[keep], pair_b[keep]
+    if not len(pair_a):
+        return
+    near = (
+        (bounds[pair_b, 1] <= bounds[pair_a, 3] + reach) &
+        (bounds[pair_b, 3] >= bounds[pair_a, 1] - reach)
+    )
+    pair_a, pair_b = pair_a[near], pair_b[near]
+    if not len(pair_a):
+        return
+
+    # 逐帧速度相关性、速度比和距离（向量化处理所有候选对）
+    va, vb = velocity[rows[pair_a]], velocity[rows[pair_b]]
+    sa, sb = speed[rows[pair_a]], speed[rows[pair_b]]
+    both = valid[rows[pair_a]] & valid[rows[pair_b]]
+    common = both.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = (va[..., 0] * vb[..., 0] + va[..., 1] * vb[..., 1]) / (sa * sb)
+        cosine = np.where(both & (sa > 0) & (sb > 0), cosine, 0.0)
+        correlation = cosine.sum(axis=1) / np.maximum(common, 1)
+        speed_ratio = np.minimum(mean_speed[rows[pair_a]], mean_speed[rows[pair_b]]) / \
+            np.maximum(mean_speed[rows[pair_a]], mean_speed[rows[pair_b]])
+
+        ca, cb = centers[rows[pair_a]], centers[rows[pair_b]]
+        offset = cb - ca
+        pair_scale = (scale[pair_a] + scale[pair_b]) / 2
+        distance = np.hypot(offset[..., 0], offset[..., 1]) / pair_scale[:, None]
+        present = ~np.isnan(distance)
+        present_count = np.maximum(present.sum(axis=1), 1)
+        max_distance = np.where(present, distance, -np.inf).max(axis=1)
+        mean_distance = np.where(present, distance, 0.0).sum(axis=1) / present_count
+
+        # 沿平均运动方向的偏移：正值表示b在a前方
+        direction = np.nansum(va + vb, axis=1)
+        direction /= np.maximum(np.hypot(direction[:, 0], direction[:, 1]), 1e-9)[:, None]
+        projection = offset[..., 0] * direction[:, None, 0] + offset[..., 1] * direction[:, None, 1]
+        along = np.where(present, projection, 0.0).sum(axis=1) / present_count
+
+    passed = (
+        (common >= (window - 1) // 2) &
+        (correlation >= params['min_correlation']) &
+        (speed_ratio >= params['min_speed_ratio']) &
+        (max_distance <= params['max_distance'])
+    )
+    # active升序且pair_a < pair_b，键中第一个轨迹下标始终较小
+    for i in np.nonzero(passed)[0]:
+        key = (int(active[rows[pair_a[i]]]), int(active[rows[pair_b[i]]]))
+        stats = pair_stats.setdefault(key, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += float(correlation[i])
+        stats[2] += float(along[i])
+        stats[3] += int(mean_distance[i] < 0.5)
@@ -1,4 +1,5 @@
 import os
+import xml.etree.ElementTree as ET
 import pandas as pd
 from datetime import datetime
 
@@ -26,4 +27,4 @@ def parse_xml_for_categories(xml_path):
         return tree, root, category_map
 
     except Exception as e:
-        return None, None, {}
\ No newline at end of file
+        return None, None, {}